@@ -0,0 +1,212 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""
+Central JSON codec used by models, data sources and reports.
+
+loads uses the fastest installed backend, in the order orjson, rapidjson,
+ujson, and the standard library json module.  Every codec accepts str,
+bytes, bytearray and memoryview input and falls back to the standard
+library for anything its backend rejects (non string keys, integers beyond
+64 bits, control characters in strings...), so what loads returns never
+depends on which one is used.
+
+What dumps returns would: the accelerated backends write compact JSON, and
+orjson writes non-ASCII characters unescaped.  So that installing a package
+does not change serialized request bodies, dumps uses the standard library
+unless a codec is selected, with set_codec or the json_codec option of the
+engine config.  A selected codec is used by both loads and dumps.  dumps
+always returns str.
+
+Usage:
+::
+
+    from cafe.common import json_codec
+
+    data = json_codec.loads(response.content)
+    body = json_codec.dumps(data)
+
+    # Serialize with orjson, accepting its output format
+    json_codec.set_codec("orjson")
+"""
+
+import json
+
+import six
+
+from cafe.engine.config import EngineConfig
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    """Standard library json, always available"""
+    name = "json"
+    backend = json
+
+    @classmethod
+    def is_available(cls):
+        return cls.backend is not None
+
+    def loads(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        if isinstance(data, (six.binary_type, bytearray)):
+            data = data.decode("UTF-8", "ignore")
+        return json.loads(data, strict=False)
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def dump(self, obj, file_):
+        file_.write(self.dumps(obj))
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+    backend = orjson
+
+    def loads(self, data):
+        # orjson reads bytes, bytearray and memoryview without copying
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            return super(OrjsonCodec, self).loads(data)
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(
+                obj, option=orjson.OPT_NON_STR_KEYS).decode("UTF-8")
+        except TypeError:
+            return super(OrjsonCodec, self).dumps(obj)
+
+
+class RapidjsonCodec(JSONCodec):
+    name = "rapidjson"
+    backend = rapidjson
+
+    def loads(self, data):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        try:
+            return rapidjson.loads(data)
+        except (TypeError, ValueError):
+            return super(RapidjsonCodec, self).loads(data)
+
+    def dumps(self, obj):
+        try:
+            return rapidjson.dumps(obj)
+        except (TypeError, ValueError, OverflowError):
+            return super(RapidjsonCodec, self).dumps(obj)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+    backend = ujson
+
+    def loads(self, data):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        try:
+            return ujson.loads(data)
+        except (TypeError, ValueError):
+            return super(UjsonCodec, self).loads(data)
+
+    def dumps(self, obj):
+        try:
+            return ujson.dumps(obj, escape_forward_slashes=False)
+        except (TypeError, ValueError, OverflowError):
+            return super(UjsonCodec, self).dumps(obj)
+
+
+#: Codecs in order of preference
+CODECS = (OrjsonCodec, RapidjsonCodec, UjsonCodec, JSONCodec)
+
+_codec = None
+_fastest = None
+_configured = False
+
+
+def get_codec():
+    """Returns the codec dumps uses: the selected codec, or the standard
+    library's if none was selected
+    """
+    global _configured
+    if _codec is None and not _configured:
+        _configured = True
+        name = EngineConfig().json_codec
+        if name:
+            set_codec(name)
+    return _codec or _STANDARD
+
+
+def _get_loader():
+    """Returns the codec loads uses: the selected codec, or the fastest
+    installed one if none was selected
+    """
+    global _fastest
+    codec = get_codec()
+    if codec is not _STANDARD:
+        return codec
+    if _fastest is None:
+        _fastest = next(
+            codec for codec in CODECS if codec.is_available())()
+    return _fastest
+
+
+def set_codec(name):
+    """Selects the codec called name.  Raises ValueError if it is unknown or
+    its backend is not installed.
+    """
+    global _codec
+    for codec in CODECS:
+        if codec.name == name and codec.is_available():
+            _codec = codec()
+            return _codec
+    raise ValueError("JSON codec {0} is not available".format(name))
+
+
+def reset():
+    """Drops the selected codec, the engine config is read again on next
+    use
+    """
+    global _codec, _configured
+    _codec = None
+    _configured = False
+
+
+_STANDARD = JSONCodec()
+
+
+def loads(data):
+    return _get_loader().loads(data)
+
+
+def dumps(obj):
+    return get_codec().dumps(obj)
+
+
+def dump(obj, file_):
+    return get_codec().dump(obj, file_)
@@ -19,11 +19,13 @@ import os
 # show any line numbers or stacktraces (simply print the messages to stderr)
 import warnings
 
+import six
+
 from cafe.engine.config import EngineConfig
 
 warnings.simplefilter('once', Warning)
 warnings.showwarning = \
-    lambda msg, category, filename, lineno: sys.stderr.write(str(msg))
+    lambda msg, category, filename, lineno, *args: sys.stderr.write(str(msg))
 
 try:
     from collections import OrderedDict
@@ -33,7 +35,12 @@ except ImportError:
 
 
 def logsafe_str(data):
-    return "{0}".format(data).decode('utf-8', 'replace')
+    if isinstance(data, six.binary_type):
+        return data.decode('utf-8', 'replace')
+    text = "{0}".format(data)
+    if isinstance(text, six.text_type):
+        return text
+    return text.decode('utf-8', 'replace')
 
 
 def get_object_namespace(obj):
@@ -12,8 +12,8 @@
 # under the License.
 
 import os
-import json
 
+from cafe.common import json_codec
 from cafe.common.reporting.base_report import BaseReport
 
 
@@ -68,4 +68,4 @@ class JSONReport(BaseReport):
             result_path += "/results.json"
 
         with open(result_path, 'w') as result_file:
-            json.dump(test_results, result_file)
+            json_codec.dump(test_results, result_file)
@@ -18,6 +18,7 @@ from warnings import warn
 import argparse
 import logging
 import sys
+import threading
 
 from cafe.common.reporting.cclogging import \
     get_object_namespace, setup_new_cchandler, log_info_block
@@ -61,6 +62,26 @@ class FixtureReporter(object):
         self.logger = _FixtureLogger(parent_object)
         self.metrics = TestRunMetrics()
         self.report_name = str(get_object_namespace(parent_object))
+        # Per test state is kept per thread so that tests of the same
+        # fixture can run concurrently
+        self._test_state = threading.local()
+        self._metrics_lock = threading.Lock()
+
+    @property
+    def test_metrics(self):
+        return self._test_state.test_metrics
+
+    @test_metrics.setter
+    def test_metrics(self, value):
+        self._test_state.test_metrics = value
+
+    @property
+    def stats_log(self):
+        return self._test_state.stats_log
+
+    @stats_log.setter
+    def stats_log(self, value):
+        self._test_state.stats_log = value
 
     def start(self):
         """Starts logging and metrics reporting for the fixture"""
@@ -101,7 +122,8 @@ class FixtureReporter(object):
         """
 
         test_description = test_description or "No Test description."
-        self.metrics.total_tests += 1
+        with self._metrics_lock:
+            self.metrics.total_tests += 1
         self.test_metrics = TestRunMetrics()
         self.test_metrics.timer.start()
         root_log_dir = EngineConfig().root_log_dir
@@ -136,14 +158,15 @@ class FixtureReporter(object):
                  ])
             return
 
-        if test_result == TestResultTypes.PASSED:
-            self.metrics.total_passed += 1
+        with self._metrics_lock:
+            if test_result == TestResultTypes.PASSED:
+                self.metrics.total_passed += 1
 
-        if test_result == TestResultTypes.ERRORED:
-            self.metrics.total_errored += 1
+            if test_result == TestResultTypes.ERRORED:
+                self.metrics.total_errored += 1
 
-        if test_result == TestResultTypes.FAILED:
-            self.metrics.total_failed += 1
+            if test_result == TestResultTypes.FAILED:
+                self.metrics.total_failed += 1
 
         self.test_metrics.result = test_result
 
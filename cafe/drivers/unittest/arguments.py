@@ -22,6 +22,7 @@ import re
 import sys
 
 from cafe.drivers.base import print_exception, get_error
+from cafe.drivers.unittest.decorators import THREAD_SAFE_TAG
 from cafe.engine.config import EngineConfig
 from cafe.engine.models.data_interfaces import CONFIG_KEY
 
@@ -187,6 +188,19 @@ class RegexAction(argparse.Action):
         setattr(namespace, self.dest, regex_list)
 
 
+class ConcurrencyAction(argparse.Action):
+    """
+        Processes concurrency option, format thread:N.
+    """
+    def __call__(self, parser, namespace, value, option_string=None):
+        match = re.match(r"^thread:(\d+)$", value)
+        if match is None or int(match.group(1)) < 1:
+            parser.error(
+                "ConcurrencyAction: Invalid concurrency {0}, expected "
+                "thread:N".format(value))
+        setattr(namespace, self.dest, int(match.group(1)))
+
+
 class VerboseAction(argparse.Action):
     """
         Custom action that sets VERBOSE environment variable.
@@ -208,7 +222,9 @@ class ArgumentParser(argparse.ArgumentParser):
                 [--regex-list=REGEX...] [--file] [--parallel=(class|test)]
                 [--result=(json|xml)] [--result-directory=RESULT_DIRECTORY]
                 [--tags=TAG...] [--verbose=VERBOSE] [--exit-on-error]
-                [--workers=NUM]
+                [--workers=NUM] [--profile=(cpu|memory)]
+                [--profile-scope=(test|class)] [--sample-interval=MS]
+                [--hang-timeout=SECONDS] [--concurrency=thread:NUM]
             cafe-runner <config> <testrepo>... --list
             cafe-runner --list
             cafe-runner --help
@@ -259,6 +275,17 @@ class ArgumentParser(argparse.ArgumentParser):
             help="Lists configs if no repo is specified otherwise lists tests"
                  " for all the specified repos.")
 
+        self.add_argument(
+            "--config-layer",
+            action="append",
+            dest="config_layers",
+            default=[],
+            metavar="PATH",
+            help="Overlays the test config with the config file at PATH "
+                 "(JSON if it ends in .json).  Can be repeated, later "
+                 "layers win.  The layers are merged once and handed to "
+                 "the --parallel workers")
+
         self.add_argument(
             "--data-directory", "-D",
             action=DataDirectoryAction,
@@ -288,6 +315,48 @@ class ArgumentParser(argparse.ArgumentParser):
             choices=["class", "test"],
             help="Runs test in parallel by class grouping or test")
 
+        self.add_argument(
+            "--concurrency",
+            action=ConcurrencyAction,
+            default=None,
+            metavar="thread:NUM",
+            help="With --parallel=test, runs the tests of each class on NUM "
+                 "threads inside a single worker, sharing one setUpClass. "
+                 "Only tests tagged '{0}' run concurrently".format(
+                     THREAD_SAFE_TAG))
+
+        self.add_argument(
+            "--profile",
+            choices=["cpu", "memory"],
+            help="Profiles each test (or class, see --profile-scope) with "
+                 "cProfile (cpu) or tracemalloc (memory).  Profiles are "
+                 "written to the test log directory and merged into a "
+                 "hotspot report at the end of the run")
+
+        self.add_argument(
+            "--profile-scope",
+            choices=["test", "class"],
+            default="test",
+            help="Unit of work wrapped by each --profile profile")
+
+        self.add_argument(
+            "--sample-interval",
+            type=int,
+            default=None,
+            metavar="MS",
+            help="Samples the stack of every --parallel worker each MS "
+                 "milliseconds and writes flamegraph compatible folded "
+                 "stacks per test to the test log directory")
+
+        self.add_argument(
+            "--hang-timeout",
+            type=float,
+            default=None,
+            metavar="SECONDS",
+            help="Asks every --parallel worker to dump its current stacks "
+                 "to the test log directory whenever no result has been "
+                 "received for SECONDS seconds")
+
         self.add_argument(
             "--result", "-R",
             choices=["json", "xml", "subunit"],
@@ -334,4 +403,6 @@ class ArgumentParser(argparse.ArgumentParser):
         args = super(ArgumentParser, self).parse_args(*args, **kwargs)
         if getattr(args, "all_tags", None) is None:
             args.all_tags = False
+        if args.concurrency is not None and args.parallel != "test":
+            self.error("--concurrency requires --parallel=test")
         return args
@@ -13,7 +13,8 @@
 
 from itertools import product
 from string import ascii_letters, digits
-import json
+
+from cafe.common import json_codec
 
 ALLOWED_FIRST_CHAR = "_{0}".format(ascii_letters)
 ALLOWED_OTHER_CHARS = "{0}{1}".format(ALLOWED_FIRST_CHAR, digits)
@@ -165,7 +166,7 @@ class DatasetFileLoader(DatasetList):
     """
     def __init__(self, file_object):
         super(DatasetFileLoader, self).__init__()
-        content = json.loads(str(file_object.read()))
+        content = json_codec.loads(file_object.read())
         count = 0
         for dataset in content:
             name = dataset.get('name', str(count))
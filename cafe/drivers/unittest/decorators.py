@@ -28,6 +28,9 @@ DATA_DRIVEN_TEST_PREFIX = "ddtest_"
 TAGS_DECORATOR_ATTR_DICT_NAME = "__test_attrs__"
 TAGS_DECORATOR_TAG_LIST_NAME = "__test_tags__"
 PARALLEL_TAGS_LIST_ATTR = "__parallel_test_tags__"
+# Tests tagged with this tag may run concurrently with the other tests of
+# their class under cafe-parallel --parallel=test --concurrency=thread:N
+THREAD_SAFE_TAG = "thread_safe"
 DD_CONFIG = DriverConfig()
 
 
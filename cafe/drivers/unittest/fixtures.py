@@ -16,14 +16,24 @@
 @note: Corresponds DIRECTLY TO A unittest.TestCase
 @see: http://docs.python.org/library/unittest.html#unittest.TestCase
 """
+from functools import wraps
+from multiprocessing.pool import ThreadPool
 import os
 import re
 import six
 import sys
+import threading
+import time
 import unittest
 
 from cafe.drivers.base import FixtureReporter
 
+try:
+    import asyncio
+except ImportError:
+    # asyncio is only available on python 3.4+
+    asyncio = None
+
 
 class BaseTestFixture(unittest.TestCase):
     """
@@ -34,6 +44,10 @@ class BaseTestFixture(unittest.TestCase):
 
     __test__ = True
 
+    # Number of threads used to run the class cleanup tasks registered with
+    # addIndependentClassCleanup.  When 0, all cleanup tasks run serially.
+    class_cleanup_workers = 0
+
     def shortDescription(self):
         """
         @summary: Returns a formatted description of the test
@@ -81,6 +95,7 @@ class BaseTestFixture(unittest.TestCase):
         cls.fixture_log = cls._reporter.logger.log
         cls._reporter.start()
         cls._class_cleanup_tasks = []
+        cls._independent_class_cleanup_tasks = set()
 
     @classmethod
     def tearDownClass(cls):
@@ -168,27 +183,72 @@ class BaseTestFixture(unittest.TestCase):
 
     @classmethod
     def _do_class_cleanup_tasks(cls):
-        """@summary: Runs class cleanup tasks added during testing"""
-        for func, args, kwargs in reversed(cls._class_cleanup_tasks):
-            cls.fixture_log.debug(
-                "Running class cleanup task: %s(%s, %s)",
+        """@summary: Runs class cleanup tasks added during testing, in
+        reverse order.  If class_cleanup_workers is set, each run of
+        consecutive independent tasks is executed concurrently on a thread
+        pool of that size, while every other task waits for the tasks
+        before it and keeps its place in the reverse order.
+        """
+        start_time = time.time()
+        independent_tasks = getattr(
+            cls, "_independent_class_cleanup_tasks", set())
+        pool = None
+        if cls.class_cleanup_workers and independent_tasks:
+            pool = ThreadPool(cls.class_cleanup_workers)
+
+        batch = []
+        try:
+            for index, task in reversed(
+                    list(enumerate(cls._class_cleanup_tasks))):
+                if pool is not None and index in independent_tasks:
+                    batch.append(task)
+                    continue
+                cls._run_class_cleanup_batch(pool, batch)
+                batch = []
+                cls._run_class_cleanup_task(*task)
+            cls._run_class_cleanup_batch(pool, batch)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if cls._class_cleanup_tasks:
+            cls.fixture_log.info(
+                "Ran %s class cleanup tasks in %.3fs",
+                len(cls._class_cleanup_tasks), time.time() - start_time)
+
+    @classmethod
+    def _run_class_cleanup_batch(cls, pool, batch):
+        """@summary: Runs a batch of independent class cleanup tasks
+        concurrently and waits for all of them to finish
+        """
+        if len(batch) > 1:
+            pool.map(lambda task: cls._run_class_cleanup_task(*task), batch)
+        elif batch:
+            cls._run_class_cleanup_task(*batch[0])
+
+    @classmethod
+    def _run_class_cleanup_task(cls, func, args, kwargs):
+        """@summary: Runs a single class cleanup task, logging any errors"""
+        cls.fixture_log.debug(
+            "Running class cleanup task: %s(%s, %s)",
+            func.__name__,
+            ", ".join([str(arg) for arg in args]),
+            ", ".join(["{0}={1}".format(
+                str(k), str(kwargs[k])) for k in kwargs]))
+        try:
+            func(*args, **kwargs)
+        except Exception as exception:
+            # Pretty prints method signature in the following format:
+            # "classTearDown failure: Unable to execute FnName(a, b, c=42)"
+            cls.fixture_log.exception(exception)
+            cls.fixture_log.error(
+                "classTearDown failure: Exception occured while trying to"
+                " execute class teardown task: %s(%s, %s)",
                 func.__name__,
                 ", ".join([str(arg) for arg in args]),
                 ", ".join(["{0}={1}".format(
                     str(k), str(kwargs[k])) for k in kwargs]))
-            try:
-                func(*args, **kwargs)
-            except Exception as exception:
-                # Pretty prints method signature in the following format:
-                # "classTearDown failure: Unable to execute FnName(a, b, c=42)"
-                cls.fixture_log.exception(exception)
-                cls.fixture_log.error(
-                    "classTearDown failure: Exception occured while trying to"
-                    " execute class teardown task: %s(%s, %s)",
-                    func.__name__,
-                    ", ".join([str(arg) for arg in args]),
-                    ", ".join(["{0}={1}".format(
-                        str(k), str(kwargs[k])) for k in kwargs]))
 
     @classmethod
     def addClassCleanup(cls, function, *args, **kwargs):
@@ -199,6 +259,140 @@ class BaseTestFixture(unittest.TestCase):
 
         cls._class_cleanup_tasks.append((function, args or [], kwargs or {}))
 
+    @classmethod
+    def addIndependentClassCleanup(cls, function, *args, **kwargs):
+        """@summary: Same as addClassCleanup, for tasks that do not depend on
+        any other cleanup task (e.g. deleting one of many servers).  These
+        run concurrently when class_cleanup_workers is set.
+        """
+
+        cls.addClassCleanup(function, *args, **kwargs)
+        if not hasattr(cls, "_independent_class_cleanup_tasks"):
+            cls._independent_class_cleanup_tasks = set()
+        cls._independent_class_cleanup_tasks.add(
+            len(cls._class_cleanup_tasks) - 1)
+
+
+class AsyncBaseTestFixture(BaseTestFixture):
+    """
+    @summary: Base test fixture for tests written as coroutines.
+              Test methods, asyncSetUp/asyncTearDown,
+              asyncSetUpClass/asyncTearDownClass, and cleanup functions
+              (addCleanup/addClassCleanup) may all be coroutine functions.
+              They run on an event loop owned by the class, which runs in
+              its own thread for the lifetime of the class, so every test of
+              the class shares one loop (and anything bound to it, such as a
+              connection pool).
+              Under OpenCafeAsyncTestSuite up to async_concurrency coroutine
+              tests of the class run at the same time; under any other
+              suite they run one at a time.
+    @note: Requires python 3.8+
+    """
+
+    # Maximum number of coroutine tests of the class run at the same time
+    async_concurrency = 10
+
+    @classmethod
+    def setUpClass(cls):
+        """@summary: Starts the class event loop, then runs
+        asyncSetUpClass on it
+        """
+        super(AsyncBaseTestFixture, cls).setUpClass()
+        if asyncio is None:
+            cls.assertClassSetupFailure("asyncio is not available")
+        if sys.version_info < (3, 8):
+            # Coroutine tests are only awaited through the _callTestMethod
+            # hooks unittest has since 3.8, before that they would pass
+            # without running
+            cls.assertClassSetupFailure(
+                "AsyncBaseTestFixture requires python 3.8+")
+        cls.loop = asyncio.new_event_loop()
+        cls._loop_thread = threading.Thread(
+            target=cls.loop.run_forever,
+            name="{0}-event-loop".format(cls.__name__))
+        cls._loop_thread.daemon = True
+        cls._loop_thread.start()
+        cls.run_coroutine(cls.asyncSetUpClass())
+
+    @classmethod
+    def tearDownClass(cls):
+        """@summary: Runs asyncTearDownClass on the class event loop"""
+        cls.run_coroutine(cls.asyncTearDownClass())
+        super(AsyncBaseTestFixture, cls).tearDownClass()
+
+    @classmethod
+    def asyncSetUpClass(cls):
+        """@summary: Override with a coroutine classmethod"""
+        pass
+
+    @classmethod
+    def asyncTearDownClass(cls):
+        """@summary: Override with a coroutine classmethod"""
+        pass
+
+    def asyncSetUp(self):
+        """@summary: Override with a coroutine method, runs after setUp"""
+        pass
+
+    def asyncTearDown(self):
+        """@summary: Override with a coroutine method, runs before
+        tearDown
+        """
+        pass
+
+    @classmethod
+    def run_coroutine(cls, coroutine):
+        """@summary: Runs a coroutine on the class event loop and waits for
+        its result.  Anything that is not a coroutine is returned as is.
+        """
+        if not asyncio.iscoroutine(coroutine):
+            return coroutine
+        return asyncio.run_coroutine_threadsafe(coroutine, cls.loop).result()
+
+    def _callSetUp(self):
+        self.setUp()
+        self.run_coroutine(self.asyncSetUp())
+
+    def _callTestMethod(self, method):
+        self.run_coroutine(method())
+
+    def _callTearDown(self):
+        self.run_coroutine(self.asyncTearDown())
+        self.tearDown()
+
+    def _callCleanup(self, function, *args, **kwargs):
+        self.run_coroutine(function(*args, **kwargs))
+
+    @classmethod
+    def addClassCleanup(cls, function, *args, **kwargs):
+        """@summary: Same as BaseTestFixture.addClassCleanup, also accepts
+        coroutine functions
+        """
+        if asyncio is not None and asyncio.iscoroutinefunction(function):
+            coroutine_function = function
+
+            @wraps(coroutine_function)
+            def function(*args, **kwargs):
+                return cls.run_coroutine(coroutine_function(*args, **kwargs))
+
+        super(AsyncBaseTestFixture, cls).addClassCleanup(
+            function, *args, **kwargs)
+
+    @classmethod
+    def _do_class_cleanup_tasks(cls):
+        """@summary: Runs class cleanup tasks, then stops the class event
+        loop
+        """
+        try:
+            super(AsyncBaseTestFixture, cls)._do_class_cleanup_tasks()
+        finally:
+            loop = cls.__dict__.get("loop")
+            if loop is not None:
+                loop.call_soon_threadsafe(loop.stop)
+                cls._loop_thread.join()
+                loop.close()
+                cls.loop = None
+
 
 class BaseBurnInTestFixture(BaseTestFixture):
     """
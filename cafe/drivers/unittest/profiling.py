@@ -0,0 +1,228 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Per-test and per-class profiling for the unittest runners.
+
+A TestProfiler is carried on the test result object so that both the result
+(per-test scope) and OpenCafeUnittestTestSuite (per-class scope) can reach
+it.  Every profiled unit is written to its own file under
+<test_log_dir>/profiles, and merge() combines them into a single ranked
+hotspot report at the end of the run.
+"""
+
+from unittest import TextTestResult
+from unittest.util import strclass
+import cProfile
+import errno
+import glob
+import os
+import pstats
+import re
+
+from six import StringIO
+
+from cafe.engine.config import EngineConfig
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only available on python 3.4+
+    tracemalloc = None
+
+
+class ProfileTypes(object):
+    """Types of profiling supported by TestProfiler"""
+    CPU = "cpu"
+    MEMORY = "memory"
+
+
+class ProfileScopes(object):
+    """Units of work wrapped by a single profile"""
+    TEST = "test"
+    CLASS = "class"
+
+
+class ProfilerException(Exception):
+    pass
+
+
+class TestProfiler(object):
+    """
+    Wraps units of work in cProfile or tracemalloc and writes one profile
+    file per unit into the profile directory.
+    """
+
+    EXTENSIONS = {ProfileTypes.CPU: "prof", ProfileTypes.MEMORY: "tracemalloc"}
+    REPORT_FILE_NAME = "hotspots.txt"
+    MEMORY_TRACE_FILTERS = ("<frozen importlib._bootstrap>", "<unknown>")
+
+    def __init__(
+            self, profile_type, scope=ProfileScopes.TEST, profile_dir=None,
+            limit=50):
+        if profile_type not in self.EXTENSIONS:
+            raise ProfilerException(
+                "Unknown profile type: {0}".format(profile_type))
+        if profile_type == ProfileTypes.MEMORY and tracemalloc is None:
+            raise ProfilerException(
+                "Memory profiling requires tracemalloc (python 3.4+)")
+        self.profile_type = profile_type
+        self.scope = scope
+        self.limit = limit
+        self.profile_dir = profile_dir or os.path.join(
+            EngineConfig().test_log_dir, "profiles")
+        self._name = None
+        self._profile = None
+
+    def __getstate__(self):
+        # Only configuration crosses process boundaries, never a live profile
+        state = dict(self.__dict__)
+        state["_name"] = None
+        state["_profile"] = None
+        return state
+
+    @property
+    def is_running(self):
+        return self._name is not None
+
+    def start(self, name):
+        """Starts profiling a unit of work identified by name"""
+        if self.is_running:
+            self.stop()
+        self._name = name
+        if self.profile_type == ProfileTypes.CPU:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start()
+
+    def stop(self):
+        """Stops profiling and writes the profile file.  Returns its path, or
+        None if nothing was being profiled.
+        """
+        if not self.is_running:
+            return None
+        path = self._get_profile_path(self._name)
+        try:
+            os.makedirs(self.profile_dir)
+        except OSError as exception:
+            # Parallel workers may race to create the directory
+            if exception.errno != errno.EEXIST:
+                raise
+        if self.profile_type == ProfileTypes.CPU:
+            self._profile.disable()
+            self._profile.dump_stats(path)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            snapshot = snapshot.filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)] +
+                [tracemalloc.Filter(False, pattern)
+                 for pattern in self.MEMORY_TRACE_FILTERS])
+            snapshot.dump(path)
+        self._name = None
+        self._profile = None
+        return path
+
+    def get_profile_files(self):
+        """Returns all profile files of this profile type, sorted by name"""
+        return sorted(glob.glob(os.path.join(
+            self.profile_dir, "*.{0}".format(
+                self.EXTENSIONS[self.profile_type]))))
+
+    def merge(self):
+        """Merges every profile file into a single ranked hotspot report.
+        Returns the path of the report, or None if there was nothing to merge.
+        """
+        files = self.get_profile_files()
+        if not files:
+            return None
+        if self.profile_type == ProfileTypes.CPU:
+            report = self._merge_cpu_profiles(files)
+        else:
+            report = self._merge_memory_profiles(files)
+        path = os.path.join(self.profile_dir, self.REPORT_FILE_NAME)
+        with open(path, "w") as report_file:
+            report_file.write(report)
+        return path
+
+    def _get_profile_path(self, name):
+        file_name = re.sub(r"[^\w.\-]", "_", name)
+        return os.path.join(self.profile_dir, "{0}.{1}".format(
+            file_name, self.EXTENSIONS[self.profile_type]))
+
+    def _merge_cpu_profiles(self, files):
+        stream = StringIO()
+        stats = pstats.Stats(files[0], stream=stream)
+        for file_ in files[1:]:
+            stats.add(file_)
+        stream.write("Merged {0} cpu profile(s)\n".format(len(files)))
+        stats.sort_stats("tottime").print_stats(self.limit)
+        stats.sort_stats("cumulative").print_stats(self.limit)
+        return stream.getvalue()
+
+    def _merge_memory_profiles(self, files):
+        # key: "file:line", value: [size, count, number of profiles]
+        totals = {}
+        for file_ in files:
+            snapshot = tracemalloc.Snapshot.load(file_)
+            for stat in snapshot.statistics("lineno"):
+                frame = stat.traceback[0]
+                key = "{0}:{1}".format(frame.filename, frame.lineno)
+                total = totals.setdefault(key, [0, 0, 0])
+                total[0] += stat.size
+                total[1] += stat.count
+                total[2] += 1
+
+        ranked = sorted(
+            totals.items(), key=lambda item: item[1][0], reverse=True)
+        lines = [
+            "Merged {0} memory profile(s)".format(len(files)),
+            "Allocations still alive at the end of each profiled unit",
+            "{0:>14} {1:>10} {2:>9}  {3}".format(
+                "size (KiB)", "blocks", "profiles", "location")]
+        for key, (size, count, profiles) in ranked[:self.limit]:
+            lines.append("{0:>14.1f} {1:>10} {2:>9}  {3}".format(
+                size / 1024.0, count, profiles, key))
+        return "{0}\n".format("\n".join(lines))
+
+
+class ProfilingTextTestResult(TextTestResult):
+    """TextTestResult that profiles every test when given a test scoped
+    TestProfiler.  Class scoped profiling is handled by
+    OpenCafeUnittestTestSuite, which looks the profiler up on the result.
+
+    When given a StackSampler, the sampler's label is kept pointing at the
+    running test, and at the test's class in between tests.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.profiler = kwargs.pop("profiler", None)
+        self.sampler = kwargs.pop("sampler", None)
+        super(ProfilingTextTestResult, self).__init__(*args, **kwargs)
+
+    def startTest(self, test):
+        if self.sampler is not None:
+            self.sampler.label = test.id()
+        if (self.profiler is not None and
+                self.profiler.scope == ProfileScopes.TEST):
+            self.profiler.start(test.id())
+        super(ProfilingTextTestResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(ProfilingTextTestResult, self).stopTest(test)
+        if (self.profiler is not None and
+                self.profiler.scope == ProfileScopes.TEST):
+            self.profiler.stop()
+        if self.sampler is not None:
+            self.sampler.label = strclass(test.__class__)
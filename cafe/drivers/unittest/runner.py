@@ -18,6 +18,7 @@ import sys
 import time
 import unittest
 import uuid
+from functools import partial
 from importlib import import_module
 from inspect import isclass
 from re import search
@@ -27,6 +28,8 @@ from cafe.common.reporting.reporter import Reporter
 from cafe.drivers.unittest.decorators import (
     TAGS_DECORATOR_TAG_LIST_NAME, TAGS_DECORATOR_ATTR_DICT_NAME)
 from cafe.drivers.unittest.parsers import SummarizeResults
+from cafe.drivers.unittest.profiling import (
+    ProfilingTextTestResult, TestProfiler)
 from cafe.drivers.unittest.suite import OpenCafeUnittestTestSuite
 from cafe.engine.config import EngineConfig, ENGINE_CONFIG_PATH
 from cafe.engine.models.data_interfaces import CONFIG_KEY
@@ -622,6 +625,18 @@ class _UnittestRunnerCLI(object):
             action="store_true",
             default=False)
 
+        argparser.add_argument(
+            "--profile",
+            choices=["cpu", "memory"],
+            help="profile each test (or class, see --profile-scope) with "
+                 "cProfile (cpu) or tracemalloc (memory)")
+
+        argparser.add_argument(
+            "--profile-scope",
+            choices=["test", "class"],
+            default="test",
+            help="unit of work wrapped by each --profile profile")
+
         argparser.add_argument(
             "--dry-run",
             action="store_true",
@@ -679,6 +694,10 @@ class UnittestRunner(object):
         self._log = cclogging.getLogger(
             cclogging.get_object_namespace(self.__class__))
         self.product = self.cl_args.product
+        self.profiler = None
+        if self.cl_args.profile:
+            self.profiler = TestProfiler(
+                self.cl_args.profile, scope=self.cl_args.profile_scope)
         self.print_mug_and_paths()
 
     def print_mug_and_paths(self):
@@ -708,7 +727,7 @@ class UnittestRunner(object):
         results.update({test_id: result})
 
     @staticmethod
-    def get_runner(cl_args):
+    def get_runner(cl_args, profiler=None):
         test_runner = None
 
         # Use the parallel text runner so the console logs look correct
@@ -719,6 +738,9 @@ class UnittestRunner(object):
             test_runner = unittest.TextTestRunner(verbosity=cl_args.verbose)
 
         test_runner.failfast = cl_args.fail_fast
+        if profiler is not None:
+            test_runner.resultclass = partial(
+                ProfilingTextTestResult, profiler=profiler)
         return test_runner
 
     @staticmethod
@@ -754,7 +776,7 @@ class UnittestRunner(object):
         test_count = 0
 
         builder = SuiteBuilder(self.cl_args, self.config.default_test_repo)
-        test_runner = self.get_runner(self.cl_args)
+        test_runner = self.get_runner(self.cl_args, self.profiler)
 
         if self.cl_args.parallel:
             parallel_test_list = builder.generate_suite_list()
@@ -779,6 +801,11 @@ class UnittestRunner(object):
                 master_suite, test_runner, result_type=self.cl_args.result,
                 results_path=self.cl_args.result_directory)
 
+        if self.profiler is not None:
+            report_path = self.profiler.merge()
+            if report_path is not None:
+                print("Profile hotspots: {0}".format(report_path))
+
         """
         Exit with a non-zero exit code if no tests where run, so that
         external monitoring programs (like Jenkins) can tell
@@ -25,7 +25,9 @@ except:
     from multiprocessing import Process, Queue
 
 from six import StringIO
+from six.moves.queue import Empty
 from unittest.runner import _WritelnDecorator
+from unittest.util import strclass
 import importlib
 import logging
 import os
@@ -39,16 +41,26 @@ from cafe.configurator.managers import ENGINE_CONFIG_PATH
 from cafe.drivers.unittest.arguments import ArgumentParser
 from cafe.drivers.base import print_exception, get_error
 from cafe.drivers.unittest.decorators import create_dd_class
+from cafe.drivers.unittest.fixtures import AsyncBaseTestFixture
 from cafe.drivers.unittest.parsers import SummarizeResults
-from cafe.drivers.unittest.suite import OpenCafeUnittestTestSuite
+from cafe.drivers.unittest.profiling import (
+    ProfilingTextTestResult, TestProfiler)
+from cafe.drivers.unittest.sampling import (
+    DUMP_SIGNAL, StackSampler, merge_samples, write_folded_stacks)
+from cafe.drivers.unittest.suite import (
+    OpenCafeAsyncTestSuite, OpenCafeThreadedTestSuite,
+    OpenCafeUnittestTestSuite)
 from cafe.drivers.unittest.suite_builder import SuiteBuilder
 from cafe.engine.config import EngineConfig
+from cafe.engine.models.data_interfaces import (
+    ENVIRONMENT_LAYER, LayeredDataSource)
 
 
-def _make_result(verbose, failfast):
+def _make_result(verbose, failfast, profiler=None, sampler=None):
     """Creates a TextTestResult object that writes a stream to a StringIO"""
     stream = _WritelnDecorator(StringIO())
-    result = unittest.TextTestResult(stream, True, verbose)
+    result = ProfilingTextTestResult(
+        stream, True, verbose, profiler=profiler, sampler=sampler)
     result.buffer = False
     result.failfast = failfast
     del result._original_stdout
@@ -79,6 +91,22 @@ class UnittestRunner(object):
         self.cl_args = ArgumentParser().parse_args()
         self.config = EngineConfig()
         cclogging.init_root_log_handler()
+        # Requested layers are merged once here and handed to the workers
+        self.config_layers = None
+        if self.cl_args.config_layers:
+            self.config_layers = LayeredDataSource(
+                [self.config.test_config] + self.cl_args.config_layers +
+                [ENVIRONMENT_LAYER])
+            self.config_layers.install()
+        self.profiler = None
+        if self.cl_args.profile:
+            self.profiler = TestProfiler(
+                self.cl_args.profile, scope=self.cl_args.profile_scope)
+        self.samples = {}
+        self.samples_dir = None
+        if self.cl_args.sample_interval or self.cl_args.hang_timeout:
+            self.samples_dir = os.path.join(
+                self.config.test_log_dir, "samples")
         self.print_configuration(self.cl_args.testrepos)
         self.datagen_start = time.time()
         self.cl_args.testrepos = import_repos(self.cl_args.testrepos)
@@ -107,6 +135,12 @@ class UnittestRunner(object):
         verbose = self.cl_args.verbose
         failfast = self.cl_args.failfast
         workers = int(not self.cl_args.parallel) or self.cl_args.workers
+        threads = None
+        if self.cl_args.parallel == "test":
+            threads = self.cl_args.concurrency
+        sample_interval = None
+        if self.cl_args.sample_interval:
+            sample_interval = self.cl_args.sample_interval / 1000.0
 
         # enumerate is used to count suites
         count = 0
@@ -123,17 +157,23 @@ class UnittestRunner(object):
         # when they go out of scope, especially when termination signals used
         try:
             for _ in range(workers):
-                proc = Consumer(to_worker, from_worker, verbose, failfast)
+                proc = Consumer(
+                    to_worker, from_worker, verbose, failfast, self.profiler,
+                    sample_interval, self.samples_dir, threads,
+                    self.config_layers)
                 worker_list.append(proc)
                 proc.start()
 
             for _ in range(count):
-                results.append(self.log_result(from_worker.get()))
+                results.append(self.log_result(
+                    self.get_result(from_worker, worker_list)))
 
             end = time.time()
             tests_run, errors, failures = self.compile_results(
                 run_time=end - start, datagen_time=start - self.datagen_start,
                 results=results)
+            self.merge_profiles()
+            self.write_samples()
 
         except KeyboardInterrupt:
             print_exception("Runner", "run", "Keyboard Interrupt, exiting...")
@@ -169,6 +209,53 @@ class UnittestRunner(object):
         print("LOG PATH..........: {0}".format(self.config.test_log_dir))
         print("=" * 150)
 
+    def merge_profiles(self):
+        """Merges the per test/class profiles written by the workers"""
+        if self.profiler is None:
+            return
+        report_path = self.profiler.merge()
+        if report_path is not None:
+            print("Profile hotspots: {0}\n{1}".format(report_path, "-" * 150))
+
+    def get_result(self, from_worker, worker_list):
+        """Waits for the next result from the workers.  If --hang-timeout is
+        set, every worker is asked to dump its stacks each time the timeout
+        expires without a result.
+        """
+        while True:
+            try:
+                dic = from_worker.get(timeout=self.cl_args.hang_timeout)
+            except Empty:
+                self.request_stack_dumps(worker_list)
+                continue
+            merge_samples(self.samples, dic.get("samples", {}))
+            return dic
+
+    def request_stack_dumps(self, worker_list):
+        """Signals every live worker to dump its current stacks"""
+        if DUMP_SIGNAL is None:
+            print_exception(
+                "Runner", "request_stack_dumps",
+                "Stack dumps are not supported on this platform")
+            return
+        pids = []
+        for proc in worker_list:
+            if proc.is_alive():
+                os.kill(proc.pid, DUMP_SIGNAL)
+                pids.append(str(proc.pid))
+        sys.stderr.write(
+            "No result received in {0}s, dumped stacks of workers {1} to "
+            "{2}\n".format(
+                self.cl_args.hang_timeout, ", ".join(pids), self.samples_dir))
+        sys.stderr.flush()
+
+    def write_samples(self):
+        """Writes the stack samples collected by the workers"""
+        paths = write_folded_stacks(self.samples, self.samples_dir)
+        if paths:
+            print("Folded stack samples: {0}\n{1}".format(
+                paths[-1], "-" * 150))
+
     @staticmethod
     def log_result(dic):
         """Gets logs and stream from Comsumer and outputs to logs and stdout.
@@ -258,24 +345,50 @@ class ParallelRecordHandler(logging.Handler):
 class Consumer(Process):
     """This class runs as a process and does the test running"""
 
-    def __init__(self, to_worker, from_worker, verbose, failfast):
+    def __init__(
+            self, to_worker, from_worker, verbose, failfast, profiler=None,
+            sample_interval=None, samples_dir=None, threads=None,
+            config_layers=None):
         Process.__init__(self)
         self.to_worker = to_worker
         self.from_worker = from_worker
         self.verbose = verbose
         self.failfast = failfast
+        self.profiler = profiler
+        self.sample_interval = sample_interval
+        self.samples_dir = samples_dir
+        self.threads = threads
+        self.config_layers = config_layers
 
     def run(self):
         """Starts the worker listening"""
         logger = logging.getLogger('')
+        if self.config_layers is not None:
+            self.config_layers.install()
+        sampler = None
+        if self.samples_dir is not None:
+            sampler = StackSampler(self.sample_interval)
+            sampler.install_dump_handler(self.samples_dir)
+            sampler.start()
         while True:
-            result = _make_result(self.verbose, self.failfast)
-            suite = OpenCafeUnittestTestSuite()
+            result = _make_result(
+                self.verbose, self.failfast, self.profiler, sampler)
             try:
                 tests, class_, dataset = self.to_worker.get()
             except TypeError:
+                if sampler is not None:
+                    sampler.stop()
                 return
             class_ = create_dd_class(class_, dataset)
+            if issubclass(class_, AsyncBaseTestFixture):
+                suite = OpenCafeAsyncTestSuite()
+            elif self.threads:
+                suite = OpenCafeThreadedTestSuite(workers=self.threads)
+            else:
+                suite = OpenCafeUnittestTestSuite()
+            if sampler is not None:
+                # Samples taken during class setup belong to the class
+                sampler.label = strclass(class_)
             for test in tests:
                 try:
                     test_obj = class_(test)
@@ -294,12 +407,19 @@ class Consumer(Process):
                             *record.exc_info))
                 record.exc_info = None
             result._previousTestClass = None
+            # The profiler and sampler stay in the worker, only results and
+            # samples go back
+            result.profiler = None
+            result.sampler = None
+            if sampler is not None:
+                sampler.label = None
             result_parser = SummarizeResults(vars(result), suite)
             dic = {
                 "all_results": result_parser.gather_results(),
                 "summary": result_parser.summary_result(),
                 "result": result,
-                "logs": handler._records}
+                "logs": handler._records,
+                "samples": sampler.pop_samples() if sampler else {}}
             self.from_worker.put(dic)
 
 
@@ -0,0 +1,179 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Sampling profiler for cafe-parallel workers.
+
+A StackSampler runs inside each Consumer process.  A background thread
+periodically samples the stack of the thread running the tests and counts it
+against the label of the test (or class) currently running.  Samples travel
+back to the parent with each result and are written out as flamegraph
+compatible folded stacks ("frame;frame;frame count" lines).  The parent can
+also ask a worker for an immediate dump of all of its stacks by sending it
+SIGUSR1, which is how hung workers are diagnosed.
+"""
+
+from datetime import datetime
+import errno
+import os
+import re
+import signal
+import sys
+import threading
+
+IDLE_LABEL = "<idle>"
+DUMP_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+
+def fold_stack(frame):
+    """Returns the stack starting at frame in folded format, outermost frame
+    first.
+    """
+    names = []
+    while frame is not None:
+        names.append("{0}:{1}".format(
+            frame.f_globals.get("__name__", "?"), frame.f_code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def merge_samples(target, samples):
+    """Adds samples ({label: {stack: count}}) into target in place"""
+    for label, stacks in samples.items():
+        target_stacks = target.setdefault(label, {})
+        for stack, count in stacks.items():
+            target_stacks[stack] = target_stacks.get(stack, 0) + count
+    return target
+
+
+def _make_dirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+
+def _label_to_file_name(label):
+    return re.sub(r"[^\w.\-]", "_", label)
+
+
+def write_folded_stacks(samples, directory):
+    """Writes one <label>.folded file per label plus all.folded, where every
+    stack is rooted at its label.  Returns the list of written paths.
+    """
+    if not samples:
+        return []
+    _make_dirs(directory)
+    paths = []
+    all_lines = []
+    for label, stacks in sorted(samples.items()):
+        lines = ["{0} {1}".format(stack, count)
+                 for stack, count in sorted(stacks.items())]
+        all_lines.extend(["{0};{1}".format(label, line) for line in lines])
+        path = os.path.join(directory, "{0}.folded".format(
+            _label_to_file_name(label)))
+        with open(path, "w") as folded_file:
+            folded_file.write("{0}\n".format("\n".join(lines)))
+        paths.append(path)
+
+    path = os.path.join(directory, "all.folded")
+    with open(path, "w") as folded_file:
+        folded_file.write("{0}\n".format("\n".join(all_lines)))
+    paths.append(path)
+    return paths
+
+
+class StackSampler(object):
+    """
+    Samples the stack of a single thread (by default the one creating the
+    sampler) every interval seconds and counts the folded stacks per label.
+    With an interval of None no sampling thread is started, but labels are
+    still tracked so on demand dumps can be attributed to a test.
+    """
+
+    def __init__(self, interval=None, thread_id=None):
+        self.interval = interval
+        self.label = None
+        self.samples = {}
+        self._thread_id = thread_id or threading.current_thread().ident
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the sampling thread"""
+        if self.interval is None or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cafe-stack-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the sampling thread"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Records a single sample of the sampled thread's stack.  Nothing is
+        recorded while no label is set (the worker is idle).
+        """
+        label = self.label
+        frame = sys._current_frames().get(self._thread_id)
+        if label is None or frame is None:
+            return
+        stack = fold_stack(frame)
+        with self._lock:
+            stacks = self.samples.setdefault(label, {})
+            stacks[stack] = stacks.get(stack, 0) + 1
+
+    def pop_samples(self):
+        """Returns all samples recorded so far and starts a new collection"""
+        with self._lock:
+            samples, self.samples = self.samples, {}
+        return samples
+
+    def dump(self, directory):
+        """Appends the current stack of every thread but the sampler's to
+        <directory>/<pid>.dump and returns the path.
+        """
+        _make_dirs(directory)
+        path = os.path.join(directory, "{0}.dump".format(os.getpid()))
+        sampler_id = getattr(self._thread, "ident", None)
+        lines = ["# {0} pid={1} label={2}".format(
+            datetime.now(), os.getpid(), self.label or IDLE_LABEL)]
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != sampler_id:
+                lines.append("{0} 1".format(fold_stack(frame)))
+        with open(path, "a") as dump_file:
+            dump_file.write("{0}\n".format("\n".join(lines)))
+        return path
+
+    def install_dump_handler(self, directory):
+        """Dumps all stacks to directory whenever DUMP_SIGNAL is received.
+        Returns False on platforms without DUMP_SIGNAL.
+        """
+        if DUMP_SIGNAL is None:
+            return False
+        signal.signal(
+            DUMP_SIGNAL, lambda signum, frame: self.dump(directory))
+        return True
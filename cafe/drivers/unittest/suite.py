@@ -18,16 +18,48 @@ more granular approach to teardown to be used in setUpClass and classmethod
 helper methods
 """
 
+from multiprocessing.pool import ThreadPool
+from unittest.result import TestResult
 from unittest.suite import TestSuite, _DebugResult, util
+import copy
+import logging
+import threading
+
+from cafe.drivers.unittest.decorators import (
+    PARALLEL_TAGS_LIST_ATTR, THREAD_SAFE_TAG)
+from cafe.drivers.unittest.profiling import ProfileScopes, ProfileTypes
+from cafe.drivers.unittest.sampling import StackSampler, merge_samples
+
+try:
+    import asyncio
+except ImportError:
+    # asyncio is only available on python 3.4+
+    asyncio = None
 
 
 class OpenCafeUnittestTestSuite(TestSuite):
 
+    @staticmethod
+    def _get_class_profiler(result):
+        profiler = getattr(result, 'profiler', None)
+        if profiler is not None and profiler.scope == ProfileScopes.CLASS:
+            return profiler
+        return None
+
     def _tearDownPreviousClass(self, test, result):
         previousClass = getattr(result, '_previousTestClass', None)
         currentClass = test.__class__
         if currentClass == previousClass:
             return
+        try:
+            self._tearDownClass(previousClass, result)
+        finally:
+            # Class scoped profiles include the teardown and cleanup tasks
+            profiler = self._get_class_profiler(result)
+            if profiler is not None:
+                profiler.stop()
+
+    def _tearDownClass(self, previousClass, result):
         if getattr(previousClass, '_classSetupFailed', False):
             return
         if getattr(result, '_moduleSetUpFailed', False):
@@ -74,6 +106,10 @@ class OpenCafeUnittestTestSuite(TestSuite):
             # so its class will be a builtin-type
             pass
 
+        profiler = self._get_class_profiler(result)
+        if profiler is not None:
+            profiler.start(util.strclass(currentClass))
+
         setUpClass = getattr(currentClass, 'setUpClass', None)
         if setUpClass is not None:
             try:
@@ -87,3 +123,265 @@ class OpenCafeUnittestTestSuite(TestSuite):
                 self._addClassOrModuleLevelException(result, e, errorName)
                 # Monkeypatch: Run class cleanup if setUpClass fails
                 currentClass._do_class_cleanup_tasks()
+
+
+class OpenCafeThreadedTestSuite(OpenCafeUnittestTestSuite):
+    """
+    Runs the tests of a single class on a pool of threads, sharing one
+    setUpClass.  Only tests tagged with THREAD_SAFE_TAG run concurrently;
+    all other tests run serially first, in their usual order.
+    """
+
+    def __init__(self, tests=(), workers=1):
+        super(OpenCafeThreadedTestSuite, self).__init__(tests)
+        self.workers = workers
+
+    @staticmethod
+    def is_thread_safe(test):
+        method = getattr(test, getattr(test, '_testMethodName', ''), None)
+        return THREAD_SAFE_TAG in getattr(method, PARALLEL_TAGS_LIST_ATTR, [])
+
+    def run(self, result, debug=False):
+        if debug or self.workers < 2:
+            return super(OpenCafeThreadedTestSuite, self).run(result, debug)
+
+        serial_tests = []
+        thread_safe_tests = []
+        for test in self:
+            if self.is_thread_safe(test):
+                thread_safe_tests.append(test)
+            else:
+                serial_tests.append(test)
+        suite = OpenCafeUnittestTestSuite(serial_tests)
+        if thread_safe_tests:
+            suite.addTest(
+                _ConcurrentTestGroup(thread_safe_tests, self.workers))
+        return suite.run(result)
+
+
+class OpenCafeAsyncTestSuite(OpenCafeThreadedTestSuite):
+    """
+    Runs the coroutine tests of a single AsyncBaseTestFixture class
+    concurrently on the class event loop.  At most workers tests are in
+    flight at once, defaulting to the class's async_concurrency.  Tests that
+    are not coroutines run serially first.
+
+    Each in-flight test is driven by a pool thread that waits on its
+    coroutines, so setUp/tearDown, skips, expected failures and cleanups keep
+    their usual unittest semantics while the actual work is interleaved on
+    the shared loop.
+    """
+
+    def __init__(self, tests=(), workers=None):
+        super(OpenCafeAsyncTestSuite, self).__init__(tests, workers)
+
+    @staticmethod
+    def is_thread_safe(test):
+        method = getattr(test, getattr(test, '_testMethodName', ''), None)
+        return asyncio is not None and asyncio.iscoroutinefunction(method)
+
+    def run(self, result, debug=False):
+        if self.workers is None:
+            self.workers = max([
+                getattr(test.__class__, 'async_concurrency', 1)
+                for test in self] or [1])
+        return super(OpenCafeAsyncTestSuite, self).run(result, debug)
+
+
+class _ConcurrentTestGroup(OpenCafeUnittestTestSuite):
+    """
+    Runs tests of the same class concurrently.  Being a suite, the enclosing
+    suite does not handle class fixtures for it, so the group sets up the
+    class itself and leaves the teardown to the enclosing suite.
+
+    Each test runs against its own _TestOutcomeRecorder, which is replayed
+    onto the shared result as a whole once the test is done, together with
+    the log records emitted by the test's thread.  The recorder also does
+    the per test cpu profiling and stack sampling of the shared result, in
+    the test's thread while the test runs.  Memory is traced process wide,
+    so concurrent tests get no per test memory profile.
+    """
+
+    def __init__(self, tests, workers):
+        super(_ConcurrentTestGroup, self).__init__(tests)
+        self.workers = workers
+        self._lock = threading.Lock()
+
+    def run(self, result, debug=False):
+        tests = list(self)
+        if not tests or result.shouldStop:
+            return result
+
+        first_test = tests[0]
+        self._tearDownPreviousClass(first_test, result)
+        self._handleModuleFixture(first_test, result)
+        self._handleClassSetUp(first_test, result)
+        result._previousTestClass = first_test.__class__
+        if (getattr(first_test.__class__, '_classSetupFailed', False) or
+                getattr(result, '_moduleSetUpFailed', False)):
+            return result
+
+        root_log = logging.getLogger()
+        log_router = _ThreadLogRouter(root_log.handlers)
+        root_log.handlers = [log_router]
+        pool = ThreadPool(min(self.workers, len(tests)))
+        try:
+            pool.map(
+                lambda test: self._run_test(test, result, log_router), tests)
+        finally:
+            pool.close()
+            pool.join()
+            root_log.handlers = log_router.handlers
+            log_router.flush_all()
+        return result
+
+    def _run_test(self, test, result, log_router):
+        if result.shouldStop:
+            return
+        profiler = getattr(result, 'profiler', None)
+        if (profiler is None or profiler.scope != ProfileScopes.TEST or
+                profiler.profile_type != ProfileTypes.CPU):
+            profiler = None
+        sampler = getattr(result, 'sampler', None)
+        recorder = _TestOutcomeRecorder(
+            # Copies carry the configuration only, not the running profile
+            profiler=copy.copy(profiler) if profiler is not None else None,
+            sampler=None if sampler is None or sampler.interval is None
+            else StackSampler(sampler.interval))
+        thread = threading.current_thread()
+        thread_name = thread.name
+        # Lets log formatters and readers tell concurrent tests apart
+        thread.name = test.id()
+        try:
+            test(recorder)
+        finally:
+            thread.name = thread_name
+            with self._lock:
+                if recorder.sampler is not None:
+                    with sampler._lock:
+                        merge_samples(
+                            sampler.samples, recorder.sampler.pop_samples())
+                self._replay(test, recorder, result)
+                log_router.flush_thread(thread.ident)
+
+    @staticmethod
+    def _replay(test, recorder, result):
+        """Records the outcome of test on result, without profiling or
+        sampling it again
+        """
+        hooks = dict(
+            (name, getattr(result, name, None))
+            for name in ('profiler', 'sampler'))
+        for name, hook in hooks.items():
+            if hook is not None:
+                setattr(result, name, None)
+        try:
+            result.startTest(test)
+            recorder.replay(result)
+            result.stopTest(test)
+        finally:
+            for name, hook in hooks.items():
+                if hook is not None:
+                    setattr(result, name, hook)
+
+
+class _TestOutcomeRecorder(TestResult):
+    """Records the outcome of a single test so it can be replayed later.
+    The test is profiled and sampled by the recorder's own profiler and
+    sampler, if given, from its start to its end.
+    """
+
+    def __init__(self, profiler=None, sampler=None):
+        super(_TestOutcomeRecorder, self).__init__()
+        self.outcomes = []
+        self.profiler = profiler
+        self.sampler = sampler
+
+    def startTest(self, test):
+        super(_TestOutcomeRecorder, self).startTest(test)
+        if self.sampler is not None:
+            self.sampler.label = test.id()
+            self.sampler.start()
+        if self.profiler is not None:
+            try:
+                self.profiler.start(test.id())
+            except ValueError:
+                # Python 3.12+ allows a single active cProfile at a time
+                self.profiler = None
+
+    def stopTest(self, test):
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.label = None
+        super(_TestOutcomeRecorder, self).stopTest(test)
+
+    def _record(self, name, *args):
+        self.outcomes.append((name, args))
+
+    def addError(self, test, err):
+        super(_TestOutcomeRecorder, self).addError(test, err)
+        self._record('addError', test, err)
+
+    def addFailure(self, test, err):
+        super(_TestOutcomeRecorder, self).addFailure(test, err)
+        self._record('addFailure', test, err)
+
+    def addSuccess(self, test):
+        super(_TestOutcomeRecorder, self).addSuccess(test)
+        self._record('addSuccess', test)
+
+    def addSkip(self, test, reason):
+        super(_TestOutcomeRecorder, self).addSkip(test, reason)
+        self._record('addSkip', test, reason)
+
+    def addExpectedFailure(self, test, err):
+        super(_TestOutcomeRecorder, self).addExpectedFailure(test, err)
+        self._record('addExpectedFailure', test, err)
+
+    def addUnexpectedSuccess(self, test):
+        super(_TestOutcomeRecorder, self).addUnexpectedSuccess(test)
+        self._record('addUnexpectedSuccess', test)
+
+    def addSubTest(self, test, subtest, err):
+        super(_TestOutcomeRecorder, self).addSubTest(test, subtest, err)
+        self._record('addSubTest', test, subtest, err)
+
+    def replay(self, result):
+        for name, args in self.outcomes:
+            getattr(result, name)(*args)
+
+
+class _ThreadLogRouter(logging.Handler):
+    """Buffers log records per thread so that the records of each
+    concurrently running test reach the real handlers in one block.
+    """
+
+    def __init__(self, handlers):
+        super(_ThreadLogRouter, self).__init__()
+        self.handlers = list(handlers)
+        self._records = {}
+        self._records_lock = threading.Lock()
+
+    def emit(self, record):
+        with self._records_lock:
+            self._records.setdefault(record.thread, []).append(record)
+
+    def flush_thread(self, thread_id):
+        with self._records_lock:
+            records = self._records.pop(thread_id, [])
+        self._forward(records)
+
+    def flush_all(self):
+        with self._records_lock:
+            records = [record for records in self._records.values()
+                       for record in records]
+            self._records = {}
+        self._forward(sorted(records, key=lambda record: record.created))
+
+    def _forward(self, records):
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
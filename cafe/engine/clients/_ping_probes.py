@@ -0,0 +1,119 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Coroutines probing hosts for PingClient.ping_many (python 3.5+ only).
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import time
+
+from cafe.engine.clients.ping import PingResult
+
+
+def _running_loop():
+    """Returns the event loop running in this thread, None if there is
+    none
+    """
+    # asyncio._get_running_loop is only available on python 3.5.3+
+    get_running_loop = getattr(asyncio, "_get_running_loop", None)
+    return get_running_loop() if get_running_loop else None
+
+
+async def probe_all(probe, ips, max_concurrency, done):
+    """Awaits probe(ip) for every ip, at most max_concurrency at a time, and
+    returns the results in the order of ips.  done is called with the
+    results and the seconds elapsed.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited(ip):
+        async with semaphore:
+            return await probe(ip)
+
+    start = time.time()
+    results = await asyncio.gather(*[limited(ip) for ip in ips])
+    done(results, time.time() - start)
+    return results
+
+
+def run_sync(coroutine):
+    """Runs coroutine to completion on a new event loop and returns its
+    result.  When called from a running event loop (e.g. from a coroutine),
+    the new loop runs in a separate thread, blocking the caller until done.
+    """
+    def run():
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    if _running_loop() is None:
+        return run()
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(run).result()
+
+
+def probe_tcp(port, num_pings, timeout):
+    """Returns a coroutine function opening num_pings TCP connections to
+    port of a host, one after the other.  Connections refused count as
+    replies.
+    """
+    async def probe(ip):
+        rtts = []
+        error = None
+        for _ in range(num_pings):
+            start = time.time()
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port), timeout)
+                writer.close()
+            except ConnectionRefusedError:
+                pass
+            except asyncio.TimeoutError:
+                continue
+            except OSError as exception:
+                error = str(exception)
+                continue
+            rtts.append((time.time() - start) * 1000)
+        if not rtts:
+            return PingResult(ip, num_pings, 0, None, None, None, error)
+        return PingResult(
+            ip, num_pings, len(rtts), min(rtts), sum(rtts) / len(rtts),
+            max(rtts), None)
+    return probe
+
+
+def probe_icmp(argv, num_pings, timeout, parse):
+    """Returns a coroutine function running the ping utility (argv, without
+    the address) for a host and parsing its output with parse
+    """
+    async def probe(ip):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *(argv + [ip]), stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT)
+        except OSError as exception:
+            return PingResult(ip, 0, 0, None, None, None, str(exception))
+
+        try:
+            output, _ = await asyncio.wait_for(
+                process.communicate(), num_pings + timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            output, _ = await process.communicate()
+        return parse(ip, num_pings, output.decode("UTF-8", "replace"))
+    return probe
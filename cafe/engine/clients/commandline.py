@@ -11,9 +11,24 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from collections import deque
+from multiprocessing.pool import ThreadPool
 import os
-import sys
-from subprocess import Popen, PIPE, CalledProcessError
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from subprocess import Popen, PIPE
+
+import six
+
+try:
+    import selectors
+except ImportError:
+    # selectors is only available on python 3.4+
+    selectors = None
 
 from cafe.common.reporting.cclogging import log_info_block, logsafe_str
 from logging import DEBUG
@@ -21,6 +36,124 @@ from cafe.engine.clients.base import BaseClient
 from cafe.engine.models.commandline_response import CommandLineResponse
 
 
+class CommandLineClientException(Exception):
+    pass
+
+
+class CommandOutputStream(object):
+    """
+    Output of a running command, iterated line by line as it arrives,
+    returned by BaseCommandLineClient.stream_command.
+
+    Iterating yields ("stdout" or "stderr", line) tuples.  Only the last
+    buffer_size lines of each stream are kept, in response.standard_out and
+    response.standard_error, so memory stays bounded however much the
+    command prints.  Each callback is a (pattern, function) pair; function
+    is called with the line and the match object for every line matching
+    pattern, and stops the command by returning True.  until is a pattern
+    that stops the command when a line matches it:
+
+        stream = client.stream_command(
+            "tail -f /var/log/nova/nova-compute.log",
+            until="Instance spawned successfully", timeout=600)
+        for name, line in stream:
+            ...
+        assert not stream.response.timed_out
+    """
+
+    #: Bytes read from a pipe at a time
+    READ_SIZE = 65536
+
+    def __init__(self, client, os_response, callbacks=None, until=None,
+                 buffer_size=1000, timeout=None):
+        self.client = client
+        self.response = os_response
+        self.callbacks = [
+            (re.compile(pattern), function)
+            for pattern, function in callbacks or []]
+        if until is not None:
+            self.callbacks.append((re.compile(until), lambda *_: True))
+        self.timeout = timeout
+        self.stopped = False
+        self._buffers = {
+            "stdout": deque(maxlen=buffer_size),
+            "stderr": deque(maxlen=buffer_size)}
+        os_response.standard_out = self._buffers["stdout"]
+        os_response.standard_error = self._buffers["stderr"]
+
+    def __iter__(self):
+        process = self.response.process
+        if process is None:
+            return
+        start = time.time()
+        selector = selectors.DefaultSelector()
+        partial = {}
+        for name, pipe in (("stdout", process.stdout),
+                           ("stderr", process.stderr)):
+            selector.register(pipe, selectors.EVENT_READ, name)
+            partial[name] = b""
+        try:
+            while selector.get_map() and not self.stopped:
+                remaining = None
+                if self.timeout is not None:
+                    remaining = self.timeout - (time.time() - start)
+                    if remaining <= 0:
+                        self.response.timed_out = True
+                        break
+                for key, _ in selector.select(remaining):
+                    name = key.data
+                    data = os.read(key.fileobj.fileno(), self.READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        lines = [partial.pop(name)] if partial[name] else []
+                    else:
+                        lines = (partial[name] + data).split(b"\n")
+                        partial[name] = lines.pop()
+                    for line in lines:
+                        line = line.rstrip(b"\r").decode("UTF-8", "replace")
+                        self._buffers[name].append(line)
+                        yield name, line
+                        if self._check(line):
+                            break
+                    if self.stopped:
+                        break
+        finally:
+            selector.close()
+            self._finish(process, start)
+
+    def _check(self, line):
+        """Runs the callbacks matching line, returns True to stop"""
+        for pattern, function in self.callbacks:
+            match = pattern.search(line)
+            if match is not None and function(line, match):
+                self.stopped = True
+        return self.stopped
+
+    def stop(self):
+        """Stops the command at the next line"""
+        self.stopped = True
+
+    def _finish(self, process, start):
+        if process.poll() is None:
+            self.client._kill(process)
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+        self.response.standard_out = list(self._buffers["stdout"])
+        self.response.standard_error = list(self._buffers["stderr"])
+        self.response.return_code = process.returncode
+        self.response.duration = time.time() - start
+        self.response.process = None
+
+    def wait(self):
+        """Consumes the output, running the callbacks, and returns the
+        response
+        """
+        for _ in self:
+            pass
+        return self.response
+
+
 class BaseCommandLineClient(BaseClient):
     """
     Provides low level connectivity to the commandline via popen()
@@ -33,57 +166,85 @@ class BaseCommandLineClient(BaseClient):
     def __init__(self, base_command=None, env_var_dict=None):
         """
         :param base_command: This shell command to execute, e.g. 'ls' or 'pwd'
-        :param dict env_var_dict: Environment variables to inject into env
-                                  before execution.
+        :param dict env_var_dict: Environment variables to set for the
+                                  commands run by this client.
         """
 
         super(BaseCommandLineClient, self).__init__()
         self.base_command = base_command
-        self.env_var_dict = env_var_dict or {}
-        self.set_environment_variables(self.env_var_dict)
+        self.env_var_dict = {}
+        self._unset_env_vars = set()
+        self.set_environment_variables(env_var_dict or {})
 
     def set_environment_variables(self, env_var_dict=None):
-        """Sets all os environment variables provided in env_var_dict"""
+        """Sets the environment variables provided in env_var_dict for the
+        commands run by this client.  os.environ is left untouched, so
+        clients do not leak variables into each other or into other
+        threads."""
 
-        self.env_var_dict = env_var_dict
-        for key, value in list(self.env_var_dict.items()):
-            self._log.debug('setting {0}={1}'.format(key, value))
-            os.environ[str(key)] = str(value)
+        self.env_var_dict = {}
+        self.update_environment_variables(env_var_dict)
 
     def update_environment_variables(self, env_var_dict=None):
-        """Sets all os environment variables provided in env_var_dict"""
+        """Adds the environment variables provided in env_var_dict to the
+        ones set for the commands run by this client"""
 
-        self.env_var_dict = self.env_var_dict.update(env_var_dict or {})
-        for key, value in list(self.env_var_dict.items()):
+        for key, value in list((env_var_dict or {}).items()):
             self._log.debug('setting {0}={1}'.format(key, value))
-            os.environ[str(key)] = str(value)
+            self.env_var_dict[str(key)] = str(value)
+            self._unset_env_vars.discard(str(key))
 
     def unset_environment_variables(self, env_var_list=None):
-        """Unsets all os environment variables provided in env_var_dict
+        """Unsets all environment variables provided in env_var_dict
         by default.
         If env_var_list is passed, attempts to unset all environment vars in
-        list"""
+        list, including ones inherited from os.environ, for the commands run
+        by this client"""
 
         env_var_list = env_var_list or list(self.env_var_dict.keys()) or []
-        for key, _ in env_var_list:
+        for key in env_var_list:
             self._log.debug('unsetting {0}'.format(key))
-            os.unsetenv(str(key))
+            self.env_var_dict.pop(str(key), None)
+            self._unset_env_vars.add(str(key))
 
-    def _build_command(self, cmd, *args):
-        # Process command we received
-        command = "{0} {1}".format(
-            self.base_command, cmd) if self.base_command else cmd
-        if args and args[0]:
-            for arg in args[0]:
-                command += "{0} {1}".format(command, arg)
+    def _get_env(self, env=None):
+        """Returns the environment of a command: os.environ, with the
+        client's variables and the call's env applied.  None (inherit
+        os.environ as is) when there is nothing to apply.
+        """
+        if not (env or self.env_var_dict or self._unset_env_vars):
+            return None
+        command_env = dict(os.environ)
+        for key in self._unset_env_vars:
+            command_env.pop(key, None)
+        command_env.update(self.env_var_dict)
+        for key, value in list((env or {}).items()):
+            command_env[str(key)] = str(value)
+        return command_env
 
-        keys = set(os.environ).intersection(self.env_var_dict)
-        set_env_vars = dict([(k, os.environ[k]) for k in keys])
+    def _build_command(self, cmd, *args):
+        """Returns the command to run: a string run by the shell, or, when
+        cmd is a list, an argv list run directly, without a shell
+        """
+        if isinstance(cmd, list):
+            base_command = self.base_command or []
+            if isinstance(base_command, six.string_types):
+                base_command = shlex.split(base_command)
+            command = list(base_command) + cmd
+            if args and args[0]:
+                command.extend(str(arg) for arg in args[0])
+        else:
+            # Process command we received
+            command = "{0} {1}".format(
+                self.base_command, cmd) if self.base_command else cmd
+            if args and args[0]:
+                for arg in args[0]:
+                    command = "{0} {1}".format(command, arg)
 
         info = [
             ("command", logsafe_str(command)),
             ("args", logsafe_str(args)),
-            ("set env vars", logsafe_str(set_env_vars))]
+            ("set env vars", logsafe_str(self.env_var_dict))]
 
         log_info_block(
             self._log, info, heading='COMMAND LINE REQUEST',
@@ -91,33 +252,43 @@ class BaseCommandLineClient(BaseClient):
 
         return command
 
-    def _execute_command(self, command):
-        # Run the command
+    def _execute_command(self, command, env=None, **kwargs):
+        # Run the command, through the shell unless it is an argv list
         process = None
         try:
-            process = Popen(command, stdout=PIPE, stderr=PIPE, shell=True)
-        except CalledProcessError as exception:
+            process = Popen(
+                command, stdout=PIPE, stderr=PIPE,
+                shell=not isinstance(command, list), env=self._get_env(env),
+                **kwargs)
+        except OSError as exception:
+            # e.g. the program of an argv command does not exist
             self._log.exception(
                 "Exception running commandline command {0}\n{1}".format(
                     str(command), str(exception)))
         return process
 
-    def run_command_async(self, cmd, *args):
+    def run_command_async(self, cmd, *args, **kwargs):
         """Running a command asynchronously returns a CommandLineResponse
         objecct with a running subprocess.Process object in it.  This process
-        needs to be closed or killed manually after execution."""
+        needs to be closed or killed manually after execution.
+        The env keyword argument adds environment variables for this call
+        only."""
 
         os_response = CommandLineResponse()
         os_response.command = self._build_command(cmd, *args)
-        os_response.process = self._execute_command(os_response.command)
+        os_response.process = self._execute_command(
+            os_response.command, env=kwargs.get("env"))
         return os_response
 
-    def run_command(self, cmd, *args):
+    def run_command(self, cmd, *args, **kwargs):
         """Sends a command directly to this instance's command line
-        @param cmd: Command to sent to command line
-        @type cmd: C{str}
+        @param cmd: Command to sent to command line, run by the shell if it
+            is a string, directly if it is an argv list
+        @type cmd: C{str} or C{list}
         @param args: Optional list of args to be passed with the command
         @type args: C{list}
+        @param env: Keyword only, environment variables for this call only
+        @type env: C{dict}
         @raise exception: If unable to close process after running the command
         @return: The full response details from the command line
         @rtype: L{CommandLineResponse}
@@ -125,11 +296,39 @@ class BaseCommandLineClient(BaseClient):
         """
 
         # Wait for the process to complete and then read the output
-        os_response = self.run_command_async(cmd, *args)
-        std_out, std_err = os_response.process.communicate()
-        os_response.standard_out = str(std_out).splitlines()
-        os_response.standard_error = str(std_err).splitlines()
-        os_response.return_code = os_response.process.returncode
+        return self._communicate(self.run_command_async(cmd, *args, **kwargs))
+
+    @staticmethod
+    def _decode(output):
+        if isinstance(output, bytes):
+            return output.decode("UTF-8", "replace")
+        return output or ""
+
+    def _communicate(self, os_response, timeout=None):
+        """Waits for the process of os_response to complete, up to timeout
+        seconds if set, and sets the output, return code and duration of
+        os_response from it
+        """
+        start = time.time()
+        process = os_response.process
+        if process is None:
+            # The command could not be started, see _execute_command
+            os_response.duration = 0.0
+            return os_response
+        if timeout is None:
+            std_out, std_err = process.communicate()
+        else:
+            # communicate only takes a timeout on python 3.3+
+            try:
+                std_out, std_err = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                std_out, std_err = process.communicate()
+                os_response.timed_out = True
+        os_response.duration = time.time() - start
+        os_response.standard_out = self._decode(std_out).splitlines()
+        os_response.standard_error = self._decode(std_err).splitlines()
+        os_response.return_code = process.returncode
 
         info = [
             ("return code", logsafe_str(os_response.return_code)),
@@ -137,6 +336,8 @@ class BaseCommandLineClient(BaseClient):
                 "\n".join(os_response.standard_out)))),
             ("standard error", logsafe_str("\n{0}".format(
                 "\n".join(os_response.standard_error))))]
+        if os_response.timed_out:
+            info.append(("timed out after", logsafe_str(timeout)))
         log_info_block(
             self._log, info, heading='COMMAND LINE RESPONSE',
             log_level=DEBUG, one_line=True)
@@ -144,11 +345,128 @@ class BaseCommandLineClient(BaseClient):
         # Clean up the process to avoid any leakage/wonkiness with
         # stdout/stderr
         try:
-            os_response.process.kill()
+            process.kill()
         except OSError:
             # An OS Error is valid if the process has exited. We only
             # need to be concerned about other exceptions
-            sys.exc_clear()
+            pass
 
         os_response.process = None
         return os_response
+
+    @staticmethod
+    def _kill(process):
+        """Kills process, along with the processes it started if it leads
+        its own process group
+        """
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+        except (AttributeError, OSError):
+            pass
+        process.kill()
+
+    def stream_command(self, cmd, *args, **kwargs):
+        """Starts a command and returns a CommandOutputStream of its output
+        lines, see CommandOutputStream for the keyword arguments
+        @param cmd: Command to sent to command line, as in run_command
+        @type cmd: C{str} or C{list}
+        @param args: Optional list of args to be passed with the command
+        @type args: C{list}
+        @param env: Keyword only, environment variables for this call only
+        @type env: C{dict}
+        @return: Stream of the command's output
+        @rtype: L{CommandOutputStream}
+        @note: Requires python 3.4+
+        """
+        if selectors is None:
+            raise CommandLineClientException(
+                "stream_command requires python 3.4+")
+        env = kwargs.pop("env", None)
+        os_response = CommandLineResponse()
+        os_response.command = self._build_command(cmd, *args)
+        # Built first, so that bad arguments or patterns raise before the
+        # command is started
+        stream = CommandOutputStream(self, os_response, **kwargs)
+        # In its own process group, so that stopping it stops the commands
+        # the shell started too
+        os_response.process = self._execute_command(
+            os_response.command, env=env, start_new_session=True)
+        return stream
+
+    def run_commands(self, commands, max_workers=10, timeout=None, env=None):
+        """Runs commands concurrently, at most max_workers at a time, and
+        yields their responses as they complete
+        @param commands: Commands to run, each a command string, an argv
+            list or a (command, args) tuple as passed to run_command
+        @type commands: C{list}
+        @param max_workers: Maximum number of commands running at once
+        @type max_workers: C{int}
+        @param timeout: Seconds after which a command is killed, and its
+            response marked as timed_out
+        @type timeout: C{float}
+        @param env: Environment variables for these commands only
+        @type env: C{dict}
+        @return: Generator of responses, in completion order
+        @rtype: generator of L{CommandLineResponse}
+        @note: timeout requires python 3.3+
+        """
+        if timeout is not None and six.PY2:
+            raise CommandLineClientException(
+                "run_commands timeout requires python 3.3+")
+        commands = [
+            command if isinstance(command, tuple) else (command, )
+            for command in commands]
+        if not commands:
+            return
+
+        # Each command runs in its own process group, so that a timeout or
+        # an early stop kills the commands the shell started too
+        session = {} if six.PY2 else {"start_new_session": True}
+        lock = threading.Lock()
+        running = set()
+        stopped = []
+
+        def run(command):
+            os_response = CommandLineResponse()
+            os_response.command = self._build_command(*command)
+            with lock:
+                if stopped:
+                    return None
+                process = os_response.process = self._execute_command(
+                    os_response.command, env=env, **session)
+                if process is not None:
+                    running.add(process)
+            try:
+                return self._communicate(os_response, timeout=timeout)
+            finally:
+                with lock:
+                    running.discard(process)
+
+        start = time.time()
+        durations = []
+        timed_out = 0
+        pool = ThreadPool(min(max_workers, len(commands)))
+        try:
+            for os_response in pool.imap_unordered(run, commands):
+                durations.append(os_response.duration)
+                timed_out += os_response.timed_out
+                yield os_response
+        finally:
+            # Commands still running when the caller stops iterating are
+            # killed, so that joining the pool does not wait for them
+            with lock:
+                stopped.append(True)
+                for process in running:
+                    if process.poll() is None:
+                        self._kill(process)
+            pool.terminate()
+            pool.join()
+            if durations:
+                self._log.info(
+                    "Ran %s commands in %.3fs (%s workers): mean %.3fs, "
+                    "max %.3fs, %s timed out", len(durations),
+                    time.time() - start, max_workers,
+                    sum(durations) / len(durations), max(durations),
+                    timed_out)
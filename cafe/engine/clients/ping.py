@@ -11,12 +11,45 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from collections import namedtuple
 import platform
 import re
+import shlex
 import subprocess
+import sys
 
+from cafe.engine.base import BaseCafeClass
 
-class PingClient(object):
+
+class PingClientException(Exception):
+    pass
+
+
+class PingResult(namedtuple(
+        "PingResult",
+        ["ip", "sent", "received", "rtt_min", "rtt_avg", "rtt_max",
+         "error"])):
+    """
+    @summary: Reachability of one host, as returned by PingClient.ping_many.
+        Round trip times are in milliseconds, None without replies.  error
+        describes why the host could not be probed (e.g. ping is missing or
+        its output could not be parsed), None otherwise.
+    """
+    __slots__ = ()
+
+    @property
+    def packet_loss(self):
+        """Percent of probes without a reply"""
+        if not self.sent:
+            return 100.0
+        return 100.0 * (self.sent - self.received) / self.sent
+
+    @property
+    def reachable(self):
+        return self.received > 0
+
+
+class PingClient(BaseCafeClass):
     """
     @summary: Client to ping windows or linux servers
     """
@@ -26,7 +59,12 @@ class PingClient(object):
     PING_IPV6_COMMAND_LINUX = 'ping6 -c {num_pings}'
     PING_IPV4_COMMAND_WINDOWS = 'ping -c {num_pings}'
     PING_IPV6_COMMAND_WINDOWS = 'ping -6 -c {num_pings}'
-    PING_PACKET_LOSS_REGEX = '(\d{1,3})\.?\d*\%.*loss'
+    PING_PACKET_LOSS_REGEX = r'(\d{1,3})\.?\d*\%.*loss'
+    PING_COUNTS_REGEX = (
+        r'(\d+) packets transmitted, (\d+) (?:packets )?received')
+    PING_RTT_REGEX = r'= ([\d.]+)/([\d.]+)/([\d.]+)'
+    ICMP = "icmp"
+    TCP = "tcp"
 
     @classmethod
     def ping(cls, ip, ip_address_version, num_pings=DEFAULT_NUM_PINGS):
@@ -81,6 +119,20 @@ class PingClient(object):
         return int(cls._ping(
             ip=ip, ip_address_version=ip_address_version, num_pings=num_pings))
 
+    @classmethod
+    def _ping_command(cls, ip_address_version, num_pings):
+        """Returns the ping command for this platform, without the address"""
+        windows = 'windows'
+
+        os_type = platform.system().lower()
+        ping_ipv4 = (cls.PING_IPV4_COMMAND_WINDOWS if windows in os_type
+                     else cls.PING_IPV4_COMMAND_LINUX)
+        ping_ipv6 = (cls.PING_IPV6_COMMAND_WINDOWS if windows in os_type
+                     else cls.PING_IPV6_COMMAND_LINUX)
+
+        ping_cmd = ping_ipv6 if ip_address_version == 6 else ping_ipv4
+        return ping_cmd.format(num_pings=num_pings)
+
     @classmethod
     def _ping(cls, ip, ip_address_version, num_pings):
         """
@@ -95,16 +147,7 @@ class PingClient(object):
         @rtype: int
         """
 
-        windows = 'windows'
-
-        os_type = platform.system().lower()
-        ping_ipv4 = (cls.PING_IPV4_COMMAND_WINDOWS if windows in os_type
-                     else cls.PING_IPV4_COMMAND_LINUX)
-        ping_ipv6 = (cls.PING_IPV6_COMMAND_WINDOWS if windows in os_type
-                     else cls.PING_IPV6_COMMAND_LINUX)
-
-        ping_cmd = ping_ipv6 if ip_address_version == 6 else ping_ipv4
-        ping_cmd = ping_cmd.format(num_pings=num_pings)
+        ping_cmd = cls._ping_command(ip_address_version, num_pings)
         cmd = '{command} {address}'.format(command=ping_cmd, address=ip)
 
         process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE)
@@ -113,7 +156,7 @@ class PingClient(object):
         try:
             packet_loss_percent = re.search(
                 cls.PING_PACKET_LOSS_REGEX,
-                process.stdout.read()).group(1)
+                process.stdout.read().decode("UTF-8", "replace")).group(1)
         except Exception:
             # When there is no match, 100% ping loss is the best response
             # (for now). There has to be a better way, since the regex not
@@ -123,3 +166,96 @@ class PingClient(object):
             packet_loss_percent = 100
 
         return packet_loss_percent
+
+    @classmethod
+    def ping_many(cls, ips, ip_address_version=4, num_pings=DEFAULT_NUM_PINGS,
+                  mode=ICMP, port=22, timeout=5.0, max_concurrency=100):
+        """
+        @summary: Probes many hosts concurrently and returns their packet
+            loss and round trip times.  From a coroutine, await
+            ping_many_async instead: this call blocks until all hosts are
+            probed.
+        @param ips: IP addresses (or host names) to probe
+        @type ips: list
+        @param ip_address_version: IP Address version (4 or 6), for ICMP
+        @type ip_address_version: int
+        @param num_pings: Number of probes per host
+        @type num_pings: int
+        @param mode: PingClient.ICMP runs the ping utility, PingClient.TCP
+            opens TCP connections to port instead, which needs no
+            privileges nor ping utility.  A refused connection still counts
+            as a reply, since the host answered.
+        @type mode: string
+        @param port: Port probed in TCP mode
+        @type port: int
+        @param timeout: Seconds to wait for each probe
+        @type timeout: float
+        @param max_concurrency: Maximum number of hosts probed at once
+        @type max_concurrency: int
+        @return: One result per entry of ips, in the same order
+        @rtype: list of L{PingResult}
+        @note: Requires python 3.5+
+        """
+        coroutine = cls.ping_many_async(
+            ips, ip_address_version=ip_address_version, num_pings=num_pings,
+            mode=mode, port=port, timeout=timeout,
+            max_concurrency=max_concurrency)
+        # Coroutine syntax, kept out of this module for python 2
+        from cafe.engine.clients import _ping_probes
+        return _ping_probes.run_sync(coroutine)
+
+    @classmethod
+    def ping_many_async(cls, ips, ip_address_version=4,
+                        num_pings=DEFAULT_NUM_PINGS, mode=ICMP, port=22,
+                        timeout=5.0, max_concurrency=100):
+        """
+        @summary: Awaitable variant of ping_many, taking the same
+            parameters, for use on a running event loop
+        @return: Coroutine returning one result per entry of ips, in the
+            same order
+        @rtype: coroutine
+        @note: Requires python 3.5+
+        """
+        if sys.version_info < (3, 5):
+            raise PingClientException("ping_many requires python 3.5+")
+        # Coroutine syntax, kept out of this module for python 2
+        from cafe.engine.clients import _ping_probes
+
+        if mode == cls.TCP:
+            probe = _ping_probes.probe_tcp(port, num_pings, timeout)
+        elif mode == cls.ICMP:
+            argv = shlex.split(
+                cls._ping_command(ip_address_version, num_pings))
+            probe = _ping_probes.probe_icmp(
+                argv, num_pings, timeout, cls._parse_ping_output)
+        else:
+            raise ValueError("Unknown ping mode {0}".format(mode))
+
+        def done(results, elapsed):
+            cls._log.info(
+                "Probed %s hosts (%s) in %.3fs: %s reachable, %s errors",
+                len(results), mode, elapsed,
+                sum(result.reachable for result in results),
+                sum(result.error is not None for result in results))
+
+        return _ping_probes.probe_all(probe, ips, max_concurrency, done)
+
+    @classmethod
+    def _parse_ping_output(cls, ip, num_pings, output):
+        """Returns the PingResult of the output of the ping utility.  Output
+        that can not be parsed is reported as an error, not as packet loss.
+        """
+        counts = re.search(cls.PING_COUNTS_REGEX, output)
+        if counts is None:
+            message = "Unable to parse ping output for {0}: {1}".format(
+                ip, output.strip()[-200:])
+            cls._log.warning(message)
+            return PingResult(ip, num_pings, 0, None, None, None, message)
+
+        sent, received = int(counts.group(1)), int(counts.group(2))
+        rtt = re.search(cls.PING_RTT_REGEX, output)
+        if rtt is None or not received:
+            return PingResult(ip, sent, received, None, None, None, None)
+        return PingResult(
+            ip, sent, received, float(rtt.group(1)), float(rtt.group(2)),
+            float(rtt.group(3)), None)
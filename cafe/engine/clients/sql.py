@@ -11,8 +11,25 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain, islice
+import threading
+import time
+
 from cafe.engine.clients.base import BaseClient
 
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    # get_event_loop is deprecated within coroutines, get_running_loop is
+    # only available on python 3.7+
+    _get_loop = getattr(
+        asyncio, "get_running_loop", asyncio.get_event_loop)
+except ImportError:
+    # asyncio is only available on python 3.4+
+    asyncio = None
+
 
 class SQLClientException(Exception):
     pass
@@ -53,15 +70,32 @@ class BaseSQLClient(BaseClient):
             self._log.critical(message)
             raise SQLClientException(message)
 
+        self._connect_args = (
+            data_source_name, user, password, host, database)
+        self._connection = self._open_connection()
+
+    def _open_connection(self):
+        """
+        Returns a new connection to self._driver.  Clients for drivers whose
+        connect signature differs from (dsn, user, password, host, database)
+        override this.
+        """
         try:
-            self._connection = self._driver.connect(
-                data_source_name, user, password, host, database)
+            return self._driver.connect(*self._connect_args)
         except AttributeError as detail:
             message = "No connect method found in self._driver module."
             self._log.exception(detail)
             self._log.critical(message)
             raise detail
 
+    @staticmethod
+    def _execute(cursor, operation, parameters=None):
+        # Some drivers (e.g. sqlite3) reject None parameters
+        if parameters is None:
+            cursor.execute(operation)
+        else:
+            cursor.execute(operation, parameters)
+
     def execute(self, operation, parameters=None, cursor=None):
         """
         Calls execute with operation & parameters sent in on either the passed
@@ -86,7 +120,7 @@ class BaseSQLClient(BaseClient):
         if cursor is None:
             cursor = self._connection.cursor()
 
-        cursor.execute(operation, parameters)
+        self._execute(cursor, operation, parameters)
 
         return cursor
 
@@ -118,6 +152,91 @@ class BaseSQLClient(BaseClient):
 
         return cursor
 
+    def stream(self, query, parameters=None, batch_size=1000):
+        """
+        Yields the rows of query, fetching batch_size rows at a time, so that
+        at most one batch is held in memory
+
+        :param query: The query being executed
+        :type query: string
+        :param parameters: Sequence or map that wil be bound to variables in
+                           the query
+        :type parameters: string or dictionary
+        :param batch_size: Rows fetched per fetchmany call
+        :type batch_size: int
+        """
+        if self._connection is None:
+            message = 'Connection not set.'
+            self._log.critical(message)
+            raise SQLClientException(message)
+
+        return self._stream(
+            self._connection.cursor(), query, parameters, batch_size)
+
+    def _stream(self, cursor, query, parameters, batch_size):
+        start = time.time()
+        count = 0
+        try:
+            self._execute(cursor, query, parameters)
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                count += len(rows)
+                for row in rows:
+                    yield row
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            cursor.close()
+            self._log_rate("Streamed", count, start)
+
+    def bulk_insert(self, table, rows, batch_size=1000, columns=None):
+        """
+        Inserts rows into table with one executemany call per batch_size
+        rows, so that rows can be a generator of any length.  Does not
+        commit.  Returns the number of rows inserted.
+
+        :param table: Name of the table, inserted in the statement as is
+        :type table: string
+        :param rows: Sequences of values, in the order of columns
+        :type rows: iterable
+        :param batch_size: Rows per executemany call
+        :type batch_size: int
+        :param columns: Names of the columns set, all columns by default
+        :type columns: list
+        """
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return 0
+
+        operation = "INSERT INTO {0} {1}VALUES ({2})".format(
+            table, "({0}) ".format(", ".join(columns)) if columns else "",
+            ", ".join(self._placeholders(len(first))))
+        start = time.time()
+        count = 0
+        rows = chain((first,), rows)
+        batch = list(islice(rows, batch_size))
+        while batch:
+            self.execute_many(operation, batch)
+            count += len(batch)
+            batch = list(islice(rows, batch_size))
+        self._log_rate("Inserted", count, start)
+        return count
+
+    def _placeholders(self, count):
+        """Returns count placeholders in the driver's paramstyle"""
+        style = getattr(self._driver, "paramstyle", "qmark")
+        if style in ("numeric", "named"):
+            return [":{0}".format(index) for index in range(1, count + 1)]
+        if style in ("format", "pyformat"):
+            return ["%s"] * count
+        return ["?"] * count
+
+    def _log_rate(self, action, count, start):
+        elapsed = time.time() - start
+        self._log.info("{0} {1} rows in {2:.3f}s ({3:.0f} rows/s)".format(
+            action, count, elapsed, count / elapsed if elapsed else 0))
+
     def close(self):
         """
         Closes the connection
@@ -125,3 +244,416 @@ class BaseSQLClient(BaseClient):
         if self._connection is not None:
             self._connection.close()
             self._connection = None
+
+
+class ResultSet(object):
+    """
+    Rows fetched from a cursor, with the cursor's read interface, returned
+    by PooledSQLClient once the connection is back in the pool.
+    """
+
+    def __init__(self, cursor):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self.lastrowid = getattr(cursor, "lastrowid", None)
+        self._rows = cursor.fetchall() if cursor.description else []
+        self._position = 0
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+
+
+class PooledSQLClient(BaseSQLClient):
+    """
+    BaseSQLClient sharing a bounded pool of connections, safe to use from
+    several threads.
+
+    Outside a connection() block, execute and execute_many check a
+    connection out for the statement only, commit, and return a ResultSet
+    of the fetched rows.  Within a block, they run on the block's
+    connection and return a new cursor, as BaseSQLClient does; the block
+    commits on success and rolls back on error:
+
+        with client.connection():
+            client.execute("INSERT INTO servers VALUES (?, ?)", row)
+            count = client.execute("SELECT COUNT(*) FROM servers")
+
+    Statements run outside a block are cached per connection: each
+    connection keeps a cursor per statement, for its last
+    STATEMENT_CACHE_SIZE statements, and runs the statement on it again.
+    DBAPI 2.0 lets drivers keep a statement prepared on the cursor it ran
+    on (as cx_Oracle and sqlite3 do), so repeated statements are only
+    prepared once per connection on those drivers.
+
+    Connections idle for longer than HEALTH_CHECK_INTERVAL seconds are
+    checked with HEALTH_CHECK_QUERY before being handed out, and replaced if
+    the check fails.  When HEALTH_CHECK_QUERY is None, the query is looked
+    up by driver module name in HEALTH_CHECK_QUERIES, and defaults to
+    "SELECT 1".
+    """
+
+    HEALTH_CHECK_QUERY = None
+    HEALTH_CHECK_QUERIES = {
+        "cx_Oracle": "SELECT 1 FROM DUAL",
+        "oracledb": "SELECT 1 FROM DUAL",
+        "ibm_db_dbi": "SELECT 1 FROM SYSIBM.SYSDUMMY1"}
+    HEALTH_CHECK_INTERVAL = 30.0
+    STATEMENT_CACHE_SIZE = 100
+
+    def __init__(self, max_connections=5, checkout_timeout=30.0):
+        super(PooledSQLClient, self).__init__()
+        self.max_connections = max_connections
+        self.checkout_timeout = checkout_timeout
+        self._condition = threading.Condition(threading.Lock())
+        # (connection, {statement: cursor}, time it was checked in)
+        self._idle = []
+        # Connections open, idle or checked out
+        self._size = 0
+        self._waiting = 0
+        self._local = threading.local()
+        self._connect_args = None
+
+    def connect(self, data_source_name=None, user=None, password=None,
+                host=None, database=None):
+        """
+        Sets the connection parameters and opens a first connection, so
+        that errors surface here
+        """
+        super(PooledSQLClient, self).connect(
+            data_source_name, user, password, host, database)
+        with self._condition:
+            self._size += 1
+        self._checkin(self._connection, OrderedDict())
+        self._connection = None
+
+    def _get_health_check_query(self):
+        if self.HEALTH_CHECK_QUERY is not None:
+            return self.HEALTH_CHECK_QUERY
+        return self.HEALTH_CHECK_QUERIES.get(
+            getattr(self._driver, "__name__", None), "SELECT 1")
+
+    def _is_healthy(self, connection):
+        try:
+            cursor = connection.cursor()
+            self._execute(cursor, self._get_health_check_query())
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception as exception:
+            self._log.warning(
+                "Discarding pooled connection: {0}".format(exception))
+            return False
+
+    def _reserve(self):
+        """Returns an idle connection entry, or None once a slot for a new
+        connection is reserved.  Waits up to checkout_timeout seconds when
+        max_connections are checked out.
+        """
+        deadline = None
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_connections:
+                    self._size += 1
+                    return None
+                if deadline is None:
+                    deadline = time.time() + self.checkout_timeout
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise SQLClientException(
+                        "No connection available after {0} seconds".format(
+                            self.checkout_timeout))
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _checkout(self):
+        if self._connect_args is None:
+            message = 'Connection not set.'
+            self._log.critical(message)
+            raise SQLClientException(message)
+
+        while True:
+            entry = self._reserve()
+            if entry is None:
+                try:
+                    return self._open_connection(), OrderedDict()
+                except Exception:
+                    self._checkin(None, None, healthy=False)
+                    raise
+            connection, statements, checked_in = entry
+            if (time.time() - checked_in < self.HEALTH_CHECK_INTERVAL or
+                    self._is_healthy(connection)):
+                return connection, statements
+            self._checkin(connection, statements, healthy=False)
+
+    def _checkin(self, connection, statements, healthy=True):
+        """Returns a checked out connection to the pool, or closes it if it
+        is unhealthy or the client was closed
+        """
+        keep = healthy and self._connect_args is not None
+        with self._condition:
+            if keep:
+                self._idle.append((connection, statements, time.time()))
+            else:
+                self._size -= 1
+            if self._waiting:
+                self._condition.notify()
+        if not keep and connection is not None:
+            self._discard(connection)
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _get_statement_cursor(self, connection, statements, operation):
+        """Returns the cached cursor of operation on connection, creating
+        it, and evicting the least recently used one, if needed
+        """
+        cursor = statements.pop(operation, None)
+        if cursor is None:
+            cursor = connection.cursor()
+            if len(statements) >= self.STATEMENT_CACHE_SIZE > 0:
+                _, evicted = statements.popitem(last=False)
+                self._discard(evicted)
+        if self.STATEMENT_CACHE_SIZE > 0:
+            statements[operation] = cursor
+        return cursor
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out for the block.  Yields the connection,
+        commits when the block succeeds and rolls back when it raises.
+        Nested blocks share the outer block's connection.
+        """
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            yield current[0]
+            return
+
+        connection, statements = self._checkout()
+        self._local.current = (connection, statements)
+        healthy = True
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception:
+                healthy = False
+            raise
+        finally:
+            self._local.current = None
+            self._checkin(connection, statements, healthy)
+
+    @staticmethod
+    def _execute_many(cursor, operation, seq_of_parameters):
+        cursor.executemany(operation, seq_of_parameters)
+
+    def _run(self, method, operation, parameters, cursor):
+        if cursor is not None:
+            method(cursor, operation, parameters)
+            return cursor
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            cursor = current[0].cursor()
+            method(cursor, operation, parameters)
+            return cursor
+
+        # Same as a connection() block, without the generator overhead.
+        # The rows are fetched before the connection is checked in, so the
+        # statement's cursor can be reused
+        connection, statements = self._checkout()
+        healthy = True
+        try:
+            cursor = self._get_statement_cursor(
+                connection, statements, operation)
+            try:
+                method(cursor, operation, parameters)
+                result = ResultSet(cursor)
+            except Exception:
+                statements.pop(operation, None)
+                self._discard(cursor)
+                raise
+            connection.commit()
+            return result
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception:
+                healthy = False
+            raise
+        finally:
+            self._checkin(connection, statements, healthy)
+
+    def execute(self, operation, parameters=None, cursor=None):
+        """
+        Executes operation on a pooled connection, see the class docstring
+        """
+        return self._run(self._execute, operation, parameters, cursor)
+
+    def execute_many(self, operation, seq_of_parameters=None, cursor=None):
+        """
+        Executes operation for each parameter set on a pooled connection,
+        see the class docstring
+        """
+        return self._run(
+            self._execute_many, operation, seq_of_parameters, cursor)
+
+    def stream(self, query, parameters=None, batch_size=1000):
+        """
+        Yields the rows of query, fetching batch_size rows at a time.  The
+        connection stays checked out, as in a connection() block, until the
+        iteration ends or the generator is closed.
+        """
+        with self.connection() as connection:
+            for row in self._stream(
+                    connection.cursor(), query, parameters, batch_size):
+                yield row
+
+    def bulk_insert(self, table, rows, batch_size=1000, columns=None):
+        """
+        Inserts rows into table in batches on a single connection, and
+        commits them at the end unless called within a connection() block
+        """
+        with self.connection():
+            return super(PooledSQLClient, self).bulk_insert(
+                table, rows, batch_size, columns)
+
+    def close(self):
+        """
+        Closes the idle connections.  Connections checked out at the time
+        are closed as they are checked in.
+        """
+        self._connect_args = None
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+
+class _AdaptedSQLClient(PooledSQLClient):
+    """PooledSQLClient opening its connections through an
+    AsyncBaseSQLClient
+    """
+
+    def __init__(self, owner, max_connections, checkout_timeout):
+        super(_AdaptedSQLClient, self).__init__(
+            max_connections, checkout_timeout)
+        self._owner = owner
+        self._driver = owner._driver
+
+    def _open_connection(self):
+        return self._owner._open_connection()
+
+
+class AsyncBaseSQLClient(BaseClient):
+    """
+    asyncio counterpart of BaseSQLClient for DBAPI 2.0 drivers.
+
+    connect, execute, execute_many and close return futures to await, and
+    are called from coroutines running on the event loop.
+    The blocking driver calls run on a pool of max_concurrency threads,
+    each statement on a connection from a PooledSQLClient of as many
+    connections, so up to max_concurrency statements run at once:
+
+        results = await asyncio.gather(*[
+            client.execute("SELECT status FROM servers WHERE id = ?", (id_,))
+            for id_ in server_ids])
+
+    execute and execute_many return a ResultSet of the fetched rows.  Like
+    BaseSQLClient, this client is meant to be extended with a _driver.
+    """
+
+    _driver = None
+
+    def __init__(self, max_concurrency=10, checkout_timeout=30.0):
+        super(AsyncBaseSQLClient, self).__init__()
+        if asyncio is None:
+            raise SQLClientException("asyncio is not available")
+        self.max_concurrency = max_concurrency
+        self.checkout_timeout = checkout_timeout
+        self._client = None
+        self._executor = None
+        self._connect_args = None
+
+    def _open_connection(self):
+        """
+        Returns a new connection to self._driver, see
+        BaseSQLClient._open_connection
+        """
+        return self._driver.connect(*self._connect_args)
+
+    def _submit(self, method_name, *args):
+        """Runs a method of the pooled client on the thread pool"""
+        if self._client is None:
+            message = 'Connection not set.'
+            self._log.critical(message)
+            raise SQLClientException(message)
+
+        return _get_loop().run_in_executor(
+            self._executor, getattr(self._client, method_name), *args)
+
+    def connect(self, data_source_name=None, user=None, password=None,
+                host=None, database=None):
+        """
+        Connects to self._driver with passed parameters, see
+        BaseSQLClient.connect
+        """
+        self._connect_args = (
+            data_source_name, user, password, host, database)
+        self._executor = ThreadPoolExecutor(self.max_concurrency)
+        self._client = _AdaptedSQLClient(
+            self, self.max_concurrency, self.checkout_timeout)
+        return self._submit('connect', *self._connect_args)
+
+    def execute(self, operation, parameters=None):
+        """
+        Executes operation, see BaseSQLClient.execute
+        """
+        return self._submit('execute', operation, parameters)
+
+    def execute_many(self, operation, seq_of_parameters=None):
+        """
+        Executes operation for each parameter set, see
+        BaseSQLClient.execute_many
+        """
+        return self._submit('execute_many', operation, seq_of_parameters)
+
+    def close(self):
+        """
+        Closes the connections once the statements already submitted are
+        done
+        """
+        future = self._submit('close')
+        self._executor.shutdown(wait=False)
+        self._client = None
+        return future
@@ -10,10 +10,12 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+from collections import OrderedDict
 from datetime import datetime
 from six import PY3
 from six.moves import configparser
 import os
+import threading
 
 from cafe.configurator.managers import OPENCAFE_SUB_DIRS, ENGINE_CONFIG_PATH
 
@@ -21,11 +23,80 @@ ConfigParser = (
     configparser.ConfigParser if PY3 else configparser.SafeConfigParser)
 
 
+class ConfigFileRegistry(object):
+    """
+    Process wide registry of parsed config files, so that every config
+    section reading the same file shares a single parse of it.  A parsed
+    file is reused for as long as its modification time and size are
+    unchanged, and must be treated as read only.  At most max_files parses
+    are kept, the least recently used is dropped beyond that.
+    """
+
+    MAX_FILES = 256
+
+    def __init__(self, max_files=MAX_FILES):
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_version(path):
+        stat = os.stat(path)
+        return getattr(stat, "st_mtime_ns", stat.st_mtime), stat.st_size
+
+    def get(self, path, parse, *args):
+        """Returns parse(path, *args), parsing the file again only if it
+        changed since the last call with the same parse function and args.
+        Files that can not be stat'ed are parsed on every call.
+        """
+        path = os.path.abspath(path)
+        key = (path, parse, args)
+        try:
+            version = self._get_version(path)
+        except (OSError, IOError):
+            with self._lock:
+                self._files.pop(key, None)
+            return parse(path, *args)
+
+        with self._lock:
+            entry = self._files.pop(key, None)
+            if entry is not None and entry[0] == version:
+                self._files[key] = entry
+                return entry[1]
+
+        value = parse(path, *args)
+        with self._lock:
+            self._files[key] = (version, value)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drops every parsed file, e.g. to isolate tests from each other"""
+        with self._lock:
+            self._files.clear()
+
+    def __len__(self):
+        return len(self._files)
+
+
+CONFIG_FILES = ConfigFileRegistry()
+
+
+def read_config_file(path, defaults=()):
+    """Returns a ConfigParser for the file at path, with the (key, value)
+    pairs of defaults as its defaults
+    """
+    parser = ConfigParser(defaults=dict(defaults))
+    parser.read(path)
+    return parser
+
+
 class EngineDataSource(object):
     def __init__(self, section_name):
-        self._data_source = ConfigParser()
+        self._data_source = CONFIG_FILES.get(
+            ENGINE_CONFIG_PATH, read_config_file)
         self._section_name = section_name
-        self._data_source.read(ENGINE_CONFIG_PATH)
 
     def get(self, item_name, default=None):
         match = 'CAFE_{0}__'.format(self._section_name)
@@ -127,6 +198,15 @@ class EngineConfig(object):
             **self._format_vars)
         return os.path.join(self.root_log_dir, relative_path)
 
+    @property
+    def json_codec(self):
+        """
+        Name of the JSON codec (orjson, rapidjson, ujson or json) models
+        and reports are serialized with.  The standard library json module
+        is used when it is not set (see cafe.common.json_codec).
+        """
+        return self._get("json_codec")
+
     @property
     def default_test_repo(self):
         """
@@ -11,12 +11,35 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 from xml.etree import ElementTree as ET
-import json
+import codecs
 import logging
-import re
 import six
+from six.moves import reprlib
 
+from cafe.common import json_codec
 from cafe.engine.base import BaseCafeClass
+from cafe.engine.models.fields import accepts_bytes, compile_fields
+from cafe.engine.models.identity import get_active_map
+from cafe.engine.models.streaming import (
+    DEFAULT_CHUNK_SIZE, iter_chunks, iter_json_array, iter_xml_elements)
+from cafe.engine.models.tabular import build_models
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def _require(module, name):
+    if module is None:
+        raise ImportError(
+            "The {0} package is required for the {0} format".format(name))
+    return module
 
 
 def encode(val):
@@ -29,36 +52,132 @@ def encode(val):
     return string
 
 
+_BYTES_TYPES = (six.binary_type, bytearray, memoryview)
+# Formats whose deserializers may expect text rather than bytes
+_TEXT_FORMATS = ("json", "xml")
+
+# Bounds the work done rendering containers held by models
+_REPR = reprlib.Repr()
+_REPR.maxlevel = 3
+_REPR.maxlist = _REPR.maxtuple = _REPR.maxdict = 50
+_REPR.maxset = _REPR.maxfrozenset = 50
+_REPR.maxstring = _REPR.maxother = 200
+
+
+def _render(value, limit=None):
+    """Returns value as text, cut down to limit characters"""
+    if isinstance(value, six.text_type):
+        text = value
+    elif isinstance(value, _BYTES_TYPES):
+        # Multibyte characters take at most 4 bytes, no need to decode more
+        text = bytes(value[:limit * 4 if limit else None]).decode(
+            "UTF-8", "ignore")
+    elif isinstance(value, (list, tuple, dict, set, frozenset)):
+        text = _REPR.repr(value)
+    elif six.PY3:
+        text = str(value)
+    else:
+        text = encode(value).decode("UTF-8", "ignore")
+    if limit and len(text) > limit:
+        is_bytes = isinstance(value, _BYTES_TYPES)
+        text = u"{0}... <truncated, {1} {2} in total>".format(
+            text[:limit], len(value) if is_bytes else len(text),
+            "bytes" if is_bytes else "characters")
+    return text
+
+
+@six.python_2_unicode_compatible
+class LazyRepr(object):
+    """Defers rendering obj until the text is actually needed, typically
+    until a log handler formats the record, and then renders it only once
+    however many handlers there are:
+
+        self._log.debug("Created server:\n%s", LazyRepr(server))
+
+    limit truncates the text to that many characters.
+    """
+
+    def __init__(self, obj, limit=None):
+        self.obj = obj
+        self.limit = limit
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = _render(self.obj, self.limit)
+        return self._text
+
+
+@six.python_2_unicode_compatible
 class BaseModel(BaseCafeClass):
     __REPR_SEPARATOR__ = '\n'
+    # Attribute values longer than this are truncated by __str__
+    __REPR_VALUE_LIMIT__ = 1000
 
     def __eq__(self, obj):
+        if obj is self:
+            return True
+        other = getattr(obj, "__dict__", None)
+        if other is None:
+            return False
+        values = self.__dict__
+        if len(values) != len(other):
+            return False
         try:
-            if vars(obj) == vars(self):
-                return True
-        except:
-            pass
-        return False
+            # Declared fields such as ids tell most models apart, so they
+            # are compared before everything else
+            for field in getattr(self, "__fields__", None) or ():
+                if values.get(field.name) != other.get(field.name):
+                    return False
+            return values == other
+        except Exception:
+            return False
 
     def __ne__(self, obj):
         return not self.__eq__(obj)
 
     def __str__(self):
-        string = b"<%s object>\n" % (six.b(type(self).__name__))
+        limit = self.__REPR_VALUE_LIMIT__
+        lines = [u"<{0} object>".format(type(self).__name__)]
         for key, val in vars(self).items():
             if isinstance(val, logging.Logger):
                 continue
-            key = six.b(key)
-            string += b"%s = %s\n" % (key, encode(val))
-        if six.PY3:
-            string = string.decode("UTF-8", "ignore")
-        return string
+            lines.append(u"{0} = {1}".format(key, _render(val, limit)))
+        lines.append(u"")
+        return u"\n".join(lines)
 
     def __repr__(self):
         return self.__str__()
 
 
 class AutoMarshallingModel(BaseModel):
+    # Failed payloads are logged up to this many characters
+    __DESERIALIZE_LOG_LIMIT__ = 4096
+    # Optional declarative field list (see cafe.engine.models.fields).  When
+    # set, the marshalling methods are compiled from it instead of being
+    # written by hand.
+    __fields__ = None
+    __root_tag__ = None
+    # Optional primary key attribute, used by IdentityMap (see
+    # cafe.engine.models.identity)
+    __primary_key__ = None
+
+    def __init_subclass__(cls, **kwargs):
+        super(AutoMarshallingModel, cls).__init_subclass__(**kwargs)
+        if cls.__fields__ is not None and (
+                "__fields__" in cls.__dict__ or
+                "__root_tag__" in cls.__dict__):
+            compile_fields(cls)
+
+    @classmethod
+    def _compile_fields(cls):
+        """Compiles __fields__ on first use where __init_subclass__ is not
+        available (python 2).  Returns False if the model has no fields.
+        """
+        if cls.__fields__ is None:
+            return False
+        compile_fields(cls)
+        return True
 
     def __init__(self, kwargs=None):
         if kwargs is None:
@@ -68,45 +187,84 @@ class AutoMarshallingModel(BaseModel):
                 setattr(self, k, v)
 
     def _obj_to_json(self):
-        return json.dumps(self._obj_to_dict())
+        return json_codec.dumps(self._obj_to_dict())
 
     def _obj_to_xml(self):
         element = self._obj_to_xml_ele()
         return ET.tostring(element)
 
+    def _obj_to_msgpack(self):
+        return _require(msgpack, "msgpack").packb(
+            self._obj_to_dict(), use_bin_type=True)
+
+    def _obj_to_cbor(self):
+        return _require(cbor2, "cbor2").dumps(self._obj_to_dict())
+
     @classmethod
+    @accepts_bytes
     def _json_to_obj(cls, data):
-        data = json.loads(data.decode("UTF-8", "ignore"), strict=False)
-        return cls._dict_to_obj(data)
+        return cls._dict_to_obj(json_codec.loads(data))
 
     @classmethod
+    @accepts_bytes
     def _xml_to_obj(cls, data):
         data = cls._remove_namespaces(ET.fromstring(data))
         return cls._xml_ele_to_obj(data)
 
+    @classmethod
+    def _msgpack_to_obj(cls, data):
+        return cls._dict_to_obj(
+            _require(msgpack, "msgpack").unpackb(data, raw=False))
+
+    @classmethod
+    def _cbor_to_obj(cls, data):
+        return cls._dict_to_obj(_require(cbor2, "cbor2").loads(data))
+
     def _obj_to_dict(self):
-        raise NotImplemented
+        if not self._compile_fields():
+            raise NotImplemented
+        return self._obj_to_dict()
 
     def _obj_to_xml_ele(self):
-        raise NotImplemented
+        if not self._compile_fields():
+            raise NotImplemented
+        return self._obj_to_xml_ele()
 
     @classmethod
     def _dict_to_obj(cls, data):
-        raise NotImplemented
+        if not cls._compile_fields():
+            raise NotImplemented
+        return cls._dict_to_obj(data)
 
     @classmethod
     def _xml_ele_to_obj(cls, data):
-        raise NotImplemented
+        if not cls._compile_fields():
+            raise NotImplemented
+        return cls._xml_ele_to_obj(data)
 
     @classmethod
     def _remove_namespaces(cls, element):
-        for key, value in element.attrib.items():
-            if key.startswith("{"):
-                element.set(re.sub("{.*}", "", key), value)
-                del element.attrib[key]
-        element.tag = re.sub("{.*}", "", element.tag)
-        for child in element:
-            cls._remove_namespaces(child)
+        """Strips the namespaces from the tags and attribute names of element
+        and all of its descendants, in a single pass over the tree.
+        """
+        # A document only uses a handful of distinct tags, so each one is
+        # split once
+        local_names = {}
+        for child in element.iter():
+            tag = child.tag
+            try:
+                child.tag = local_names[tag]
+            except KeyError:
+                # Comments and processing instructions have no string tag
+                local_names[tag] = (
+                    tag.rpartition("}")[2]
+                    if isinstance(tag, six.string_types) else tag)
+                child.tag = local_names[tag]
+            attrib = child.attrib
+            if attrib and any(key[0] == "{" for key in attrib):
+                child.attrib = {
+                    key.rpartition("}")[2]: value
+                    for key, value in attrib.items()}
         return element
 
     @staticmethod
@@ -149,9 +307,20 @@ class AutoMarshallingModel(BaseModel):
                 raise Exception(
                     "Expected field name {0} was None or non-existent".format(
                         field_name))
-            return [model._dict_to_obj(tmp) for tmp in data.get(field_name)]
-        elif isinstance(data, list):
-            return [model._dict_to_obj(tmp) for tmp in data]
+            data = data.get(field_name)
+        elif not isinstance(data, list):
+            return AutoMarshallingModel._build_xml_list_model(
+                data, field_name, model)
+        identity_map = get_active_map(model)
+        if identity_map is not None:
+            return identity_map.build_list(data)
+        return [model._dict_to_obj(tmp) for tmp in data]
+
+    @staticmethod
+    def _build_xml_list_model(data, field_name, model):
+        identity_map = get_active_map(model)
+        if identity_map is not None:
+            return identity_map.build_xml_list(data.findall(field_name))
         return [model._xml_ele_to_obj(tmp) for tmp in data.findall(field_name)]
 
     @staticmethod
@@ -171,38 +340,58 @@ class AutoMarshallingModel(BaseModel):
     def _find(element, tag):
         return None if element is None else element.find(tag)
 
+    @classmethod
+    def from_rows(cls, rows, columns=None):
+        """Returns one model per row of a DB-API cursor, a list of tuples or
+        a NumPy structured array.  columns names the columns when rows does
+        not (see cafe.engine.models.tabular.build_models).
+        """
+        return build_models(cls, rows, columns)
+
     def serialize(self, format_type):
         serialize_method = '_obj_to_{0}'.format(format_type)
         return getattr(self, serialize_method)()
 
     @classmethod
     def deserialize(cls, serialized_str, format_type):
+        """Returns a model built from serialized_str, or None if it can not
+        be deserialized.  bytes, bytearray and memoryview input is handed as
+        is to deserializers marked with fields.accepts_bytes, as the built
+        in and compiled ones are, without being copied or decoded first.
+        Other JSON and XML deserializers, which may only handle text, get it
+        decoded once, or as is if it is not UTF-8.
+        """
         try:
-            deserialize_method = '_{0}_to_obj'.format(format_type)
-            try:
-                model_object = getattr(cls, deserialize_method)(
-                    serialized_str.decode("utf-8"))
-            except:
-                model_object = getattr(cls, deserialize_method)(
-                    serialized_str)
+            deserialize_method = getattr(
+                cls, '_{0}_to_obj'.format(format_type))
+            data = serialized_str
+            if (format_type in _TEXT_FORMATS and
+                    isinstance(data, _BYTES_TYPES) and not getattr(
+                        deserialize_method, "accepts_bytes", False)):
+                try:
+                    data = codecs.decode(data, "utf-8")
+                except UnicodeDecodeError:
+                    # e.g. XML declaring another encoding
+                    pass
+            return deserialize_method(data)
         except Exception as deserialization_exception:
-            cls._log.exception(deserialization_exception)
-            try:
-                cls._log.debug(
-                    u"Deserialization Error: Attempted to deserialize type"
-                    u" using type: {0}".format(format_type.decode(
-                        encoding='UTF-8', errors='ignore')))
-                cls._log.debug(
-                    u"Deserialization Error: Unble to deserialize the "
-                    u"following:\n{0}".format(serialized_str.decode(
-                        encoding='UTF-8', errors='ignore')))
-            except Exception as exception:
-                cls._log.exception(exception)
-                cls._log.debug(
-                    "Unable to log information regarding the "
-                    "deserialization exception")
-            model_object = None
-        return model_object
+            cls._log_deserialization_error(
+                deserialization_exception, serialized_str, format_type)
+        return None
+
+    @classmethod
+    def _log_deserialization_error(
+            cls, exception, serialized_str, format_type):
+        cls._log.exception(exception)
+        cls._log.debug(
+            u"Deserialization Error: Attempted to deserialize type"
+            u" using type: %s", format_type)
+        # Only the start of the payload is logged, and only if the record
+        # is emitted
+        cls._log.debug(
+            u"Deserialization Error: Unable to deserialize the "
+            u"following:\n%s", LazyRepr(
+                serialized_str, cls.__DESERIALIZE_LOG_LIMIT__))
 
     @staticmethod
     def _string_to_bool(boolean_string):
@@ -252,9 +441,40 @@ class AutoMarshallingModel(BaseModel):
 
 
 class AutoMarshallingListModel(list, AutoMarshallingModel):
+    # Used by deserialize_iter: the model of each item, and the XML tag of
+    # each item (defaults to the item model's __root_tag__).  __root_tag__
+    # is the JSON key holding the list, None for a top level array.
+    __item_model__ = None
+    __item_tag__ = None
+
     def __str__(self):
         return list.__str__(self)
 
+    @classmethod
+    def deserialize_iter(
+            cls, source, format_type, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yields the items of a serialized list as __item_model__ objects,
+        each one as soon as it has been read from source.  source can be a
+        string, a file like object (e.g. a streamed response's raw body) or
+        an iterable of chunks (e.g. response.iter_content()).
+
+        Unlike deserialize, errors are raised rather than logged, since
+        items before the error have already been handed out.
+        """
+        chunks = iter_chunks(source, chunk_size)
+        item_model = cls.__item_model__
+        if format_type == "json":
+            for data in iter_json_array(chunks, cls.__root_tag__):
+                yield item_model._dict_to_obj(data)
+        elif format_type == "xml":
+            tag = cls.__item_tag__ or item_model.__root_tag__
+            for element in iter_xml_elements(chunks, tag):
+                yield item_model._xml_ele_to_obj(
+                    cls._remove_namespaces(element))
+        else:
+            raise ValueError(
+                "Streaming is not supported for {0}".format(format_type))
+
 
 class AutoMarshallingDictModel(dict, AutoMarshallingModel):
     def __str__(self):
@@ -27,6 +27,10 @@ class CommandLineResponse(BaseModel):
     @type StandardError: C{list} of C{str}
     @ivar ReturnCode: The command's return code
     @type ReturnCode: C{int}
+    @ivar Duration: Seconds the command ran for
+    @type Duration: C{float}
+    @ivar TimedOut: Whether the command was killed after a timeout
+    @type TimedOut: C{bool}
     '''
     def __init__(self):
         super(CommandLineResponse, self).__init__()
@@ -34,4 +38,6 @@ class CommandLineResponse(BaseModel):
         self.standard_out = []
         self.standard_error = []
         self.return_code = None
+        self.duration = None
+        self.timed_out = False
         self.process = None
@@ -12,13 +12,22 @@
 # under the License.
 
 import abc
-import json
+import copy
 import os
+import re
+import threading
+import time
 from six.moves import configparser
-from six import add_metaclass, PY3
+from six import add_metaclass, iteritems, string_types, PY3
 
+from cafe.common import json_codec
 from cafe.engine.base import BaseCafeClass
-from cafe.engine.config import EngineConfig
+from cafe.engine.config import (
+    CONFIG_FILES, EngineConfig, read_config_file)
+try:
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
 try:
     from cafe.engine.mongo.client import BaseMongoClient
 except:
@@ -62,6 +71,20 @@ def _get_path_from_env(os_env_var):
 CONFIG_KEY = 'CAFE_{section_name}__{key}'
 
 
+def _read_json_file(path):
+    with open(path, "rb") as json_file:
+        return json_codec.loads(json_file.read())
+
+
+def _cafe_defaults():
+    """Returns the CAFE_ environment variables as the sorted (key, value)
+    pairs config files are read with, so that they can be interpolated
+    """
+    return tuple(sorted(
+        (key, value) for key, value in os.environ.items()
+        if key.startswith('CAFE_')))
+
+
 @add_metaclass(abc.ABCMeta)
 class DataSource(BaseCafeClass):
     def get(self, item_name, default=None):
@@ -91,12 +114,27 @@ class DataSource(BaseCafeClass):
             return None
 
         try:
-            return json.loads(value)
+            return json_codec.loads(value)
         except ValueError as error:
             cls._log.warning(
                 "Invalid JSON '{0}'. ValueError: {1}".format(value, error))
             return None
 
+    @classmethod
+    def _parse_number(cls, value, number_type):
+        """Converts the value to number_type (int or float).  Returns None if
+        value is not a valid number."""
+        if value is None or value == '':
+            return None
+
+        try:
+            return number_type(value)
+        except (TypeError, ValueError) as error:
+            cls._log.warning(
+                "Invalid {0} '{1}'. {2}".format(
+                    number_type.__name__, value, error))
+            return None
+
 
 class EnvironmentVariableDataSource(DataSource):
 
@@ -115,7 +153,7 @@ class EnvironmentVariableDataSource(DataSource):
         return self._str_to_bool(self.get(item_name, default))
 
     def get_json(self, item_name, default=None):
-        return self._parse_json(self.get(item_name, default), log=self._log)
+        return self._parse_json(self.get(item_name, default))
 
 
 class ConfigParserDataSource(DataSource):
@@ -123,11 +161,7 @@ class ConfigParserDataSource(DataSource):
     def __init__(self, config_file_path, section_name):
         super(ConfigParserDataSource, self).__init__()
 
-        cafe_env_var = {key: value for key, value in os.environ.items()
-                        if key.startswith('CAFE_')}
-
-        self._data_source = ConfigParser(
-            defaults=cafe_env_var)
+        cafe_env_var = _cafe_defaults()
         self._section_name = section_name
 
         # Check if the path exists
@@ -136,9 +170,10 @@ class ConfigParserDataSource(DataSource):
                   .format(config_file_path)
             raise NonExistentConfigPathError(msg)
 
-        # Read the file in and turn it into a SafeConfigParser instance
+        # The parsed file is shared with every section reading it
         try:
-            self._data_source.read(config_file_path)
+            self._data_source = CONFIG_FILES.get(
+                config_file_path, read_config_file, cafe_env_var)
         except Exception as exception:
             self._log.exception(exception)
             raise exception
@@ -177,7 +212,7 @@ class ConfigParserDataSource(DataSource):
             return default
 
     def get_json(self, item_name, default=None):
-        value = self._parse_json(self.get(item_name, None), log=self._log)
+        value = self._parse_json(self.get(item_name, None))
         if value is None:
             return default
         return value
@@ -233,7 +268,7 @@ class DictionaryDataSource(DataSource):
         return self._str_to_bool(self.get(item_name, default))
 
     def get_json(self, item_name, default=None):
-        value = self._parse_json(self.get(item_name, None), log=self._log)
+        value = self._parse_json(self.get(item_name, None))
         if value is None:
             return default
         return value
@@ -252,67 +287,454 @@ class JSONDataSource(DictionaryDataSource):
                   .format(config_file_path)
             raise NonExistentConfigPathError(msg)
 
-        with open(config_file_path) as config_file:
-            config_data = config_file.read()
-            try:
-                self._data_source = json.loads(config_data)
-            except Exception as exception:
-                self._log.exception(exception)
-                raise exception
+        try:
+            self._data_source = CONFIG_FILES.get(
+                config_file_path, _read_json_file)
+        except Exception as exception:
+            self._log.exception(exception)
+            raise exception
 
 
 class MongoDataSource(DictionaryDataSource):
+    """
+    Config sections stored in a mongo config document.
+
+    Connections are pooled per (hostname, db_name, username) and each
+    config document is fetched once per process, then shared by every
+    section.  The fetched document is also written to a snapshot file,
+    readable by the current user only, which other processes of the same
+    run (e.g. cafe-parallel workers) read instead of querying the database,
+    and which is used, even if older, when the database can not be reached.
+    """
+
+    _clients = {}
+    _documents = {}
+    _lock = threading.RLock()
 
     def __init__(
             self, hostname, db_name, username, password, config_name,
-            section_name):
+            section_name, snapshot_directory=None):
         super(MongoDataSource, self).__init__()
         self._section_name = section_name
+        self._snapshot_path = self._get_snapshot_path(
+            snapshot_directory, hostname, db_name, username, config_name)
+        self._client_args = (hostname, db_name, username, password)
+
+        key = (hostname, db_name, username, config_name)
+        with self._lock:
+            if key not in self._documents:
+                self._documents[key] = self._load_document(
+                    hostname, db_name, username, password, config_name)
+        self._data_source = self._documents[key]
+
+    @property
+    def db(self):
+        """The pooled client, connected on first use if the document was
+        read from a snapshot
+        """
+        with self._lock:
+            return self._get_client(*self._client_args)
+
+    @staticmethod
+    def _get_snapshot_path(
+            directory, hostname, db_name, username, config_name):
+        directory = directory or os.path.join(
+            EngineConfig().temp_directory, "mongo")
+        name = re.sub(r"[^\w.-]", "_", "{0}_{1}_{2}_{3}.json".format(
+            hostname, db_name, username, config_name))
+        return os.path.join(directory, name)
+
+    @classmethod
+    def _get_client(cls, hostname, db_name, username, password):
+        key = (hostname, db_name, username)
+        client = cls._clients.get(key)
+        if client is None:
+            client = BaseMongoClient(
+                hostname=hostname, db_name=db_name,
+                username=username, password=password)
+            client.connect()
+            client.auth()
+            cls._clients[key] = client
+        return client
+
+    def _fetch_document(self, hostname, db_name, username, password,
+                        config_name):
+        """Fetches the document, reconnecting once if the pooled connection
+        fails
+        """
+        for attempt in range(2):
+            try:
+                client = self._get_client(
+                    hostname, db_name, username, password)
+                return client.find_one({'config_name': config_name})
+            except Exception as exception:
+                self._clients.pop((hostname, db_name, username), None)
+                if attempt:
+                    raise exception
+                self._log.warning(
+                    "Mongo query for '{0}' failed, reconnecting: {1}".format(
+                        config_name, exception))
+
+    def _load_document(self, hostname, db_name, username, password,
+                       config_name):
+        snapshot = self._read_snapshot(fresh=True)
+        if snapshot is not None:
+            return snapshot
+
+        try:
+            document = self._fetch_document(
+                hostname, db_name, username, password, config_name)
+        except Exception as exception:
+            snapshot = self._read_snapshot(fresh=False)
+            if snapshot is None:
+                raise exception
+            self._log.warning(
+                "Unable to fetch '{0}' from {1}/{2}, using snapshot {3}: "
+                "{4}".format(config_name, hostname, db_name,
+                             self._snapshot_path, exception))
+            return snapshot
+
+        if document is not None:
+            document = dict(
+                (key, value) for key, value in iteritems(document)
+                if key != '_id')
+            self._write_snapshot(document)
+        return document
+
+    def _read_snapshot(self, fresh):
+        """Returns the snapshot, or None if there is none or, when fresh is
+        True, if it was written before the run started
+        """
+        try:
+            if fresh:
+                run_start = time.mktime(EngineConfig.TIME.timetuple())
+                if os.path.getmtime(self._snapshot_path) < run_start:
+                    return None
+            return _read_json_file(self._snapshot_path)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_snapshot(self, document):
+        temp_path = "{0}.{1}".format(self._snapshot_path, os.getpid())
+        try:
+            directory = os.path.dirname(self._snapshot_path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            # The document can hold credentials
+            descriptor = os.open(
+                temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w") as snapshot:
+                snapshot.write(json_codec.dumps(document))
+            os.rename(temp_path, self._snapshot_path)
+        except Exception as exception:
+            self._log.warning(
+                "Unable to write config snapshot {0}: {1}".format(
+                    self._snapshot_path, exception))
+
+    @classmethod
+    def reset(cls):
+        """Drops pooled connections and fetched documents"""
+        with cls._lock:
+            cls._clients.clear()
+            cls._documents.clear()
+
+
+#: Layer of LayeredDataSource holding the CAFE_<section>__<key> variables
+ENVIRONMENT_LAYER = 'environment'
+
+_installed_layers = None
+
+# LayeredDataSource follows ConfigParser's rules for keys and booleans
+_optionxform = ConfigParser().optionxform
+_BOOLEAN_STATES = (
+    getattr(ConfigParser, 'BOOLEAN_STATES', None) or
+    ConfigParser._boolean_states)
+
+
+def _read_layer(layer):
+    """Returns the {section: {key: value}} data of a LayeredDataSource
+    layer
+    """
+    if isinstance(layer, dict):
+        return layer
+    if layer == ENVIRONMENT_LAYER:
+        sections = {}
+        for name, value in iteritems(os.environ):
+            if name.startswith('CAFE_') and '__' in name:
+                section_name, _, key = name[len('CAFE_'):].partition('__')
+                sections.setdefault(section_name, {})[key] = value
+        return sections
+    if layer.lower().endswith('.json'):
+        return CONFIG_FILES.get(layer, _read_json_file)
+
+    defaults = _cafe_defaults()
+    parser = CONFIG_FILES.get(layer, read_config_file, defaults)
+    # The CAFE_ defaults are only there to be interpolated
+    default_keys = set(_optionxform(key) for key, _ in defaults)
+    sections = {}
+    for section_name in parser.sections():
+        section = sections[section_name] = {}
+        for key in parser.options(section_name):
+            if key in default_keys:
+                continue
+            try:
+                section[key] = parser.get(section_name, key)
+            except configparser.InterpolationError:
+                section[key] = parser.get(section_name, key, raw=True)
+    return sections
+
+
+class LayeredDataSource(DataSource):
+    """
+    Merges config layers once, into a flat read only table keyed by
+    (section, key).  Later layers win.  A layer is the path of a config
+    file (JSON if it ends in .json, ConfigParser format otherwise), a
+    {section: {key: value}} dict (e.g. command line overrides) or
+    ENVIRONMENT_LAYER.  Keys are case insensitive and booleans follow the
+    same rules as in ConfigParser.
+
+        layers = LayeredDataSource(
+            [EngineConfig().test_config, product_path,
+             ENVIRONMENT_LAYER, overrides])
+        layers.install()
+
+    Once installed, the config sections of the process whose config file
+    is one of the layers read from the table instead of their file, every
+    other section keeps reading its own file.  The table is built again
+    when one of the layer files changes.  It pickles with its layers, so
+    it can be handed to worker processes, which install it without
+    reading any file.
+    """
+
+    def __init__(self, layers=(), section_name=None):
+        super(LayeredDataSource, self).__init__()
+        self._section_name = section_name
+        self._layers = list(layers)
+        self._files = frozenset(
+            os.path.abspath(layer) for layer in self._layers
+            if isinstance(layer, string_types) and
+            layer != ENVIRONMENT_LAYER)
+        self._root = self
+        self._versions = self._get_versions()
+        self._table = self._merge()
+
+    def _merge(self):
+        table = {}
+        for layer in self._layers:
+            for section_name, section in iteritems(_read_layer(layer)):
+                for key, value in iteritems(section):
+                    table[(section_name, _optionxform(key))] = value
+        return table
+
+    def _get_versions(self):
+        versions = {}
+        for path in self._files:
+            try:
+                versions[path] = os.path.getmtime(path)
+            except OSError:
+                versions[path] = None
+        return versions
+
+    @property
+    def table(self):
+        """The merged values, as a read only {(section, key): value}
+        mapping
+        """
+        return MappingProxyType(self._root._table)
+
+    def includes(self, config_file_path):
+        """Returns True if the config file is one of the layers"""
+        if not config_file_path:
+            return False
+        return os.path.abspath(config_file_path) in self._root._files
+
+    def reload(self):
+        """Builds the table again if one of the layer files changed since
+        it was built.  The previous table is kept if a layer can no longer
+        be read.
+        """
+        root = self._root
+        versions = root._get_versions()
+        if versions == root._versions:
+            return
+        try:
+            table = root._merge()
+        except (IOError, OSError, ValueError) as exception:
+            self._log.warning(
+                "Unable to reload config layers: {0}".format(exception))
+            return
+        root._versions = versions
+        root._table = table
+
+    def section(self, section_name):
+        """Returns a data source for section_name sharing this table"""
+        view = copy.copy(self._root)
+        view._section_name = section_name
+        return view
+
+    def install(self):
+        """Makes config sections created from now on read from this table"""
+        global _installed_layers
+        _installed_layers = self._root
+
+    @staticmethod
+    def uninstall():
+        global _installed_layers
+        _installed_layers = None
+
+    @staticmethod
+    def get_installed():
+        return _installed_layers
+
+    def get(self, item_name, default=None):
+        return self._root._table.get(
+            (self._section_name, _optionxform(item_name)), default)
+
+    def get_raw(self, item_name, default=None):
+        return self.get(item_name, default)
 
-        self.db = BaseMongoClient(
-            hostname=hostname, db_name=db_name,
-            username=username, password=password)
-        self.db.connect()
-        self.db.auth()
-        self._data_source = self.db.find_one({'config_name': config_name})
+    def get_boolean(self, item_name, default=None):
+        value = self.get(item_name)
+        if isinstance(value, string_types):
+            try:
+                value = _BOOLEAN_STATES[value.lower()]
+            except KeyError:
+                raise ValueError('Not a boolean: {0}'.format(value))
+        return default if value is None else value
+
+    def get_json(self, item_name, default=None):
+        value = self.get(item_name)
+        if isinstance(value, string_types):
+            value = self._parse_json(value)
+        return default if value is None else value
 
 
 class BaseConfigSectionInterface(BaseCafeClass):
     """Base class for building an interface for the data contained in a
     SafeConfigParser object, as loaded from the config file as defined
     by the engine's config file.
+
+    Resolved values are cached per section, already converted by the typed
+    accessors (so JSON is parsed once).  A cached value is resolved again
+    when its CAFE_<section>__<key> environment variable changes, and the
+    whole cache is dropped when the config file's modification time changes,
+    which is checked at most every FILE_CHECK_INTERVAL seconds.  Values
+    returned by get_json are shared between callers and must not be
+    modified.
     """
 
+    #: Seconds between checks of the config file's modification time
+    FILE_CHECK_INTERVAL = 1.0
+
     def __init__(self, config_file_path, section_name):
         self._override = EnvironmentVariableDataSource(
             section_name)
-        self._data_source = ConfigParserDataSource(
-            config_file_path, section_name)
+        self._config_file_path = config_file_path
         self._section_name = section_name
+        self._data_source = self._load_data_source()
+        self._cache = {}
+        self._mtime = self._get_mtime()
+        self._next_file_check = time.time() + self.FILE_CHECK_INTERVAL
+
+    def _load_data_source(self):
+        layers = _installed_layers
+        if layers is not None and layers.includes(self._config_file_path):
+            return layers.section(self._section_name)
+        return ConfigParserDataSource(
+            self._config_file_path, self._section_name)
+
+    def _get_mtime(self):
+        try:
+            return os.path.getmtime(self._config_file_path)
+        except (OSError, TypeError):
+            return None
 
-    def get(self, item_name, default=None):
-        value = self._override.get(item_name, None)
-        if value is None:
-            value = self._data_source.get(item_name, default)
+    def _check_file(self):
+        """Reloads the data source and drops the cache if the config file
+        changed since it was read.
+        """
+        self._next_file_check = time.time() + self.FILE_CHECK_INTERVAL
+        mtime = self._get_mtime()
+        if mtime != self._mtime:
+            self._mtime = mtime
+            layers = _installed_layers
+            if layers is not None and layers.includes(self._config_file_path):
+                layers.reload()
+            self._data_source = self._load_data_source()
+            self._cache.clear()
+
+    def invalidate(self):
+        """Drops every cached value"""
+        self._cache.clear()
+
+    def _resolve(self, kind, item_name):
+        """Returns the value of item_name as converted by _convert, or None
+        if it is not set.
+        """
+        if self._next_file_check <= time.time():
+            self._check_file()
+        cache_key = (kind, item_name)
+        entry = self._cache.get(cache_key)
+        if entry is not None and os.environ.get(entry[0]) == entry[1]:
+            return entry[2]
+
+        env_key = CONFIG_KEY.format(
+            section_name=self._section_name, key=item_name)
+        env_value = os.environ.get(env_key)
+        value = self._convert(kind, item_name, env_value)
+        self._cache[cache_key] = (env_key, env_value, value)
         return value
 
+    def _convert(self, kind, item_name, env_value):
+        """Converts the environment override if it is set, falling back to
+        the data source otherwise
+        """
+        if kind == 'raw':
+            if env_value is not None:
+                return env_value
+            return self._data_source.get_raw(item_name, None)
+        if kind == 'boolean':
+            value = self._override._str_to_bool(env_value)
+            if value is None:
+                value = self._data_source.get_boolean(item_name, None)
+            return value
+        if kind == 'json':
+            value = self._override._parse_json(env_value)
+            if value is None:
+                value = self._data_source.get_json(item_name, None)
+            return value
+
+        if env_value is None:
+            env_value = self._data_source.get(item_name, None)
+        if kind == 'int':
+            return self._override._parse_number(env_value, int)
+        if kind == 'float':
+            return self._override._parse_number(env_value, float)
+        return env_value
+
+    def get(self, item_name, default=None):
+        value = self._resolve('str', item_name)
+        return default if value is None else value
+
     def get_raw(self, item_name, default=None):
-        value = self._override.get_raw(item_name, None)
-        if value is None:
-            value = self._data_source.get_raw(item_name, default)
-        return value
+        value = self._resolve('raw', item_name)
+        return default if value is None else value
 
     def get_boolean(self, item_name, default=None):
-        value = self._override.get_boolean(item_name, None)
-        if value is None:
-            value = self._data_source.get_boolean(item_name, default)
-        return value
+        value = self._resolve('boolean', item_name)
+        return default if value is None else value
 
     def get_json(self, item_name, default=None):
-        value = self._override.get_json(item_name, None)
-        if value is None:
-            value = self._data_source.get_json(item_name, default)
-        return value
+        value = self._resolve('json', item_name)
+        return default if value is None else value
+
+    def get_int(self, item_name, default=None):
+        value = self._resolve('int', item_name)
+        return default if value is None else value
+
+    def get_float(self, item_name, default=None):
+        value = self._resolve('float', item_name)
+        return default if value is None else value
 
 
 class ConfigSectionInterface(BaseConfigSectionInterface):
@@ -0,0 +1,295 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Declarative fields for AutoMarshallingModel.
+
+Instead of hand writing _obj_to_dict, _dict_to_obj, _obj_to_xml_ele and
+_xml_ele_to_obj, a model can list its fields:
+
+    class Server(AutoMarshallingModel):
+        __root_tag__ = "server"
+        __fields__ = (
+            Field("id", xml_attribute=True),
+            Field("name", xml_attribute=True),
+            Field("ram", int, xml_attribute=True),
+            Field("metadata", Metadata),
+            Field("addresses", Address, is_list=True, item_tag="address"))
+
+compile_fields() turns the list into source code for the four methods,
+specialized for the class, and compiles it once.  Every call afterwards is
+straight line attribute and dictionary access, with no lookups driven by the
+field list.
+"""
+
+from xml.etree import ElementTree as ET
+
+import six
+
+from cafe.common import json_codec
+
+
+class Field(object):
+    """
+    A single model attribute.
+
+    name: attribute name on the model
+    field_type: a nested model class, or a callable converting XML text
+        (e.g. int, float, bool).  JSON values are used as decoded.
+    key: JSON key / XML tag or attribute name, defaults to name
+    xml_attribute: read and write the value as an XML attribute instead of a
+        child element
+    is_list: the value is a list of field_type
+    item_tag: XML tag of each list item, which are then wrapped in a key
+        element.  Without it list items are repeated key elements.
+    """
+
+    def __init__(
+            self, name, field_type=None, key=None, xml_attribute=False,
+            is_list=False, item_tag=None):
+        self.name = name
+        self.field_type = field_type
+        self.key = key or name
+        self.xml_attribute = xml_attribute
+        self.is_list = is_list
+        self.item_tag = item_tag
+        if xml_attribute and (is_list or self.is_model):
+            raise ValueError(
+                "Field {0} can not be an XML attribute, only simple values "
+                "can".format(name))
+
+    @property
+    def is_model(self):
+        return hasattr(self.field_type, "_dict_to_obj")
+
+
+def _to_text(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return six.text_type(value)
+
+
+def _make_converter(field_type):
+    """Returns a function converting XML text to field_type"""
+    if field_type is None:
+        return lambda text: text
+    if field_type is bool:
+        return lambda text: None if text is None else text.lower() == "true"
+    return lambda text: None if text is None else field_type(text)
+
+
+def _child_text(child):
+    return None if child is None else child.text
+
+
+class CodeBuilder(object):
+    """
+    Collects the generated source of a function and the objects it refers
+    to, then compiles it:
+
+        code = CodeBuilder()
+        model = code.add(model_cls, "_model")
+        code.line(0, "def build(data):")
+        code.line(1, "return {0}._dict_to_obj(data)", model)
+        build = code.build("build")
+    """
+
+    def __init__(self):
+        self.namespace = {
+            "ET": ET, "_to_text": _to_text, "_child_text": _child_text}
+        self.lines = []
+
+    def add(self, obj, prefix):
+        name = "{0}{1}".format(prefix, len(self.namespace))
+        self.namespace[name] = obj
+        return name
+
+    def line(self, indent, text, *args):
+        self.lines.append("{0}{1}".format("    " * indent, text.format(*args)))
+
+    def build(self, function_name):
+        code = "\n".join(self.lines)
+        six.exec_(compile(code, "<{0}>".format(function_name), "exec"),
+                  self.namespace)
+        return self.namespace[function_name]
+
+
+def _build_obj_to_dict(fields):
+    code = CodeBuilder()
+    code.line(0, "def _obj_to_dict(self):")
+    code.line(1, "values = self.__dict__")
+    code.line(1, "data = {{}}")
+    for field in fields:
+        code.line(1, "value = values.get({0!r})", field.name)
+        code.line(1, "if value is not None:")
+        if field.is_model and field.is_list:
+            code.line(2, "value = [item._obj_to_dict() for item in value]")
+        elif field.is_model:
+            code.line(2, "value = value._obj_to_dict()")
+        code.line(2, "data[{0!r}] = value", field.key)
+    code.line(1, "return data")
+    return code.build("_obj_to_dict")
+
+
+def _build_dict_to_obj(fields):
+    code = CodeBuilder()
+    code.line(0, "def _dict_to_obj(cls, data):")
+    code.line(1, "obj = cls.__new__(cls)")
+    code.line(1, "get = data.get")
+    code.line(1, "values = obj.__dict__")
+    for field in fields:
+        if not field.is_model:
+            code.line(1, "values[{0!r}] = get({1!r})", field.name, field.key)
+            continue
+        model = code.add(field.field_type, "_model")
+        code.line(1, "value = get({0!r})", field.key)
+        if field.is_list:
+            code.line(
+                1, "values[{0!r}] = None if value is None else "
+                "[{1}._dict_to_obj(item) for item in value]",
+                field.name, model)
+        else:
+            code.line(
+                1, "values[{0!r}] = None if value is None else "
+                "{1}._dict_to_obj(value)", field.name, model)
+    code.line(1, "return obj")
+    return code.build("_dict_to_obj")
+
+
+def _build_obj_to_xml_ele(fields, tag):
+    code = CodeBuilder()
+    code.line(0, "def _obj_to_xml_ele(self):")
+    code.line(1, "values = self.__dict__")
+    code.line(1, "element = ET.Element({0!r})", tag)
+    for field in fields:
+        code.line(1, "value = values.get({0!r})", field.name)
+        code.line(1, "if value is not None:")
+        if field.xml_attribute:
+            code.line(2, "element.set({0!r}, _to_text(value))", field.key)
+            continue
+
+        if field.is_list:
+            if field.item_tag:
+                code.line(
+                    2, "parent = ET.SubElement(element, {0!r})", field.key)
+                item_tag = field.item_tag
+            else:
+                code.line(2, "parent = element")
+                item_tag = field.key
+            code.line(2, "for item in value:")
+            if field.is_model:
+                code.line(3, "child = item._obj_to_xml_ele()")
+                code.line(3, "child.tag = {0!r}", item_tag)
+                code.line(3, "parent.append(child)")
+            else:
+                code.line(
+                    3, "ET.SubElement(parent, {0!r}).text = _to_text(item)",
+                    item_tag)
+        elif field.is_model:
+            code.line(2, "child = value._obj_to_xml_ele()")
+            code.line(2, "child.tag = {0!r}", field.key)
+            code.line(2, "element.append(child)")
+        else:
+            code.line(
+                2, "ET.SubElement(element, {0!r}).text = _to_text(value)",
+                field.key)
+    code.line(1, "return element")
+    return code.build("_obj_to_xml_ele")
+
+
+def _build_xml_ele_to_obj(fields):
+    code = CodeBuilder()
+    code.line(0, "def _xml_ele_to_obj(cls, element):")
+    code.line(1, "obj = cls.__new__(cls)")
+    code.line(1, "values = obj.__dict__")
+    code.line(1, "attrib = element.attrib")
+    if any(not field.xml_attribute for field in fields):
+        # One pass over the children instead of a find() per field.  Like
+        # find(), the first child with a tag wins.
+        code.line(1, "children = {{}}")
+        code.line(1, "for child in element:")
+        code.line(2, "children.setdefault(child.tag, child)")
+
+    for field in fields:
+        if field.is_model:
+            convert = "{0}._xml_ele_to_obj".format(
+                code.add(field.field_type, "_model"))
+        else:
+            convert = code.add(_make_converter(field.field_type), "_convert")
+
+        if field.xml_attribute:
+            code.line(
+                1, "values[{0!r}] = {1}(attrib.get({2!r}))",
+                field.name, convert, field.key)
+        elif field.is_list:
+            item = "item" if field.is_model else "item.text"
+            if field.item_tag:
+                code.line(1, "parent = children.get({0!r})", field.key)
+                code.line(
+                    1, "values[{0!r}] = None if parent is None else "
+                    "[{1}({2}) for item in parent.findall({3!r})]",
+                    field.name, convert, item, field.item_tag)
+            else:
+                code.line(
+                    1, "values[{0!r}] = [{1}({2}) for item in "
+                    "element.findall({3!r})]",
+                    field.name, convert, item, field.key)
+        elif field.is_model:
+            code.line(1, "child = children.get({0!r})", field.key)
+            code.line(
+                1, "values[{0!r}] = None if child is None else {1}(child)",
+                field.name, convert)
+        else:
+            code.line(
+                1, "values[{0!r}] = {1}(_child_text(children.get({2!r})))",
+                field.name, convert, field.key)
+    code.line(1, "return obj")
+    return code.build("_xml_ele_to_obj")
+
+
+def accepts_bytes(function):
+    """Marks a deserializer (e.g. a _json_to_obj function) as parsing
+    bytes, bytearray and memoryview input itself, so that
+    AutoMarshallingModel.deserialize hands it such input as is
+    """
+    function.accepts_bytes = True
+    return function
+
+
+def compile_fields(model_cls):
+    """Compiles model_cls.__fields__ into _obj_to_dict, _dict_to_obj,
+    _obj_to_xml_ele and _xml_ele_to_obj methods, set on model_cls itself.
+    When model_cls.__root_tag__ is set it names the XML root element and the
+    key the JSON body is wrapped in, and _obj_to_json/_json_to_obj are set
+    as well.
+    """
+    fields = tuple(model_cls.__fields__)
+    root_tag = getattr(model_cls, "__root_tag__", None)
+    model_cls._obj_to_dict = _build_obj_to_dict(fields)
+    model_cls._dict_to_obj = classmethod(_build_dict_to_obj(fields))
+    model_cls._obj_to_xml_ele = _build_obj_to_xml_ele(
+        fields, root_tag or model_cls.__name__)
+    model_cls._xml_ele_to_obj = classmethod(_build_xml_ele_to_obj(fields))
+
+    if root_tag:
+        def _obj_to_json(self):
+            return json_codec.dumps({root_tag: self._obj_to_dict()})
+
+        @accepts_bytes
+        def _json_to_obj(cls, data):
+            return cls._dict_to_obj(json_codec.loads(data)[root_tag])
+
+        model_cls._obj_to_json = _obj_to_json
+        model_cls._json_to_obj = classmethod(_json_to_obj)
+    model_cls._compiled_fields = fields
+    return model_cls
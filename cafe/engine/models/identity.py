@@ -0,0 +1,270 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Identity map for models deserialized over and over, e.g. by a behavior
+polling a list endpoint until every entity reaches a status.
+
+A model opts in by naming its primary key field:
+
+    class Server(AutoMarshallingModel):
+        __primary_key__ = "id"
+
+While an IdentityMap is active for the model (or a base class of it), lists
+built through _build_list_model reuse the instance from the previous poll
+for every entity whose data (a dict, or the values of an XML element and
+its children) did not change, without building it (or its nested models)
+again.  A map is only active in the thread, or asyncio task, that activated
+it, so concurrent tests using the same model do not share it.  String
+values of held instances are interned through the map, so the many copies
+of "ACTIVE" or a shared image id are stored once.  Since the same instance
+is handed out again, treat mapped models as read only:
+
+    with IdentityMap(Server):
+        servers = []
+        while True:
+            previous, servers = servers, client.list_servers().entity
+            changes = diff_models(previous, servers)
+            ...
+"""
+
+from collections import namedtuple
+import threading
+
+import six
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    # contextvars is only available on python 3.7+
+    ContextVar = None
+
+ModelChanges = namedtuple(
+    "ModelChanges", ["added", "removed", "changed", "unchanged"])
+
+
+def _get_key_name(model_cls):
+    """Returns the key holding the primary key in serialized dicts"""
+    for field in getattr(model_cls, "__fields__", None) or ():
+        if field.name == model_cls.__primary_key__:
+            return field.key
+    return model_cls.__primary_key__
+
+
+class _ThreadLocalVar(object):
+    """Stand-in for ContextVar before python 3.7, scoped to the thread"""
+
+    def __init__(self, name, default=None):
+        self._local = threading.local()
+        self._default = default
+
+    def get(self):
+        return getattr(self._local, "value", self._default)
+
+    def set(self, value):
+        self._local.value = value
+
+
+# {model class: IdentityMap} of the maps active in the current context
+_active_maps = (ContextVar or _ThreadLocalVar)(
+    "identity_maps", default=None)
+
+
+def get_active_map(model_cls):
+    """Returns the IdentityMap active for model_cls in the current thread
+    or task, or None
+    """
+    maps = _active_maps.get()
+    if maps:
+        for cls in model_cls.__mro__:
+            identity_map = maps.get(cls)
+            if identity_map is not None:
+                return identity_map
+    return None
+
+
+def _element_data(element):
+    """Returns the values of element and its children, compared to tell
+    whether an XML entity changed
+    """
+    return [(node.tag, node.attrib, node.text) for node in element.iter()]
+
+
+class IdentityMap(object):
+    """
+    Keeps one instance per primary key of model_cls.  Entities are reused as
+    long as their serialized data is unchanged.  The map only holds the
+    entities of the latest list it built, and the strings of those, so it
+    does not grow over a run.
+    """
+
+    def __init__(self, model_cls):
+        if getattr(model_cls, "__primary_key__", None) is None:
+            raise ValueError(
+                "{0} does not declare a __primary_key__".format(
+                    model_cls.__name__))
+        self.model_cls = model_cls
+        self.primary_key = model_cls.__primary_key__
+        self._key_name = _get_key_name(model_cls)
+        # primary key: (data the instance was built from, instance)
+        self._entries = {}
+        self._strings = {}
+        self._previous = None
+        self.reused = 0
+        self.built = 0
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, *args):
+        self.deactivate()
+
+    def activate(self):
+        """Makes _build_list_model go through this map, in the current
+        thread or asyncio task only
+        """
+        maps = dict(_active_maps.get() or {})
+        self._previous = maps.get(self.model_cls)
+        maps[self.model_cls] = self
+        _active_maps.set(maps)
+
+    def deactivate(self):
+        maps = dict(_active_maps.get() or {})
+        if maps.get(self.model_cls) is not self:
+            return
+        if self._previous is None:
+            del maps[self.model_cls]
+        else:
+            maps[self.model_cls] = self._previous
+        self._previous = None
+        _active_maps.set(maps)
+
+    def get(self, key):
+        """Returns the instance held for key, or None"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def dict_to_obj(self, data):
+        """Returns the held instance if it was built from equal data,
+        otherwise builds a new one and holds it instead.
+        """
+        key = data.get(self._key_name)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == data:
+            self.reused += 1
+            return entry[1]
+        self.built += 1
+        return self._hold(key, data, self.model_cls._dict_to_obj(data))
+
+    def element_to_obj(self, element):
+        """Same as dict_to_obj, for an XML element"""
+        key = element.get(self._key_name)
+        if key is None:
+            key = element.findtext(self._key_name)
+        data = _element_data(element)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == data:
+            self.reused += 1
+            return entry[1]
+        self.built += 1
+        return self._hold(key, data, self.model_cls._xml_ele_to_obj(element))
+
+    def merge(self, model):
+        """Returns the held instance if it equals model (which can come from
+        any format), otherwise holds model instead and returns it.
+        """
+        key = getattr(model, self.primary_key, None)
+        held = self.get(key)
+        if held is not None and held == model:
+            self.reused += 1
+            return held
+        self.built += 1
+        return self._hold(key, None, model)
+
+    def build_list(self, items):
+        """Builds a complete list of entities from a list of dicts and
+        forgets entities that are no longer listed.
+        """
+        built = self.built
+        models = [self.dict_to_obj(data) for data in items]
+        self._forget_unlisted(models, built)
+        return models
+
+    def build_xml_list(self, elements):
+        """Same as build_list, for a list of XML elements"""
+        built = self.built
+        models = [self.element_to_obj(element) for element in elements]
+        self._forget_unlisted(models, built)
+        return models
+
+    def _forget_unlisted(self, models, built):
+        """Drops the entities that are not in models, and the strings only
+        they used.  The strings are only collected again when an instance
+        was built since built, as reused instances hold no new strings.
+        """
+        if len(self._entries) > len(models):
+            keys = set(
+                getattr(model, self.primary_key, None) for model in models)
+            for key in list(self._entries):
+                if key not in keys:
+                    del self._entries[key]
+        elif self.built == built:
+            return
+        strings = {}
+        for _, model in self._entries.values():
+            for value in model.__dict__.values():
+                if isinstance(value, six.text_type):
+                    strings.setdefault(value, value)
+        self._strings = strings
+
+    def clear(self):
+        self._entries.clear()
+        self._strings.clear()
+
+    def _hold(self, key, data, model):
+        values = model.__dict__
+        strings = self._strings
+        for name, value in values.items():
+            if isinstance(value, six.text_type):
+                values[name] = strings.setdefault(value, value)
+        self._entries[key] = (data, model)
+        return model
+
+
+def diff_models(previous, current, primary_key=None):
+    """Compares two lists of models by primary key.  Returns ModelChanges
+    lists of added, removed, changed and unchanged models (models from
+    current, except for removed).  Instances reused by an IdentityMap are
+    recognized as unchanged without comparing them.
+    """
+    previous = previous or []
+    current = current or []
+    if primary_key is None:
+        for model in previous or current:
+            primary_key = type(model).__primary_key__
+            break
+    old = dict(
+        (getattr(model, primary_key, None), model) for model in previous)
+    added, changed, unchanged = [], [], []
+    for model in current:
+        key = getattr(model, primary_key, None)
+        if key not in old:
+            added.append(model)
+            continue
+        old_model = old.pop(key)
+        if old_model is model or old_model == model:
+            unchanged.append(model)
+        else:
+            changed.append(model)
+    return ModelChanges(added, list(old.values()), changed, unchanged)
@@ -0,0 +1,188 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Incremental parsing of large list responses.
+
+Both parsers consume an iterable of chunks and yield the items of a single
+list as soon as each one is complete, so only the item being parsed (plus
+one chunk) is held in memory, however long the list is.
+"""
+
+from xml.etree import ElementTree as ET
+import codecs
+import json
+import re
+
+import six
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields chunks from a string, a file like object (anything with a
+    read method, such as a raw HTTP response) or an iterable of chunks.
+    """
+    if isinstance(source, (six.binary_type, six.text_type)):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif hasattr(source, "read"):
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _iter_text(chunks):
+    decoder = codecs.getincrementaldecoder("UTF-8")("ignore")
+    for chunk in chunks:
+        if isinstance(chunk, six.binary_type):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+
+
+class _JSONReader(object):
+    """A buffer over a stream of text chunks that decodes one JSON value at
+    a time with the C accelerated raw_decode.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = _iter_text(chunks)
+        self._decoder = json.JSONDecoder(strict=False)
+        self.buffer = ""
+        self.pos = 0
+
+    def _read_more(self):
+        for chunk in self._chunks:
+            # Drop what was already consumed so the buffer stays small
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+            return True
+        return False
+
+    def peek(self):
+        """Returns the next non whitespace character, or None at the end of
+        the stream.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return None
+
+    def expect(self, *characters):
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(
+                "Expected one of {0} at offset {1}, found {2!r}".format(
+                    characters, self.pos, character))
+        self.pos += 1
+        return character
+
+    def decode(self):
+        """Decodes the next value, reading more of the stream as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next
+                # chunk
+                if end < len(self.buffer) or not self._read_more():
+                    self.pos = end
+                    return value
+            except ValueError:
+                if not self._read_more():
+                    raise
+
+
+def iter_json_array(chunks, key=None):
+    """Yields the items of the JSON array at the top level of the document,
+    or under key in the top level object.  Other values of the top level
+    object are decoded and discarded.
+    """
+    reader = _JSONReader(chunks)
+    if key is not None:
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            name = reader.decode()
+            reader.expect(":")
+            if name == key:
+                break
+            reader.decode()
+            if reader.expect(",", "}") == "}":
+                return
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode()
+        if reader.expect(",", "]") == "]":
+            return
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_xml_elements(chunks, tag):
+    """Yields every child of the root element whose tag (namespace aside)
+    is tag, once the child's end tag has been parsed.  Yielded elements are
+    detached from the root, which is cleared as it goes.
+    """
+    if not hasattr(ET, "XMLPullParser"):
+        # python 2 has no push parser, fall back to a file like object
+        events = ET.iterparse(
+            six.BytesIO(b"".join(chunks)), events=("start", "end"))
+        for element in _iter_item_elements(events, tag):
+            yield element
+        return
+
+    parser = ET.XMLPullParser(events=("start", "end"))
+
+    def events():
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event in parser.read_events():
+                yield event
+        parser.close()
+        for event in parser.read_events():
+            yield event
+
+    for element in _iter_item_elements(events(), tag):
+        yield element
+
+
+def _iter_item_elements(events, tag):
+    depth = 0
+    root = None
+    for event, element in events:
+        if event == "start":
+            depth += 1
+            if root is None:
+                root = element
+            continue
+        depth -= 1
+        if depth == 1:
+            root.remove(element)
+            if _local_name(element.tag) == tag:
+                yield element
@@ -0,0 +1,175 @@
+# Copyright 2016 Rackspace
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Bulk model construction from tabular data.
+
+Rows can come from a DB-API cursor (e.g. the one BaseSQLClient.execute
+returns), a list of tuples or namedtuples, or a NumPy structured array.
+Models are built by a loop generated for the model and column list, which
+unpacks each row straight into the new instance's attributes, without a
+_dict_to_obj call or an intermediate dict per row.
+"""
+
+from collections import OrderedDict
+import threading
+
+from cafe.engine.models.fields import CodeBuilder
+
+# Rows fetched from a cursor at a time
+FETCH_SIZE = 1000
+# Row builders kept, the least recently used is dropped beyond that
+BUILDER_CACHE_SIZE = 128
+
+_builders = OrderedDict()
+_builders_lock = threading.Lock()
+
+
+def iter_rows(source, fetch_size=FETCH_SIZE):
+    """Yields the rows of source as sequences"""
+    if hasattr(source, "dtype"):
+        # tolist() converts the whole array to python values in one C pass
+        source = source.tolist()
+    if hasattr(source, "fetchmany"):
+        rows = source.fetchmany(fetch_size)
+        while rows:
+            for row in rows:
+                yield row
+            rows = source.fetchmany(fetch_size)
+    else:
+        for row in source:
+            yield row
+
+
+def get_columns(source, columns=None):
+    """Returns the column names of source: columns if given, otherwise the
+    cursor description, the structured array's field names or the fields
+    of the first namedtuple.
+    """
+    if columns is not None:
+        return list(columns)
+    if getattr(source, "description", None):
+        return [description[0] for description in source.description]
+    dtype = getattr(source, "dtype", None)
+    if dtype is not None and dtype.names:
+        return list(dtype.names)
+    if isinstance(source, (list, tuple)) and source:
+        fields = getattr(source[0], "_fields", None)
+        if fields:
+            return list(fields)
+    raise ValueError(
+        "Column names are required for {0}".format(type(source).__name__))
+
+
+def _get_attributes(model_cls, columns):
+    """Maps each column to an attribute name (None to skip the column) and
+    returns the attributes of declared fields missing from the columns.
+    """
+    fields = getattr(model_cls, "__fields__", None)
+    if not fields:
+        return list(columns), []
+    names = {}
+    for field in fields:
+        names[field.key] = field.name
+        names[field.name] = field.name
+    attributes = [names.get(column) for column in columns]
+    missing = [field.name for field in fields
+               if field.name not in attributes]
+    return attributes, missing
+
+
+def _build_row_builder(model_cls, columns):
+    attributes, missing = _get_attributes(model_cls, columns)
+    code = CodeBuilder()
+    model = code.add(model_cls, "_model")
+    targets = ["_c{0}".format(index) if attribute else "_"
+               for index, attribute in enumerate(attributes)]
+    items = ["{0!r}: _c{1}".format(attribute, index)
+             for index, attribute in enumerate(attributes) if attribute]
+    items.extend("{0!r}: None".format(attribute) for attribute in missing)
+
+    code.line(0, "def build(rows):")
+    code.line(1, "new = {0}.__new__", model)
+    code.line(1, "models = []")
+    code.line(1, "append = models.append")
+    code.line(1, "for {0}, in rows:", ", ".join(targets))
+    code.line(2, "obj = new({0})", model)
+    code.line(2, "obj.__dict__.update({{{0}}})", ", ".join(items))
+    code.line(2, "append(obj)")
+    code.line(1, "return models")
+    return code.build("build")
+
+
+def _get_row_builder(model_cls, columns):
+    """Returns the cached row builder of model_cls and columns, building it
+    on first use
+    """
+    key = (model_cls, columns)
+    with _builders_lock:
+        builder = _builders.pop(key, None)
+        if builder is not None:
+            _builders[key] = builder
+            return builder
+
+    builder = _build_row_builder(model_cls, columns)
+    with _builders_lock:
+        _builders[key] = builder
+        while len(_builders) > BUILDER_CACHE_SIZE:
+            _builders.popitem(last=False)
+    return builder
+
+
+def build_models(model_cls, source, columns=None):
+    """Returns a list of model_cls instances, one per row of source.  Each
+    column sets the attribute of the same name or, for models with
+    __fields__, of the field with that name or key; other columns are
+    skipped and declared fields without a column are set to None.
+    """
+    columns = tuple(get_columns(source, columns))
+    if not columns:
+        raise ValueError("At least one column is required")
+    return _get_row_builder(model_cls, columns)(iter_rows(source))
+
+
+class ColumnarView(object):
+    """
+    Read only, column oriented view of tabular data, for checks that look
+    at whole columns rather than individual models:
+
+        view = ColumnarView(client.execute("SELECT id, status FROM servers"))
+        assert set(view["status"]) == {"ACTIVE"}
+    """
+
+    def __init__(self, source, columns=None):
+        self.columns = get_columns(source, columns)
+        # zip(*rows) transposes every row in one C level pass
+        values = list(zip(*iter_rows(source))) or [()] * len(self.columns)
+        self._data = dict(zip(self.columns, values))
+        self._length = len(values[0]) if values else 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, column):
+        """Returns the values of a column as a tuple"""
+        return self._data[column]
+
+    def __iter__(self):
+        """Iterates over the rows as tuples"""
+        return zip(*[self._data[column] for column in self.columns])
+
+    def row(self, index):
+        return tuple(self._data[column][index] for column in self.columns)
+
+    def to_models(self, model_cls):
+        return build_models(model_cls, list(self), self.columns)
@@ -0,0 +1,68 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import os
+import unittest
+
+import mock
+
+from cafe.common import json_codec
+
+
+class JSONCodecTests(unittest.TestCase):
+
+    DATA = {"name": u"café", "values": [1, 2.5, None, True]}
+
+    def _check_codec(self, codec):
+        body = json.dumps(self.DATA)
+        for data in (body, body.encode("UTF-8"),
+                     bytearray(body.encode("UTF-8")),
+                     memoryview(body.encode("UTF-8"))):
+            self.assertEqual(codec.loads(data), self.DATA)
+        self.assertEqual(json.loads(codec.dumps(self.DATA)), self.DATA)
+
+        # Values some backends reject fall back to the standard library
+        self.assertEqual(
+            codec.loads(b'{"a": "\x01", "b": 123456789012345678901}'),
+            {"a": "\x01", "b": 123456789012345678901})
+        self.assertEqual(json.loads(codec.dumps({1: 2 ** 70})),
+                         {"1": 2 ** 70})
+        self.assertRaises(ValueError, codec.loads, b"{not json")
+
+    def test_available_codecs(self):
+        for codec in json_codec.CODECS:
+            if codec.is_available():
+                self._check_codec(codec())
+
+    def test_select_codec(self):
+        self.addCleanup(json_codec.reset)
+        self.assertEqual(json_codec.set_codec("json").name, "json")
+        self.assertEqual(json_codec.loads(b"[1]"), [1])
+        self.assertRaises(ValueError, json_codec.set_codec, "yaml")
+
+    def test_dumps_matches_standard_library_by_default(self):
+        self.addCleanup(json_codec.reset)
+        json_codec.reset()
+        data = {"name": u"caf\xe9", "values": [1, 2.5, float("nan")]}
+        self.assertEqual(json_codec.dumps(data), json.dumps(data))
+
+    def test_codec_from_engine_config(self):
+        self.addCleanup(json_codec.reset)
+        json_codec.reset()
+        with mock.patch.dict(
+                os.environ, {"CAFE_ENGINE__json_codec": "json"}):
+            self.assertEqual(json_codec.get_codec().name, "json")
+            self.assertIs(json_codec._get_loader(), json_codec.get_codec())
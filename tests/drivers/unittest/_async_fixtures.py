@@ -0,0 +1,78 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Coroutine tests for the AsyncBaseTestFixture tests (python 3.8+ only).
+"""
+import asyncio
+
+from cafe.drivers.unittest.fixtures import AsyncBaseTestFixture
+
+
+class FakeAsyncTests(AsyncBaseTestFixture):
+
+    """ These tests are only used to build suites for the async suite and
+    will not actually run as a part of the suite.
+    """
+
+    __test__ = False
+    async_concurrency = 3
+    events = []
+    running = 0
+    max_running = 0
+
+    @classmethod
+    async def asyncSetUpClass(cls):
+        cls.events.append("setUpClass")
+        cls.addClassCleanup(cls._cleanup)
+
+    @classmethod
+    async def _cleanup(cls):
+        await asyncio.sleep(0)
+        cls.events.append("cleanup")
+
+    async def asyncSetUp(self):
+        self.loop_in_test = asyncio.get_running_loop()
+
+    def tearDown(self):
+        # BaseTestFixture.tearDown inspects unittest internals that differ
+        # between python versions, only the metrics matter here
+        self._reporter.stop_test_metrics(self._testMethodName, "Passed")
+
+    async def _wait(self):
+        FakeAsyncTests.running += 1
+        FakeAsyncTests.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05)
+        FakeAsyncTests.running -= 1
+        self.assertIs(self.loop_in_test, self.loop)
+
+    async def test_one(self):
+        await self._wait()
+
+    async def test_two(self):
+        await self._wait()
+
+    async def test_three(self):
+        await self._wait()
+
+    async def test_four(self):
+        await self._wait()
+
+    async def test_fail(self):
+        await self._wait()
+        self.fail("expected failure")
+
+    def test_sync(self):
+        self.assertEqual(self.running, 0)
@@ -0,0 +1,82 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from six import StringIO
+import mock
+
+from cafe.drivers.unittest.suite import (
+    OpenCafeAsyncTestSuite, OpenCafeUnittestTestSuite)
+
+if sys.version_info >= (3, 8):
+    # Coroutine syntax, kept out of this module for python 2
+    from ._async_fixtures import FakeAsyncTests
+
+
+@unittest.skipIf(
+    sys.version_info < (3, 8), "AsyncBaseTestFixture requires python 3.8+")
+class AsyncTestSuiteTests(unittest.TestCase):
+
+    def setUp(self):
+        FakeAsyncTests.events = []
+        FakeAsyncTests.max_running = 0
+        # Keeps the fixture's logs and statistics out of the user's log dir
+        self.log_dir = tempfile.mkdtemp()
+        environ = mock.patch.dict(os.environ, {
+            "CAFE_ENGINE__log_directory": self.log_dir,
+            "CAFE_ENGINE__test_config": "unittest"})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.addCleanup(shutil.rmtree, self.log_dir, True)
+
+    def _run_suite(self, suite):
+        for name in ("test_one", "test_two", "test_three", "test_four",
+                     "test_fail", "test_sync"):
+            suite.addTest(FakeAsyncTests(name))
+        result = unittest.TextTestResult(
+            unittest.runner._WritelnDecorator(StringIO()), True, 1)
+        suite(result)
+        return result
+
+    def test_coroutine_tests_run_concurrently(self):
+        result = self._run_suite(OpenCafeAsyncTestSuite())
+        self.assertEqual(result.testsRun, 6)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(len(result.errors), 0)
+        self.assertEqual(FakeAsyncTests.max_running, 3)
+        self.assertEqual(FakeAsyncTests.events, ["setUpClass", "cleanup"])
+        self.assertIsNone(FakeAsyncTests.loop)
+
+    def test_concurrency_limit(self):
+        self._run_suite(OpenCafeAsyncTestSuite(workers=2))
+        self.assertEqual(FakeAsyncTests.max_running, 2)
+
+    def test_serial_suite_awaits_coroutines(self):
+        result = self._run_suite(OpenCafeUnittestTestSuite())
+        self.assertEqual(result.testsRun, 6)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(len(result.errors), 0)
+        self.assertEqual(FakeAsyncTests.max_running, 1)
+
+    def test_fails_before_python_38(self):
+        with mock.patch("sys.version_info", (3, 7, 9)):
+            with self.assertRaises(AssertionError):
+                FakeAsyncTests.setUpClass()
+        self.assertEqual(FakeAsyncTests.events, [])
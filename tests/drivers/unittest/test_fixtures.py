@@ -0,0 +1,92 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import threading
+import time
+import unittest
+
+from cafe.drivers.unittest.fixtures import BaseTestFixture
+
+
+class ClassCleanupTests(unittest.TestCase):
+
+    def _make_fixture(self, workers):
+        """ Builds a fixture class with class cleanup bookkeeping, without
+        running setUpClass (and its reporting).
+        """
+        fixture = type("FakeFixture", (BaseTestFixture,), {
+            "class_cleanup_workers": workers,
+            "_class_cleanup_tasks": [],
+            "_independent_class_cleanup_tasks": set(),
+            "fixture_log": logging.getLogger(__name__)})
+        return fixture
+
+    def test_serial_cleanup_runs_in_reverse_order(self):
+        calls = []
+        fixture = self._make_fixture(workers=0)
+        fixture.addClassCleanup(calls.append, "first")
+        fixture.addIndependentClassCleanup(calls.append, "second")
+        fixture.addClassCleanup(calls.append, "third")
+        fixture._do_class_cleanup_tasks()
+        self.assertEqual(calls, ["third", "second", "first"])
+
+    def test_independent_tasks_run_concurrently(self):
+        """ Independent tasks overlap, while ordered tasks wait for every
+        task registered after them.
+        """
+        calls = []
+        started = []
+        overlapped = []
+        condition = threading.Condition()
+
+        def delete_server(name):
+            # Waits for every server deletion to start, which only happens
+            # when they all run at the same time
+            deadline = time.time() + 5
+            with condition:
+                started.append(name)
+                condition.notify_all()
+                while len(started) < 4 and time.time() < deadline:
+                    condition.wait(0.1)
+                overlapped.append(len(started) == 4)
+                calls.append(name)
+
+        fixture = self._make_fixture(workers=4)
+        fixture.addClassCleanup(calls.append, "delete_network")
+        for index in range(4):
+            fixture.addIndependentClassCleanup(
+                delete_server, "server{0}".format(index))
+        fixture.addClassCleanup(calls.append, "delete_keypair")
+        fixture._do_class_cleanup_tasks()
+
+        self.assertEqual(calls[0], "delete_keypair")
+        self.assertEqual(calls[-1], "delete_network")
+        self.assertEqual(
+            sorted(calls[1:-1]), ["server0", "server1", "server2", "server3"])
+        self.assertEqual(overlapped, [True] * 4)
+
+    def test_task_errors_are_logged_and_do_not_stop_cleanup(self):
+        calls = []
+
+        def fail():
+            raise Exception("cleanup failed")
+
+        fixture = self._make_fixture(workers=2)
+        fixture.addIndependentClassCleanup(calls.append, "after")
+        fixture.addIndependentClassCleanup(fail)
+        fixture.addIndependentClassCleanup(calls.append, "before")
+        fixture._do_class_cleanup_tasks()
+        self.assertEqual(sorted(calls), ["after", "before"])
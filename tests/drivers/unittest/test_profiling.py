@@ -0,0 +1,102 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from six import StringIO
+
+from cafe.drivers.unittest import profiling
+from cafe.drivers.unittest.profiling import (
+    ProfileScopes, ProfileTypes, ProfilingTextTestResult)
+from cafe.drivers.unittest.suite import OpenCafeUnittestTestSuite
+
+
+class FakeTests(unittest.TestCase):
+
+    """ These tests are only used to build suites for the profiler and will
+    not actually run as a part of the suite.
+    """
+
+    def test_build_list(self):
+        self.data = [str(i) for i in range(1000)]
+
+    def test_build_dict(self):
+        self.data = dict((i, str(i)) for i in range(1000))
+
+
+class ProfilingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def _run_suite(self, profiler):
+        suite = OpenCafeUnittestTestSuite()
+        suite.addTest(FakeTests('test_build_list'))
+        suite.addTest(FakeTests('test_build_dict'))
+        result = ProfilingTextTestResult(
+            unittest.runner._WritelnDecorator(StringIO()), True, 1,
+            profiler=profiler)
+        suite(result)
+        return result
+
+    def test_cpu_profile_per_test(self):
+        """ Each test gets its own profile and the merged report ranks the
+        functions called by the tests.
+        """
+        profiler = profiling.TestProfiler(
+            ProfileTypes.CPU, ProfileScopes.TEST, self.profile_dir)
+        result = self._run_suite(profiler)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(len(profiler.get_profile_files()), 2)
+        self.assertFalse(profiler.is_running)
+
+        with open(profiler.merge()) as report_file:
+            report = report_file.read()
+        self.assertIn("Merged 2 cpu profile(s)", report)
+        self.assertIn("test_build_list", report)
+
+    def test_cpu_profile_per_class(self):
+        """ A class scoped profile wraps every test of the class. """
+        profiler = profiling.TestProfiler(
+            ProfileTypes.CPU, ProfileScopes.CLASS, self.profile_dir)
+        self._run_suite(profiler)
+        files = profiler.get_profile_files()
+        self.assertEqual(len(files), 1)
+        self.assertIn("FakeTests", os.path.basename(files[0]))
+
+    @unittest.skipIf(
+        profiling.tracemalloc is None, "tracemalloc is not available")
+    def test_memory_profile_per_test(self):
+        """ Memory profiles are merged into a report ranked by size. """
+        profiler = profiling.TestProfiler(
+            ProfileTypes.MEMORY, ProfileScopes.TEST, self.profile_dir)
+        self._run_suite(profiler)
+        self.assertEqual(len(profiler.get_profile_files()), 2)
+
+        with open(profiler.merge()) as report_file:
+            report = report_file.read()
+        self.assertIn("Merged 2 memory profile(s)", report)
+        self.assertIn("test_profiling.py", report)
+
+    def test_merge_without_profiles(self):
+        profiler = profiling.TestProfiler(
+            ProfileTypes.CPU, ProfileScopes.TEST, self.profile_dir)
+        self.assertIsNone(profiler.merge())
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
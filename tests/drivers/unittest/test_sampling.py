@@ -0,0 +1,80 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from cafe.drivers.unittest.sampling import (
+    StackSampler, merge_samples, write_folded_stacks)
+
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        sum(range(100))
+
+
+class StackSamplerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.samples_dir = tempfile.mkdtemp()
+
+    def test_samples_are_counted_per_label(self):
+        """ Samples are only taken while a label is set and are attributed
+        to that label.
+        """
+        sampler = StackSampler(interval=0.005)
+        sampler.start()
+        busy_wait(0.05)
+        sampler.label = "tests.FakeTests.test_busy"
+        busy_wait(0.1)
+        sampler.label = None
+        sampler.stop()
+
+        samples = sampler.pop_samples()
+        self.assertEqual(list(samples), ["tests.FakeTests.test_busy"])
+        stacks = samples["tests.FakeTests.test_busy"]
+        self.assertTrue(any(
+            stack.endswith(":busy_wait") for stack in stacks))
+        self.assertEqual(sampler.pop_samples(), {})
+
+    def test_write_folded_stacks(self):
+        samples = merge_samples(
+            {"a.Test.test_one": {"m:run;m:test_one": 2}},
+            {"a.Test.test_one": {"m:run;m:test_one": 3},
+             "a.Test.test_two": {"m:run;m:test_two": 1}})
+        paths = write_folded_stacks(samples, self.samples_dir)
+        self.assertEqual(len(paths), 3)
+
+        with open(os.path.join(self.samples_dir, "all.folded")) as folded:
+            lines = folded.read().splitlines()
+        self.assertEqual(lines, [
+            "a.Test.test_one;m:run;m:test_one 5",
+            "a.Test.test_two;m:run;m:test_two 1"])
+
+    def test_dump(self):
+        sampler = StackSampler()
+        sampler.label = "a.Test.test_hung"
+        path = sampler.dump(self.samples_dir)
+        with open(path) as dump_file:
+            contents = dump_file.read()
+        self.assertIn("label=a.Test.test_hung", contents)
+        self.assertIn(":test_dump", contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.samples_dir, ignore_errors=True)
@@ -0,0 +1,126 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from six import StringIO
+
+from cafe.drivers.unittest.decorators import tags, THREAD_SAFE_TAG
+from cafe.drivers.unittest import profiling
+from cafe.drivers.unittest.sampling import StackSampler
+from cafe.drivers.unittest.suite import OpenCafeThreadedTestSuite
+
+
+class FakeTests(unittest.TestCase):
+
+    """ These tests are only used to build suites for the threaded suite and
+    will not actually run as a part of the suite.
+    """
+
+    __test__ = False
+    setup_count = 0
+    threads = set()
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.setup_count += 1
+
+    def _wait(self):
+        with self.lock:
+            FakeTests.running += 1
+            FakeTests.max_running = max(self.max_running, self.running)
+            self.threads.add(threading.current_thread().ident)
+        time.sleep(0.05)
+        with self.lock:
+            FakeTests.running -= 1
+
+    @tags(THREAD_SAFE_TAG)
+    def test_thread_safe_one(self):
+        self._wait()
+
+    @tags(THREAD_SAFE_TAG)
+    def test_thread_safe_two(self):
+        self._wait()
+
+    @tags(THREAD_SAFE_TAG)
+    def test_thread_safe_fail(self):
+        self._wait()
+        self.fail("expected failure")
+
+    def test_serial(self):
+        self.assertEqual(self.running, 0)
+
+
+class ThreadedTestSuiteTests(unittest.TestCase):
+
+    def setUp(self):
+        FakeTests.setup_count = 0
+        FakeTests.max_running = 0
+        FakeTests.threads = set()
+
+    def _run_suite(self, workers, result=None):
+        suite = OpenCafeThreadedTestSuite(workers=workers)
+        for name in ("test_thread_safe_one", "test_thread_safe_two",
+                     "test_thread_safe_fail", "test_serial"):
+            suite.addTest(FakeTests(name))
+        if result is None:
+            result = unittest.TextTestResult(
+                unittest.runner._WritelnDecorator(StringIO()), True, 2)
+        suite(result)
+        return result
+
+    def test_thread_safe_tests_run_concurrently(self):
+        result = self._run_suite(workers=3)
+        self.assertEqual(FakeTests.setup_count, 1)
+        self.assertEqual(FakeTests.max_running, 3)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(
+            result.failures[0][0]._testMethodName, "test_thread_safe_fail")
+        self.assertEqual(result.errors, [])
+
+    def test_single_worker_runs_serially(self):
+        result = self._run_suite(workers=1)
+        self.assertEqual(FakeTests.setup_count, 1)
+        self.assertEqual(FakeTests.max_running, 1)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(len(result.failures), 1)
+
+    def test_concurrent_tests_are_profiled_while_running(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        profiler = profiling.TestProfiler("cpu", profile_dir=profile_dir)
+        sampler = StackSampler(0.005)
+        result = profiling.ProfilingTextTestResult(
+            unittest.runner._WritelnDecorator(StringIO()), True, 2,
+            profiler=profiler, sampler=sampler)
+        self._run_suite(workers=3, result=result)
+        test_id = FakeTests("test_thread_safe_one").id()
+        stats = pstats.Stats(os.path.join(
+            profile_dir, "{0}.prof".format(test_id)))
+        self.assertIn(
+            "_wait", [function for _, _, function in stats.stats])
+        self.assertEqual(len(profiler.get_profile_files()), 4)
+        self.assertTrue(any(
+            "_wait" in stack for stack in sampler.samples[test_id]))
@@ -0,0 +1,32 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""
+Coroutines for the AsyncBaseSQLClient tests (python 3.5+ only).
+"""
+import asyncio
+
+
+async def run_concurrent_queries(client, path, count):
+    """Inserts count rows, then selects each of them concurrently"""
+    await client.connect(path)
+    await client.execute("CREATE TABLE servers (id INTEGER)")
+    await client.execute_many(
+        "INSERT INTO servers VALUES (?)", [(i,) for i in range(count)])
+    results = await asyncio.gather(*[
+        client.execute("SELECT id FROM servers WHERE id = ?", (i,))
+        for i in range(count)])
+    await client.close()
+    return results
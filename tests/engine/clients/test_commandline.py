@@ -0,0 +1,141 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import re
+import time
+import unittest
+
+import mock
+
+from cafe.engine.clients.commandline import BaseCommandLineClient
+
+
+class RunCommandsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = BaseCommandLineClient()
+
+    def test_run_command(self):
+        response = self.client.run_command("printf 'a\\nb\\n'; exit 3")
+        self.assertEqual(response.standard_out, ["a", "b"])
+        self.assertEqual(response.return_code, 3)
+        self.assertIsNone(response.process)
+
+    def test_responses_come_as_completed(self):
+        start = time.time()
+        with self.assertLogs(self.client._log, "INFO") as logs:
+            responses = list(self.client.run_commands(
+                ["sleep 0.5; echo slow", "echo fast", "sleep 0.5"] * 4,
+                max_workers=12))
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(responses[0].standard_out, ["fast"])
+        self.assertEqual(len(responses), 12)
+        self.assertIn("Ran 12 commands", logs.output[-1])
+
+    def test_timeout(self):
+        responses = list(self.client.run_commands(
+            ["sleep 5", "echo done"], timeout=0.2))
+        self.assertEqual(responses[0].standard_out, ["done"])
+        self.assertTrue(responses[1].timed_out)
+        self.assertFalse(responses[0].timed_out)
+        self.assertLess(responses[1].duration, 2)
+
+    def test_stopping_early_kills_running_commands(self):
+        start = time.time()
+        responses = self.client.run_commands(
+            ["echo fast", "sleep 30", "sleep 30; echo late"])
+        self.assertEqual(next(responses).standard_out, ["fast"])
+        responses.close()
+        self.assertLess(time.time() - start, 5)
+
+    def test_missing_program_is_logged(self):
+        with self.assertLogs(self.client._log, "ERROR"):
+            response = self.client.run_command(["cafe-no-such-program"])
+        self.assertIsNone(response.return_code)
+        self.assertIsNone(response.process)
+
+
+class StreamCommandTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = BaseCommandLineClient()
+
+    def test_bad_arguments_raise_before_starting(self):
+        with mock.patch.object(self.client, "_execute_command") as execute:
+            self.assertRaises(
+                re.error, self.client.stream_command, "sleep 5", until="(")
+            self.assertRaises(
+                TypeError, self.client.stream_command, "sleep 5", untill="x")
+        self.assertFalse(execute.called)
+
+    def test_lines_and_ring_buffer(self):
+        stream = self.client.stream_command(
+            "seq 1 5000; echo error >&2; exit 2", buffer_size=10)
+        lines = list(stream)
+        self.assertEqual(len(lines), 5001)
+        self.assertEqual(lines[0], ("stdout", "1"))
+        self.assertIn(("stderr", "error"), lines)
+        response = stream.response
+        self.assertEqual(response.standard_out, [
+            str(number) for number in range(4991, 5001)])
+        self.assertEqual(response.standard_error, ["error"])
+        self.assertEqual(response.return_code, 2)
+
+    def test_stop_on_pattern(self):
+        seen = []
+        start = time.time()
+        response = self.client.stream_command(
+            "echo starting; echo ready; sleep 10",
+            callbacks=[(r"^start", lambda line, match: seen.append(line))],
+            until="ready").wait()
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(seen, ["starting"])
+        self.assertEqual(response.standard_out, ["starting", "ready"])
+        self.assertFalse(response.timed_out)
+
+    def test_timeout(self):
+        response = self.client.stream_command(
+            "echo started; sleep 10", timeout=0.3).wait()
+        self.assertTrue(response.timed_out)
+        self.assertEqual(response.standard_out, ["started"])
+        self.assertLess(response.duration, 5)
+
+
+class ArgvAndEnvironmentTests(unittest.TestCase):
+
+    def test_argv_runs_without_a_shell(self):
+        client = BaseCommandLineClient(base_command="printf")
+        response = client.run_command(["%s|%s\\n", "$HOME"], ["a b"])
+        self.assertEqual(
+            response.command, ["printf", "%s|%s\\n", "$HOME", "a b"])
+        self.assertEqual(response.standard_out, ["$HOME|a b"])
+
+    def test_string_arguments(self):
+        client = BaseCommandLineClient(base_command="echo")
+        self.assertEqual(
+            client.run_command("a", ["b", "c"]).standard_out, ["a b c"])
+
+    def test_environment_is_per_client_and_call(self):
+        client = BaseCommandLineClient(env_var_dict={"CAFE_TEST_A": "1"})
+        other = BaseCommandLineClient()
+        self.assertNotIn("CAFE_TEST_A", os.environ)
+        argv = ["sh", "-c", "echo ${CAFE_TEST_A:-unset}${CAFE_TEST_B:-}"]
+        self.assertEqual(client.run_command(argv).standard_out, ["1"])
+        self.assertEqual(other.run_command(argv).standard_out, ["unset"])
+        self.assertEqual(client.run_command(
+            argv, env={"CAFE_TEST_B": "2"}).standard_out, ["12"])
+        client.unset_environment_variables(["CAFE_TEST_A"])
+        self.assertEqual(client.run_command(argv).standard_out, ["unset"])
@@ -0,0 +1,120 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import unittest
+
+import mock
+
+from cafe.engine.clients.ping import PingClient
+
+FAKE_PING = """#!/bin/sh
+for address; do :; done
+if [ "$address" = "127.0.0.1" ]; then
+    echo "3 packets transmitted, 3 received, 0% packet loss, time 2003ms"
+    echo "rtt min/avg/max/mdev = 0.030/0.045/0.060/0.012 ms"
+elif [ "$address" = "10.0.0.1" ]; then
+    echo "3 packets transmitted, 0 received, 100% packet loss, time 2003ms"
+else
+    echo "ping: unknown host $address"
+fi
+"""
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "ping_many requires python 3.5+")
+class PingManyTests(unittest.TestCase):
+
+    def listen(self):
+        listener = socket.socket()
+        self.addCleanup(listener.close)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(16)
+        return listener.getsockname()[1]
+
+    def test_tcp(self):
+        results = PingClient.ping_many(
+            ["127.0.0.1", "localhost", "127.0.0.1"], num_pings=2,
+            mode=PingClient.TCP, port=self.listen(), timeout=2)
+        self.assertEqual(
+            [result.ip for result in results],
+            ["127.0.0.1", "localhost", "127.0.0.1"])
+        for result in results:
+            self.assertTrue(result.reachable)
+            self.assertEqual(result.packet_loss, 0)
+            self.assertLessEqual(result.rtt_min, result.rtt_max)
+            self.assertIsNone(result.error)
+
+    def test_tcp_refused_counts_as_reply(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+        closed.close()
+        result, = PingClient.ping_many(
+            ["127.0.0.1"], mode=PingClient.TCP, port=port)
+        self.assertEqual(result.received, 3)
+
+    def test_awaitable(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        result, = loop.run_until_complete(PingClient.ping_many_async(
+            ["127.0.0.1"], mode=PingClient.TCP, port=self.listen()))
+        self.assertTrue(result.reachable)
+
+    def test_blocking_call_from_running_loop(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        future = loop.create_future()
+        port = self.listen()
+        loop.call_soon(lambda: future.set_result(PingClient.ping_many(
+            ["127.0.0.1"], mode=PingClient.TCP, port=port)))
+        result, = loop.run_until_complete(future)
+        self.assertTrue(result.reachable)
+
+    def test_icmp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "ping")
+        with open(path, "w") as ping:
+            ping.write(FAKE_PING)
+        os.chmod(path, stat.S_IRWXU)
+        environ = {"PATH": "{0}:{1}".format(directory, os.environ["PATH"])}
+        with mock.patch.dict(os.environ, environ):
+            results = PingClient.ping_many(
+                ["127.0.0.1", "10.0.0.1", "bad"], max_concurrency=2)
+        reachable, lost, bad = results
+        self.assertEqual(reachable.rtt_avg, 0.045)
+        self.assertEqual(reachable.packet_loss, 0)
+        self.assertEqual(lost.packet_loss, 100)
+        self.assertIsNone(lost.error)
+        self.assertFalse(bad.reachable)
+        self.assertIn("unknown host", bad.error)
+
+    def test_icmp_command_follows_platform(self):
+        with mock.patch("platform.system", return_value="Windows"):
+            self.assertEqual(
+                PingClient._ping_command(6, 2), "ping -6 -c 2")
+        with mock.patch("platform.system", return_value="Linux"):
+            self.assertEqual(PingClient._ping_command(6, 2), "ping6 -c 2")
+
+    def test_unknown_mode(self):
+        self.assertRaises(
+            ValueError, PingClient.ping_many, ["127.0.0.1"], mode="udp")
@@ -0,0 +1,222 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+from cafe.engine.clients.sql import (
+    AsyncBaseSQLClient, BaseSQLClient, PooledSQLClient, ResultSet,
+    SQLClientException)
+
+if sys.version_info >= (3, 5):
+    # Coroutine syntax, kept out of this module for python 2
+    from . import _async_sql
+
+
+class SingleSQLiteClient(BaseSQLClient):
+    _driver = sqlite3
+
+    def _open_connection(self):
+        return sqlite3.connect(self._connect_args[0])
+
+
+class SQLiteClient(PooledSQLClient):
+    _driver = sqlite3
+
+    def _open_connection(self):
+        return sqlite3.connect(
+            self._connect_args[0], check_same_thread=False)
+
+
+class PooledSQLClientTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.client = SQLiteClient(max_connections=2, checkout_timeout=0.1)
+        self.client.connect(os.path.join(directory, "test.db"))
+        self.addCleanup(self.client.close)
+        self.client.execute("CREATE TABLE servers (id INTEGER, name TEXT)")
+
+    def test_execute_returns_fetched_rows(self):
+        self.client.execute_many(
+            "INSERT INTO servers VALUES (?, ?)", [(1, "a"), (2, "b")])
+        result = self.client.execute(
+            "SELECT name FROM servers WHERE id > ?", (0,))
+        self.assertIsInstance(result, ResultSet)
+        self.assertEqual(result.fetchone(), ("a",))
+        self.assertEqual(result.fetchall(), [("b",)])
+        self.assertEqual(len(self.client._idle), 1)
+
+    def test_block_rolls_back_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.client.connection():
+                self.client.execute("INSERT INTO servers VALUES (1, 'a')")
+                raise ValueError()
+        self.assertEqual(
+            self.client.execute("SELECT * FROM servers").fetchall(), [])
+
+    def test_threads_share_the_pool(self):
+        errors = []
+
+        def worker():
+            try:
+                for index in range(50):
+                    self.client.execute(
+                        "INSERT INTO servers VALUES (?, 'x')", (index,))
+            except Exception as exception:
+                errors.append(exception)
+
+        self.client.checkout_timeout = 10
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.client.execute(
+            "SELECT COUNT(*) FROM servers").fetchone(), (200,))
+        self.assertLessEqual(self.client._size, 2)
+
+    def test_checkout_is_bounded(self):
+        checked_out = []
+        with self.client.connection():
+            # Nested blocks share the thread's connection
+            with self.client.connection():
+                pass
+            thread = threading.Thread(
+                target=lambda: checked_out.append(self.client._checkout()))
+            thread.start()
+            thread.join()
+            self.assertRaises(SQLClientException, self.client._checkout)
+        self.client._checkin(*checked_out[0])
+
+    def test_unhealthy_connections_are_replaced(self):
+        self.client.HEALTH_CHECK_INTERVAL = 0
+        connection, statements, _ = self.client._idle.pop()
+        connection.close()
+        self.client._checkin(connection, statements)
+        self.assertEqual(self.client.execute("SELECT 1").fetchone(), (1,))
+
+    def test_health_check_query_per_driver(self):
+        self.assertEqual(self.client._get_health_check_query(), "SELECT 1")
+        self.client._driver = type(sqlite3)("cx_Oracle")
+        self.assertEqual(
+            self.client._get_health_check_query(), "SELECT 1 FROM DUAL")
+
+    def test_block_returns_a_cursor_per_statement(self):
+        self.client.execute_many(
+            "INSERT INTO servers VALUES (?, ?)", [(1, "a"), (2, "b")])
+        with self.client.connection():
+            first = self.client.execute("SELECT name FROM servers")
+            second = self.client.execute("SELECT id FROM servers")
+            self.assertEqual(first.fetchall(), [("a",), ("b",)])
+            self.assertEqual(second.fetchall(), [(1,), (2,)])
+
+    def test_statements_are_cached_per_connection(self):
+        self.client.STATEMENT_CACHE_SIZE = 2
+        query = "SELECT name FROM servers WHERE id = ?"
+        self.client.execute(query, (1,))
+        statements = self.client._idle[-1][1]
+        cursor = statements[query]
+        self.client.execute(query, (2,))
+        self.assertIs(statements[query], cursor)
+        self.client.execute("SELECT 1")
+        self.client.execute("SELECT 2")
+        self.assertEqual(list(statements), ["SELECT 1", "SELECT 2"])
+
+    def test_not_connected(self):
+        self.assertRaises(
+            SQLClientException, SQLiteClient().execute, "SELECT 1")
+
+
+class StreamAndBulkInsertTests(unittest.TestCase):
+
+    def _test_client(self, client):
+        self.addCleanup(client.close)
+        client.execute("CREATE TABLE numbers (value INTEGER, name TEXT)")
+        rows = ((index, str(index)) for index in range(2500))
+        with self.assertLogs(client._log, "INFO") as logs:
+            self.assertEqual(client.bulk_insert(
+                "numbers", rows, batch_size=1000,
+                columns=["value", "name"]), 2500)
+            stream = client.stream(
+                "SELECT value FROM numbers WHERE value >= ?", (100,),
+                batch_size=300)
+            self.assertEqual(sum(1 for _ in stream), 2400)
+        self.assertIn("Inserted 2500 rows", logs.output[0])
+        self.assertIn("Streamed 2400 rows", logs.output[1])
+        self.assertEqual(client.bulk_insert("numbers", []), 0)
+
+    def test_base_client(self):
+        client = SingleSQLiteClient()
+        client.connect(":memory:")
+        self._test_client(client)
+
+    def test_pooled_client(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        client = SQLiteClient()
+        client.connect(os.path.join(directory, "test.db"))
+        self._test_client(client)
+        stream = client.stream("SELECT value FROM numbers")
+        next(stream)
+        self.assertEqual(len(client._idle), 0)
+        stream.close()
+        self.assertEqual(len(client._idle), 1)
+        # Inserted rows were committed
+        self.assertEqual(client.execute(
+            "SELECT COUNT(*) FROM numbers").fetchone(), (2500,))
+
+
+class AsyncSQLiteClient(AsyncBaseSQLClient):
+    _driver = sqlite3
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncSQLiteClient, self).__init__(*args, **kwargs)
+        self.opened = 0
+
+    def _open_connection(self):
+        self.opened += 1
+        return sqlite3.connect(
+            self._connect_args[0], check_same_thread=False)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "coroutines require python 3.5+")
+class AsyncBaseSQLClientTests(unittest.TestCase):
+
+    def test_concurrent_queries(self):
+        import asyncio
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        client = AsyncSQLiteClient(max_concurrency=3)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        results = loop.run_until_complete(_async_sql.run_concurrent_queries(
+            client, os.path.join(directory, "test.db"), 20))
+        self.assertEqual(
+            [result.fetchone() for result in results],
+            [(i,) for i in range(20)])
+        self.assertLessEqual(client.opened, 3)
+
+    def test_not_connected(self):
+        self.assertRaises(
+            SQLClientException, AsyncSQLiteClient().execute, "SELECT 1")
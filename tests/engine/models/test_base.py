@@ -0,0 +1,176 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from xml.etree import ElementTree as ET
+import logging
+import unittest
+
+import mock
+
+from cafe.engine.models import base, fields
+from cafe.engine.models.base import (
+    AutoMarshallingModel, BaseModel, LazyRepr)
+from cafe.engine.models.fields import Field
+
+
+class Server(AutoMarshallingModel):
+    __fields__ = (Field("id"), Field("name"), Field("tags", is_list=True))
+
+
+class RemoveNamespacesTests(unittest.TestCase):
+
+    def test_tags_and_attributes(self):
+        element = AutoMarshallingModel._remove_namespaces(ET.fromstring(
+            '<feed xmlns="http://www.w3.org/2005/Atom"><entry>'
+            '<event xmlns="http://docs.rackspace.com/core/event" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'id="1" xsi:type="Usage"/></entry><entry/></feed>'))
+        self.assertEqual(element.tag, "feed")
+        self.assertEqual(
+            [child.tag for child in element.iter()],
+            ["feed", "entry", "event", "entry"])
+        self.assertEqual(
+            element.find("entry/event").attrib, {"id": "1", "type": "Usage"})
+
+    def test_comments_are_kept(self):
+        parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+        parser.feed('<a xmlns="urn:a"><!-- note --><b/></a>')
+        element = AutoMarshallingModel._remove_namespaces(parser.close())
+        self.assertIs(element[0].tag, ET.Comment)
+        self.assertEqual(element[1].tag, "b")
+
+
+class BinaryFormatTests(unittest.TestCase):
+
+    def _round_trip(self, format_type):
+        server = Server._dict_to_obj(
+            {"id": 1, "name": u"caf\xe9", "tags": ["a", "b"]})
+        serialized = server.serialize(format_type)
+        self.assertIsInstance(serialized, bytes)
+        self.assertEqual(Server.deserialize(serialized, format_type), server)
+
+    @unittest.skipIf(base.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        self._round_trip("msgpack")
+
+    @unittest.skipIf(base.cbor2 is None, "cbor2 is not installed")
+    def test_cbor(self):
+        self._round_trip("cbor")
+
+    @unittest.skipIf(base.msgpack is not None, "msgpack is installed")
+    def test_missing_package(self):
+        server = Server._dict_to_obj({"id": 1})
+        self.assertRaises(ImportError, server.serialize, "msgpack")
+        self.assertIsNone(Server.deserialize(b"\x81", "msgpack"))
+
+
+class EqualityAndRenderingTests(unittest.TestCase):
+
+    def test_equality(self):
+        first = Server._dict_to_obj({"id": 1, "name": "a"})
+        self.assertEqual(first, first)
+        self.assertEqual(first, Server._dict_to_obj({"id": 1, "name": "a"}))
+        self.assertNotEqual(
+            first, Server._dict_to_obj({"id": 2, "name": "a"}))
+        self.assertNotEqual(first, None)
+        self.assertNotEqual(first, 1)
+
+    def test_str_truncates_large_values(self):
+        model = BaseModel()
+        model.body = "x" * 5000
+        model.items = list(range(5000))
+        model.log = logging.getLogger(__name__)
+        text = str(model)
+        self.assertTrue(text.startswith("<BaseModel object>\n"))
+        self.assertIn("<truncated, 5000 characters in total>", text)
+        self.assertNotIn("log =", text)
+        self.assertLess(len(text), 2 * BaseModel.__REPR_VALUE_LIMIT__)
+
+    def test_lazy_repr_renders_once(self):
+        calls = []
+
+        class Counted(object):
+            def __str__(self):
+                calls.append(1)
+                return "counted"
+
+        lazy = LazyRepr(Counted(), limit=3)
+        self.assertEqual(calls, [])
+        self.assertEqual(
+            str(lazy), "cou... <truncated, 7 characters in total>")
+        str(lazy)
+        self.assertEqual(len(calls), 1)
+
+
+class DeserializeTests(unittest.TestCase):
+
+    BODY = b'{"id": 1, "name": "caf\xc3\xa9"}'
+
+    def test_bytes_like_input(self):
+        expected = Server._dict_to_obj({"id": 1, "name": u"caf\xe9"})
+        for data in (self.BODY, bytearray(self.BODY), memoryview(self.BODY),
+                     self.BODY.decode("UTF-8")):
+            self.assertEqual(Server.deserialize(data, "json"), expected)
+
+    def test_text_only_deserializer(self):
+        class Legacy(AutoMarshallingModel):
+            @classmethod
+            def _json_to_obj(cls, data):
+                return cls({"name": data.strip("{}")})
+
+        self.assertEqual(
+            Legacy.deserialize(memoryview(b"{x}"), "json").name, "x")
+
+    def test_built_in_deserializer_gets_bytes_as_is(self):
+        data = memoryview(self.BODY)
+        with mock.patch.object(
+                base.json_codec, "loads", return_value={"id": 1}) as loads:
+            self.assertEqual(Server.deserialize(data, "json").id, 1)
+        loads.assert_called_once_with(data)
+
+    def test_compiled_deserializer_gets_bytes_as_is(self):
+        class Flavor(AutoMarshallingModel):
+            __root_tag__ = "flavor"
+            __fields__ = (Field("id"), )
+
+        data = memoryview(b'{"flavor": {"id": 1}}')
+        with mock.patch.object(
+                fields.json_codec, "loads",
+                return_value={"flavor": {"id": 1}}) as loads:
+            self.assertEqual(Flavor.deserialize(data, "json").id, 1)
+        loads.assert_called_once_with(data)
+
+    def test_non_utf8_payload_reaches_text_deserializer(self):
+        class Legacy(AutoMarshallingModel):
+            @classmethod
+            def _xml_to_obj(cls, data):
+                return cls({"name": ET.fromstring(data).get("name")})
+
+        data = u'<?xml version="1.0" encoding="ISO-8859-1"?>' \
+            u'<server name="caf\xe9"/>'.encode("ISO-8859-1")
+        self.assertEqual(Legacy.deserialize(data, "xml").name, u"caf\xe9")
+
+    def test_unknown_format_is_logged(self):
+        with self.assertLogs(level="DEBUG"):
+            self.assertIsNone(Server.deserialize(self.BODY, "yaml"))
+
+    def test_failed_payload_log_is_bounded(self):
+        data = memoryview(b"{" + b"x" * 100000)
+        with self.assertLogs(level="DEBUG") as logs:
+            self.assertIsNone(Server.deserialize(data, "json"))
+        self.assertIn("<truncated, 100001 bytes in total>", logs.output[-1])
+        self.assertLess(
+            len(logs.output[-1]),
+            Server.__DESERIALIZE_LOG_LIMIT__ + 200)
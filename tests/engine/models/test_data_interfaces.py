@@ -0,0 +1,304 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from cafe.engine import config
+from cafe.engine.models import data_interfaces
+from cafe.engine.models.data_interfaces import (
+    ConfigSectionInterface, ENVIRONMENT_LAYER, JSONDataSource,
+    LayeredDataSource, MongoDataSource)
+
+CONFIG = """[compute]
+timeout = 30
+interval = 0.5
+enabled = true
+flavors = {"small": 1, "large": 4}
+bad_number = thirty
+"""
+
+
+class ComputeConfig(ConfigSectionInterface):
+    SECTION_NAME = "compute"
+
+
+class ConfigSectionInterfaceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "test.config")
+        self._write(CONFIG)
+        self.config = ComputeConfig(self.path)
+
+    def _write(self, text, mtime=None):
+        with open(self.path, "w") as config_file:
+            config_file.write(text)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_typed_accessors(self):
+        self.assertEqual(self.config.get("timeout"), "30")
+        self.assertEqual(self.config.get_int("timeout"), 30)
+        self.assertEqual(self.config.get_float("interval"), 0.5)
+        self.assertIs(self.config.get_boolean("enabled"), True)
+        self.assertEqual(
+            self.config.get_json("flavors"), {"small": 1, "large": 4})
+        self.assertEqual(self.config.get_int("missing", 5), 5)
+        self.assertEqual(self.config.get_int("bad_number", 7), 7)
+
+    def test_values_are_cached(self):
+        flavors = self.config.get_json("flavors")
+        self.config.get_int("timeout")
+        self.config.get_int("missing")
+        with mock.patch.object(
+                self.config._data_source, "get",
+                side_effect=AssertionError("not cached")):
+            self.assertIs(self.config.get_json("flavors"), flavors)
+            self.assertEqual(self.config.get_int("timeout", 1), 30)
+            self.assertEqual(self.config.get_int("missing", 1), 1)
+            self.assertEqual(self.config.get_int("missing", 2), 2)
+
+    def test_environment_change(self):
+        self.assertEqual(self.config.get_int("timeout"), 30)
+        with mock.patch.dict(os.environ, {"CAFE_compute__timeout": "60"}):
+            self.assertEqual(self.config.get_int("timeout"), 60)
+        self.assertEqual(self.config.get_int("timeout"), 30)
+
+    def test_file_change(self):
+        self.assertEqual(self.config.get_int("timeout"), 30)
+        self._write("[compute]\ntimeout = 90\n", mtime=1)
+        self.assertEqual(self.config.get_int("timeout"), 30)
+        self.config._next_file_check = 0
+        self.assertEqual(self.config.get_int("timeout"), 90)
+        self.assertIsNone(self.config.get_json("flavors"))
+
+
+class SharedConfigFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(config.CONFIG_FILES.clear)
+
+    def _write(self, name, text, mtime):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as config_file:
+            config_file.write(text)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_sections_share_one_parse(self):
+        path = self._write("test.config", CONFIG, mtime=1)
+        with mock.patch.object(
+                config, "ConfigParser", wraps=config.ConfigParser) as parser:
+            first = ComputeConfig(path)
+            second = ConfigSectionInterface(path, "other")
+            self.assertIs(first._data_source._data_source,
+                          second._data_source._data_source)
+            self.assertEqual(parser.call_count, 1)
+
+            self._write("test.config", "[compute]\ntimeout = 1\n", mtime=2)
+            self.assertEqual(ComputeConfig(path).get_int("timeout"), 1)
+            self.assertEqual(parser.call_count, 2)
+
+    def test_environment_is_part_of_the_key(self):
+        path = self._write("test.config", CONFIG, mtime=1)
+        first = ComputeConfig(path)
+        with mock.patch.dict(os.environ, {"CAFE_compute__extra": "1"}):
+            second = ComputeConfig(path)
+        self.assertIsNot(first._data_source._data_source,
+                         second._data_source._data_source)
+
+    def test_registry_is_bounded(self):
+        registry = config.ConfigFileRegistry(max_files=2)
+        paths = [self._write("{0}.config".format(index), CONFIG, mtime=1)
+                 for index in range(3)]
+        first = registry.get(paths[0], config.read_config_file)
+        registry.get(paths[1], config.read_config_file)
+        # The first file was used after the second, which is dropped first
+        self.assertIs(registry.get(paths[0], config.read_config_file), first)
+        registry.get(paths[2], config.read_config_file)
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get(paths[0], config.read_config_file), first)
+
+        # Deleted files are parsed on every call, and dropped
+        os.remove(paths[0])
+        self.assertIsNot(
+            registry.get(paths[0], config.read_config_file), first)
+        self.assertEqual(len(registry), 1)
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+
+    def test_json_data_source(self):
+        path = self._write("test.json", '{"compute": {"timeout": 30}}', 1)
+        first = JSONDataSource(path, "compute")
+        second = JSONDataSource(path, "other")
+        self.assertIs(first._data_source, second._data_source)
+        self.assertEqual(first.get("timeout"), 30)
+
+
+class LayeredDataSourceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(LayeredDataSource.uninstall)
+        self.config_path = os.path.join(self.directory, "test.config")
+        with open(self.config_path, "w") as config_file:
+            config_file.write(CONFIG)
+        self.json_path = os.path.join(self.directory, "product.json")
+        with open(self.json_path, "w") as json_file:
+            json_file.write('{"compute": {"timeout": 45, "region": "DFW"}}')
+
+    def _layers(self):
+        with mock.patch.dict(os.environ, {"CAFE_compute__region": "ORD"}):
+            return LayeredDataSource(
+                [self.config_path, self.json_path, ENVIRONMENT_LAYER,
+                 {"compute": {"enabled": "false"}}])
+
+    def test_later_layers_win(self):
+        compute = self._layers().section("compute")
+        self.assertEqual(compute.get("timeout"), 45)
+        self.assertEqual(compute.get("interval"), "0.5")
+        self.assertEqual(compute.get("region"), "ORD")
+        self.assertIs(compute.get_boolean("enabled"), False)
+        self.assertEqual(compute.get_json("flavors")["large"], 4)
+        self.assertEqual(compute.get("missing", "default"), "default")
+        with self.assertRaises(TypeError):
+            compute.table[("compute", "timeout")] = 1
+
+    def test_installed_table_is_shared_with_sections(self):
+        layers = pickle.loads(pickle.dumps(self._layers()))
+        layers.install()
+        os.remove(self.config_path)
+        config = ComputeConfig(self.config_path)
+        self.assertEqual(config.get_int("timeout"), 45)
+        self.assertEqual(config.get("region"), "ORD")
+
+    def test_sections_of_other_files_read_their_file(self):
+        self._layers().install()
+        other_path = os.path.join(self.directory, "other.config")
+        with open(other_path, "w") as config_file:
+            config_file.write("[compute]\nregion = IAD\nsize = 1\n")
+        config = ComputeConfig(other_path)
+        self.assertEqual(config.get("region"), "IAD")
+        self.assertEqual(config.get("size"), "1")
+
+    def test_follows_config_parser_rules(self):
+        with open(self.config_path, "w") as config_file:
+            config_file.write(
+                "[compute]\nTimeout = 5\nenabled = yes\ndebug = 0\n"
+                "log_dir = %(CAFE_ENGINE__log_directory)s/compute\n")
+        with mock.patch.dict(
+                os.environ, {"CAFE_ENGINE__log_directory": "/tmp/logs"}):
+            compute = LayeredDataSource([self.config_path]).section(
+                "compute")
+        self.assertEqual(compute.get("timeout"), "5")
+        self.assertEqual(compute.get("TIMEOUT"), "5")
+        self.assertIs(compute.get_boolean("enabled"), True)
+        self.assertIs(compute.get_boolean("debug"), False)
+        self.assertEqual(compute.get("log_dir"), "/tmp/logs/compute")
+        self.assertIsNone(compute.get("cafe_engine__log_directory"))
+        with self.assertRaises(ValueError):
+            compute.get_boolean("timeout")
+
+    def test_changed_layer_file_is_read_again(self):
+        LayeredDataSource([self.config_path]).install()
+        config = ComputeConfig(self.config_path)
+        self.assertEqual(config.get("interval"), "0.5")
+        with open(self.config_path, "w") as config_file:
+            config_file.write("[compute]\ninterval = 2\n")
+        os.utime(self.config_path, (1, 1))
+        config._next_file_check = 0
+        self.assertEqual(config.get("interval"), "2")
+
+
+class FakeMongoClient(object):
+    documents = {"compute": {
+        "_id": "5f0c", "config_name": "compute",
+        "compute": {"timeout": "30"}}}
+    instances = []
+
+    def __init__(self, hostname, db_name, username, password):
+        self.queries = 0
+        self.instances.append(self)
+
+    def connect(self):
+        pass
+
+    def auth(self):
+        pass
+
+    def find_one(self, query):
+        self.queries += 1
+        return self.documents.get(query["config_name"])
+
+
+class MongoDataSourceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch.object(
+            data_interfaces, "BaseMongoClient", FakeMongoClient, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        FakeMongoClient.instances = []
+        MongoDataSource.reset()
+        self.addCleanup(MongoDataSource.reset)
+
+    def _source(self, section_name="compute", username="user"):
+        return MongoDataSource(
+            "localhost", "configs", username, "secret", "compute",
+            section_name, snapshot_directory=self.directory)
+
+    def test_single_fetch_per_document(self):
+        self.assertEqual(self._source().get("timeout"), "30")
+        self._source("other")
+        self.assertEqual(len(FakeMongoClient.instances), 1)
+        self.assertEqual(FakeMongoClient.instances[0].queries, 1)
+
+    def test_clients_are_pooled_per_user(self):
+        self._source()
+        self._source(username="admin")
+        self.assertEqual(len(FakeMongoClient.instances), 2)
+
+    def test_snapshot_is_shared_with_other_processes(self):
+        source = self._source()
+        self.assertEqual(os.stat(source._snapshot_path).st_mode & 0o777, 0o600)
+        # What a worker process, with an empty cache, sees
+        MongoDataSource.reset()
+        source = self._source()
+        self.assertEqual(source.get("timeout"), "30")
+        self.assertEqual(FakeMongoClient.instances[0].queries, 1)
+        self.assertIs(source.db, FakeMongoClient.instances[1])
+
+    def test_reconnects_then_falls_back_to_old_snapshot(self):
+        source = self._source()
+        os.utime(source._snapshot_path, (1, 1))
+        MongoDataSource.reset()
+        with mock.patch.object(FakeMongoClient, "find_one") as find_one:
+            find_one.side_effect = IOError("connection reset")
+            self.assertEqual(self._source().get("timeout"), "30")
+            self.assertEqual(find_one.call_count, 2)
+        self.assertEqual(len(FakeMongoClient.instances), 3)
@@ -0,0 +1,100 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import unittest
+
+from cafe.engine.models.base import AutoMarshallingModel
+from cafe.engine.models.fields import Field
+
+
+class Address(AutoMarshallingModel):
+    __fields__ = (
+        Field("addr", xml_attribute=True),
+        Field("version", int, xml_attribute=True))
+
+
+class Metadata(AutoMarshallingModel):
+    __fields__ = (Field("key"), Field("value"))
+
+
+class Server(AutoMarshallingModel):
+    __root_tag__ = "server"
+    __fields__ = (
+        Field("id", xml_attribute=True),
+        Field("name"),
+        Field("ram", int, xml_attribute=True),
+        Field("locked", bool, xml_attribute=True),
+        Field("metadata", Metadata),
+        Field("addresses", Address, is_list=True, item_tag="address"),
+        Field("tags", is_list=True, key="tag"))
+
+
+class DeclarativeFieldsTests(unittest.TestCase):
+
+    JSON = json.dumps({"server": {
+        "id": "1", "name": "test", "ram": 512, "locked": True,
+        "metadata": {"key": "k", "value": "v"},
+        "addresses": [{"addr": "10.0.0.1", "version": 4}],
+        "tag": ["a", "b"]}})
+
+    XML = (
+        '<server xmlns="http://docs.openstack.org/compute/api/v1.1" '
+        'id="1" ram="512" locked="true"><name>test</name>'
+        '<metadata><key>k</key><value>v</value></metadata>'
+        '<addresses><address addr="10.0.0.1" version="4"/></addresses>'
+        '<tag>a</tag><tag>b</tag></server>')
+
+    def _assert_server(self, server):
+        self.assertEqual(server.id, "1")
+        self.assertEqual(server.name, "test")
+        self.assertEqual(server.ram, 512)
+        self.assertIs(server.locked, True)
+        self.assertEqual(server.metadata.key, "k")
+        self.assertEqual(server.addresses[0].addr, "10.0.0.1")
+        self.assertEqual(server.addresses[0].version, 4)
+        self.assertEqual(server.tags, ["a", "b"])
+
+    def test_json_round_trip(self):
+        server = Server.deserialize(self.JSON, "json")
+        self._assert_server(server)
+        self.assertEqual(
+            json.loads(server.serialize("json")), json.loads(self.JSON))
+
+    def test_xml_round_trip(self):
+        server = Server.deserialize(self.XML, "xml")
+        self._assert_server(server)
+        self.assertEqual(Server.deserialize(server.serialize("xml"), "xml"),
+                         server)
+
+    def test_missing_values(self):
+        server = Server._dict_to_obj({"id": "2"})
+        self.assertIsNone(server.metadata)
+        self.assertIsNone(server.addresses)
+        self.assertEqual(server._obj_to_dict(), {"id": "2"})
+
+    def test_subclass_with_own_fields(self):
+        class Flavor(Server):
+            __root_tag__ = "flavor"
+            __fields__ = (Field("id"), Field("disk", int))
+
+        flavor = Flavor.deserialize('<flavor><disk>10</disk></flavor>', "xml")
+        self.assertIsInstance(flavor, Flavor)
+        self.assertEqual(flavor.disk, 10)
+        self._assert_server(Server.deserialize(self.JSON, "json"))
+
+    def test_xml_attribute_must_be_simple(self):
+        self.assertRaises(
+            ValueError, Field, "metadata", Metadata, xml_attribute=True)
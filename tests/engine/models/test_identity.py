@@ -0,0 +1,113 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from xml.etree import ElementTree as ET
+import threading
+import unittest
+
+from cafe.engine.models.base import AutoMarshallingModel
+from cafe.engine.models.fields import Field
+from cafe.engine.models.identity import (
+    IdentityMap, diff_models, get_active_map)
+
+
+class Server(AutoMarshallingModel):
+    __primary_key__ = "id"
+    __fields__ = (
+        Field("id", key="uuid", xml_attribute=True),
+        Field("status", xml_attribute=True))
+
+
+def poll(statuses):
+    return {"servers": [
+        {"uuid": str(i), "status": status}
+        for i, status in enumerate(statuses)]}
+
+
+class IdentityMapTests(unittest.TestCase):
+
+    def test_unchanged_entities_are_reused(self):
+        with IdentityMap(Server) as identity_map:
+            first = Server._build_list_model(
+                poll(["BUILD", "BUILD"]), "servers", Server)
+            second = Server._build_list_model(
+                poll(["BUILD", "ACTIVE"]), "servers", Server)
+        self.assertIs(second[0], first[0])
+        self.assertIsNot(second[1], first[1])
+        self.assertEqual(identity_map.reused, 1)
+        self.assertIsNone(get_active_map(Server))
+
+        changes = diff_models(first, second)
+        self.assertEqual(changes.changed, [second[1]])
+        self.assertEqual(changes.unchanged, [second[0]])
+        self.assertEqual(changes.added, [])
+        self.assertEqual(changes.removed, [])
+
+    def test_removed_entities_are_forgotten(self):
+        with IdentityMap(Server) as identity_map:
+            first = Server._build_list_model(
+                poll(["ACTIVE", "ACTIVE"]), "servers", Server)
+            second = Server._build_list_model(
+                poll(["ACTIVE"]), "servers", Server)
+        self.assertIsNone(identity_map.get("1"))
+        self.assertEqual(diff_models(first, second).removed, [first[1]])
+
+    def test_strings_are_interned(self):
+        identity_map = IdentityMap(Server)
+        servers = identity_map.build_list(
+            [{"uuid": "1", "status": "".join(["ACT", "IVE"])},
+             {"uuid": "2", "status": "".join(["ACTI", "VE"])}])
+        self.assertIs(servers[0].status, servers[1].status)
+
+    def test_strings_of_forgotten_entities_are_dropped(self):
+        identity_map = IdentityMap(Server)
+        for progress in range(10):
+            identity_map.build_list(
+                [{"uuid": "1", "status": "BUILD {0}%".format(progress)},
+                 {"uuid": "2", "status": "ACTIVE"}])
+        self.assertEqual(
+            sorted(identity_map._strings), ["1", "2", "ACTIVE", "BUILD 9%"])
+
+    def test_xml_entities(self):
+        element = ET.fromstring(
+            '<servers><server uuid="1" status="ACTIVE"/></servers>')
+        with IdentityMap(Server) as identity_map:
+            first = Server._build_list_model(element, "server", Server)
+            second = Server._build_list_model(element, "server", Server)
+        self.assertIs(first[0], second[0])
+        self.assertEqual(identity_map.built, 1)
+        self.assertEqual(identity_map.reused, 1)
+
+    def test_changed_xml_entities_are_built_again(self):
+        identity_map = IdentityMap(Server)
+        first = identity_map.build_xml_list(
+            [ET.fromstring('<server uuid="1" status="BUILD"/>')])
+        second = identity_map.build_xml_list(
+            [ET.fromstring('<server uuid="1" status="ACTIVE"/>')])
+        self.assertIsNot(first[0], second[0])
+        self.assertEqual(second[0].status, "ACTIVE")
+
+    def test_map_is_only_active_in_its_thread(self):
+        seen = []
+        with IdentityMap(Server) as identity_map:
+            thread = threading.Thread(
+                target=lambda: seen.append(get_active_map(Server)))
+            thread.start()
+            thread.join()
+            self.assertIs(get_active_map(Server), identity_map)
+        self.assertEqual(seen, [None])
+
+    def test_primary_key_is_required(self):
+        self.assertRaises(ValueError, IdentityMap, AutoMarshallingModel)
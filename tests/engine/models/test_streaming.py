@@ -0,0 +1,91 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import io
+import json
+import unittest
+
+from cafe.engine.models.base import (
+    AutoMarshallingListModel, AutoMarshallingModel)
+from cafe.engine.models.fields import Field
+from cafe.engine.models.streaming import iter_json_array
+
+
+class Server(AutoMarshallingModel):
+    __root_tag__ = "server"
+    __fields__ = (Field("id", int, xml_attribute=True), Field("name"))
+
+
+class Servers(AutoMarshallingListModel):
+    __root_tag__ = "servers"
+    __item_model__ = Server
+
+
+class StreamingTests(unittest.TestCase):
+
+    COUNT = 1000
+
+    def _json(self):
+        return json.dumps({
+            "links": [{"href": "http://localhost/servers?marker=0"}],
+            "servers": [{"id": i, "name": "s{0}".format(i)}
+                        for i in range(self.COUNT)],
+            "count": self.COUNT}).encode("UTF-8")
+
+    def _xml(self):
+        return (
+            '<servers xmlns="http://docs.openstack.org/compute/api/v1.1">'
+            '<link href="http://localhost"/>{0}</servers>'.format("".join(
+                '<server id="{0}"><name>s{0}</name></server>'.format(i)
+                for i in range(self.COUNT)))).encode("UTF-8")
+
+    def _assert_servers(self, servers):
+        servers = list(servers)
+        self.assertEqual(len(servers), self.COUNT)
+        self.assertEqual(servers[-1].id, self.COUNT - 1)
+        self.assertEqual(servers[-1].name, "s{0}".format(self.COUNT - 1))
+
+    def test_json_from_small_chunks(self):
+        self._assert_servers(
+            Servers.deserialize_iter(self._json(), "json", chunk_size=7))
+
+    def test_xml_from_file(self):
+        self._assert_servers(Servers.deserialize_iter(
+            io.BytesIO(self._xml()), "xml", chunk_size=100))
+
+    def test_items_are_yielded_before_the_end_of_the_body(self):
+        body = self._json()
+        read = []
+
+        def chunks():
+            for start in range(0, len(body), 64):
+                read.append(start)
+                yield body[start:start + 64]
+
+        first = next(Servers.deserialize_iter(chunks(), "json"))
+        self.assertEqual(first.id, 0)
+        self.assertLess(len(read) * 64, len(body) / 10)
+
+    def test_top_level_array(self):
+        items = list(iter_json_array([b'[1, 2', b'3, {"a": ', b'"]"}]']))
+        self.assertEqual(items, [1, 23, {"a": "]"}])
+        self.assertEqual(list(iter_json_array([b' [ ] '])), [])
+
+    def test_missing_key(self):
+        self.assertEqual(list(iter_json_array([b'{"a": 1}'], "servers")), [])
+
+    def test_malformed_json(self):
+        items = iter_json_array([b'{"servers": [1 2]}'], "servers")
+        self.assertRaises(ValueError, list, items)
@@ -0,0 +1,95 @@
+"""
+Copyright 2016 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from collections import namedtuple, OrderedDict
+import sqlite3
+import unittest
+
+import mock
+
+from cafe.engine.models import tabular
+from cafe.engine.models.base import AutoMarshallingModel
+from cafe.engine.models.fields import Field
+from cafe.engine.models.tabular import ColumnarView
+
+
+class Server(AutoMarshallingModel):
+    __fields__ = (
+        Field("id"), Field("name"), Field("flavor", key="flavor_id"),
+        Field("status"))
+
+
+class Row(AutoMarshallingModel):
+    pass
+
+
+class TabularTests(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "CREATE TABLE servers (id INTEGER, name TEXT, flavor_id TEXT, "
+            "created TEXT)")
+        self.connection.executemany(
+            "INSERT INTO servers VALUES (?, ?, ?, ?)",
+            [(i, "s{0}".format(i), "2", "today") for i in range(2500)])
+
+    def _cursor(self):
+        return self.connection.execute("SELECT * FROM servers ORDER BY id")
+
+    def test_models_from_cursor(self):
+        servers = Server.from_rows(self._cursor())
+        self.assertEqual(len(servers), 2500)
+        self.assertEqual(
+            Server._dict_to_obj({
+                "id": 2499, "name": "s2499", "flavor_id": "2"}),
+            servers[-1])
+
+    def test_models_without_fields(self):
+        rows = Row.from_rows([(1, "a"), (2, "b")], columns=["id", "name"])
+        self.assertEqual([row.name for row in rows], ["a", "b"])
+
+    def test_namedtuples(self):
+        Point = namedtuple("Point", ["x", "y"])
+        rows = Row.from_rows([Point(1, 2)])
+        self.assertEqual((rows[0].x, rows[0].y), (1, 2))
+        self.assertRaises(ValueError, Row.from_rows, [(1, 2)])
+
+    def test_columnar_view(self):
+        view = ColumnarView(self._cursor())
+        self.assertEqual(len(view), 2500)
+        self.assertEqual(set(view["flavor_id"]), set(["2"]))
+        self.assertEqual(view.row(1), (1, "s1", "2", "today"))
+        self.assertEqual(view.to_models(Server)[1].name, "s1")
+
+    def test_empty_columnar_view(self):
+        view = ColumnarView([], columns=["id"])
+        self.assertEqual(len(view), 0)
+        self.assertEqual(view["id"], ())
+
+    def test_row_builders_are_bounded(self):
+        with mock.patch.object(tabular, "BUILDER_CACHE_SIZE", 2), \
+                mock.patch.object(tabular, "_builders", OrderedDict()):
+            Row.from_rows([(1,)], columns=["a"])
+            builder = tabular._get_row_builder(Row, ("a",))
+            Row.from_rows([(1,)], columns=["b"])
+            # "a" was used after "b", so "b" is dropped first
+            self.assertIs(tabular._get_row_builder(Row, ("a",)), builder)
+            Row.from_rows([(1,)], columns=["c"])
+            self.assertEqual(
+                list(tabular._builders), [(Row, ("a",)), (Row, ("c",))])
+
+    def tearDown(self):
+        self.connection.close()